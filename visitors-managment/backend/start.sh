@@ -70,7 +70,9 @@ echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
 echo "Starting Gunicorn server..."
-exec gunicorn visitor_management.wsgi:application \
+# ASGI workers, so live event streams do not hold a worker each
+exec gunicorn visitor_management.asgi:application \
+  -k uvicorn.workers.UvicornWorker \
   --bind 0.0.0.0:$PORT \
   --workers ${WEB_CONCURRENCY:-4} \
   --timeout 120 \
@@ -2,6 +2,8 @@
 ASGI config for visitor_management project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn visitor_management.asgi:application``)
+so the active-visitor event stream does not hold a worker thread per client.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
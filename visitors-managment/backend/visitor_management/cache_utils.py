@@ -0,0 +1,45 @@
+"""
+Build the ``CACHES`` setting from a single ``CACHE_URL``.
+
+* ``locmem://`` (default): per-process memory, evicting least recently used
+  entries past ``max_entries``.
+* ``file:///absolute/path``: shared by every process on the host.
+* ``redis://host:6379/0``, ``rediss://`` or ``unix://``: Django's Redis
+  backend, for Redis or any server speaking its protocol (needs the
+  ``redis`` package).
+* ``dummy://``: caching off.
+"""
+from urllib.parse import urlparse
+
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'unix': 'django.core.cache.backends.redis.RedisCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def cache_config(url='locmem://', timeout=300, max_entries=1000):
+    parsed = urlparse(url or 'locmem://')
+    if parsed.scheme not in BACKENDS:
+        raise ImproperlyConfigured(f"CACHE_URL scheme must be one of: {', '.join(BACKENDS)}")
+    config = {
+        'BACKEND': BACKENDS[parsed.scheme],
+        'TIMEOUT': timeout,
+        'KEY_PREFIX': 'vm',
+    }
+    if parsed.scheme == 'locmem':
+        config['LOCATION'] = parsed.netloc or 'visitors'
+    elif parsed.scheme == 'file':
+        if not parsed.path:
+            raise ImproperlyConfigured('CACHE_URL file:// needs an absolute path, e.g. file:///var/tmp/vm-cache')
+        config['LOCATION'] = parsed.path
+    elif parsed.scheme != 'dummy':
+        config['LOCATION'] = url
+    if parsed.scheme in ('locmem', 'file'):
+        config['OPTIONS'] = {'MAX_ENTRIES': max_entries}
+    return {'default': config}
@@ -0,0 +1,5 @@
+"""
+PostgreSQL database backend with an in-process psycopg2 connection pool.
+
+Enable with ``DB_POOL=True``; see ``settings.py``.
+"""
@@ -0,0 +1,166 @@
+"""
+PostgreSQL backend that borrows connections from a per-process pool.
+
+Django still opens and closes its connection around each request (use
+``CONN_MAX_AGE = 0``), but "open" checks a live connection out of the pool and
+"close" hands it back, so the TCP/TLS/auth handshake is paid only when the pool
+grows. Connections idle for longer than ``health_check_interval`` seconds are
+pinged before being handed out; broken ones are discarded.
+
+Pool sizing comes from ``DATABASES[alias]['POOL']``::
+
+    'POOL': {'min_size': 1, 'max_size': 10, 'health_check_interval': 30}
+
+``min_size`` connections are opened up front; returned connections are kept
+idle up to ``max_size``. The test suite runs on SQLite and only exercises the
+pool's bookkeeping with stand-in connections, so this backend has not been
+tested against a live PostgreSQL server.
+"""
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+from django.utils.asyncio import async_unsafe
+
+from visitor_management import db_utils
+
+if is_psycopg3:
+    raise ImproperlyConfigured("visitor_management.db_pool requires psycopg2")
+
+import psycopg2.extensions  # noqa: E402
+import psycopg2.extras  # noqa: E402
+from psycopg2 import pool as pg_pool  # noqa: E402
+
+DEFAULT_POOL_OPTIONS = {
+    'min_size': 1,
+    'max_size': 10,
+    'health_check_interval': 30,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class HealthCheckedPool(pg_pool.ThreadedConnectionPool):
+    """Thread-safe psycopg2 pool that validates connections on checkout."""
+
+    def __init__(self, min_size, max_size, health_check_interval, **conn_params):
+        self.health_check_interval = health_check_interval
+        self._returned_at = {}
+        super().__init__(min_size, max_size, **conn_params)
+
+    def _connect(self, key=None):
+        db_utils.record_connection_opened()
+        return super()._connect(key)
+
+    def _putconn(self, conn, key=None, close=False):
+        # psycopg2 closes every returned connection once ``minconn`` are idle,
+        # so a threaded server would reconnect on most requests; keep up to
+        # ``maxconn`` instead.
+        if self.closed:
+            raise pg_pool.PoolError("connection pool is closed")
+        if key is None:
+            key = self._rused.get(id(conn))
+            if key is None:
+                raise pg_pool.PoolError("trying to put unkeyed connection")
+
+        if len(self._pool) < self.maxconn and not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                conn.close()  # server connection lost
+            else:
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self._pool.append(conn)
+        else:
+            conn.close()
+        if conn.closed:
+            self._returned_at.pop(id(conn), None)
+
+        del self._used[key]
+        del self._rused[id(conn)]
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        returned_at = self._returned_at.get(id(conn))
+        if returned_at is None or time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not conn.autocommit:
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def checkout(self):
+        """Return a healthy connection, replacing any broken ones found on the way."""
+        for _ in range(self.maxconn + 1):
+            conn = self.getconn()
+            if self._is_healthy(conn):
+                return conn
+            db_utils.record_connection_discarded()
+            self.putconn(conn, close=True)
+        raise pg_pool.PoolError("could not obtain a healthy connection from the pool")
+
+    def checkin(self, conn):
+        self._returned_at[id(conn)] = time.monotonic()
+        self.putconn(conn, close=bool(conn.closed))
+
+
+def get_pool(alias, settings_dict, conn_params):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            options = {**DEFAULT_POOL_OPTIONS, **settings_dict.get('POOL', {})}
+            pool = HealthCheckedPool(
+                options['min_size'],
+                options['max_size'],
+                options['health_check_interval'],
+                **conn_params,
+            )
+            _pools[alias] = pool
+        return pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL wrapper whose connections come from ``HealthCheckedPool``."""
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict['OPTIONS']
+        set_isolation_level = False
+        try:
+            isolation_level_value = options['isolation_level']
+        except KeyError:
+            self.isolation_level = IsolationLevel.READ_COMMITTED
+        else:
+            try:
+                self.isolation_level = IsolationLevel(isolation_level_value)
+                set_isolation_level = True
+            except ValueError:
+                raise ImproperlyConfigured(
+                    f"Invalid transaction isolation level {isolation_level_value} specified."
+                )
+
+        connection = get_pool(self.alias, self.settings_dict, conn_params).checkout()
+        if set_isolation_level:
+            connection.isolation_level = self.isolation_level
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    @async_unsafe
+    def _close(self):
+        if self.connection is not None:
+            pool = _pools.get(self.alias)
+            with self.wrap_database_errors:
+                if pool is None:
+                    return self.connection.close()
+                # The pool rolls back anything left open before reuse.
+                pool.checkin(self.connection)
@@ -3,11 +3,20 @@ Database utility functions for handling connection issues
 """
 import time
 import logging
+import threading
 from django.db import connection
 from django.db.utils import OperationalError
 
 logger = logging.getLogger(__name__)
 
+_stats_lock = threading.Lock()
+_stats = {
+    'requests': 0,
+    'connections_opened': 0,
+    'connection_checkouts': 0,
+    'connections_discarded': 0,
+}
+
 def wait_for_db(max_retries=30, delay=2):
     """
     Wait for database to become available with exponential backoff
@@ -19,11 +28,11 @@ def wait_for_db(max_retries=30, delay=2):
             return True
         except OperationalError as e:
             if attempt == max_retries - 1:
-                logger.error(f"Failed to connect to database after {max_retries} attempts: {e}")
+                logger.error("Failed to connect to database after %d attempts: %s", max_retries, e)
                 raise
             
             wait_time = min(delay * (2 ** attempt), 60)  # Cap at 60 seconds
-            logger.warning(f"Database unavailable (attempt {attempt + 1}/{max_retries}). Retrying in {wait_time}s...")
+            logger.warning("Database unavailable (attempt %d/%d). Retrying in %ss...", attempt + 1, max_retries, wait_time)
             time.sleep(wait_time)
     
     return False
@@ -39,3 +48,47 @@ def test_db_connection():
         return True, "Database connection successful"
     except Exception as e:
         return False, str(e)
+
+
+def _increment(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def record_connection_opened():
+    """Count a new physical database connection (handshake paid)."""
+    _increment('connections_opened')
+
+
+def record_connection_discarded():
+    """Count a pooled connection thrown away by a failed health check."""
+    _increment('connections_discarded')
+
+
+def on_request_started(sender, **kwargs):
+    _increment('requests')
+
+
+def on_connection_created(sender, connection, **kwargs):
+    """Django opened a connection: physical unless it was borrowed from the pool."""
+    _increment('connection_checkouts')
+    if not connection.settings_dict['ENGINE'].endswith('db_pool'):
+        _increment('connections_opened')
+
+
+def connection_stats():
+    """
+    Return per-process connection counters and the reuse ratio.
+
+    ``reuse_ratio`` is the share of requests that did not pay for a new
+    database handshake.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    requests = stats['requests']
+    if requests:
+        stats['reuse_ratio'] = round(max(0.0, 1 - stats['connections_opened'] / requests), 4)
+    else:
+        stats['reuse_ratio'] = None
+    return stats
+
@@ -0,0 +1,253 @@
+"""
+Opt-in per-request timing and query instrumentation.
+
+With ``REQUEST_METRICS_ENABLED`` on, ``RequestMetricsMiddleware`` measures for
+every request:
+
+* wall time,
+* the number of SQL queries and the time spent in them (through
+  ``connection.execute_wrapper`` on every configured database),
+* time spent in DRF serializers' ``.data`` (which includes any lazy queries
+  they trigger),
+* the response body size.
+
+It reports them in a ``Server-Timing`` header (visible in browser dev tools),
+aggregates them per route in process memory for ``prometheus_text`` (served
+at ``/metrics/``), and logs requests slower than ``REQUEST_METRICS_SLOW_MS``
+together with their most expensive SQL fingerprints. When disabled the
+middleware removes itself at startup and costs nothing.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from visitor_management.db_utils import connection_stats
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_REQUEST_FINGERPRINTS = 5
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_totals_lock = threading.Lock()
+_routes = {}
+_responses = {}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def is_enabled():
+    return getattr(settings, 'REQUEST_METRICS_ENABLED', False)
+
+
+def slow_request_ms():
+    return getattr(settings, 'REQUEST_METRICS_SLOW_MS', 500)
+
+
+def fingerprint(sql):
+    """Normalise ``sql`` so the same statement with different parameters groups together."""
+    sql = _STRING_RE.sub('?', sql.replace('%s', '?'))
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class RequestMetrics:
+    """Measurements for one request; also the ``execute_wrapper`` that collects them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+        self.fingerprints = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_seconds += elapsed
+            key = fingerprint(sql)
+            count, total = self.fingerprints.get(key, (0, 0.0))
+            self.fingerprints[key] = (count + 1, total + elapsed)
+
+    def slowest_fingerprints(self, limit=SLOW_REQUEST_FINGERPRINTS):
+        ranked = sorted(self.fingerprints.items(), key=lambda item: item[1][1], reverse=True)
+        return ranked[:limit]
+
+
+def _timed_data(original):
+    """Wrap ``BaseSerializer.data`` to add the outermost call's time to the request."""
+    def data(self):
+        metrics = _current.get()
+        if metrics is None:
+            return original.fget(self)
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_seconds += time.perf_counter() - start
+    data._request_metrics = True
+    return property(data)
+
+
+def instrument_serializers():
+    from rest_framework.serializers import BaseSerializer
+
+    if not getattr(BaseSerializer.data.fget, '_request_metrics', False):
+        BaseSerializer.data = _timed_data(BaseSerializer.data)
+
+
+def route_label(request):
+    """URL name of the matched view, which keeps label cardinality bounded."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def record(route, method, status, seconds, metrics, size):
+    with _totals_lock:
+        totals = _routes.setdefault((route, method), {
+            'requests': 0, 'seconds': 0.0, 'buckets': [0] * len(DURATION_BUCKETS),
+            'queries': 0, 'db_seconds': 0.0, 'serializer_seconds': 0.0, 'response_bytes': 0,
+        })
+        totals['requests'] += 1
+        totals['seconds'] += seconds
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                totals['buckets'][index] += 1
+        totals['queries'] += metrics.queries
+        totals['db_seconds'] += metrics.db_seconds
+        totals['serializer_seconds'] += metrics.serializer_seconds
+        totals['response_bytes'] += size or 0
+        _responses[(route, method, status)] = _responses.get((route, method, status), 0) + 1
+
+
+def reset():
+    with _totals_lock:
+        _routes.clear()
+        _responses.clear()
+
+
+def server_timing(seconds, metrics):
+    return ', '.join([
+        f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"',
+        f'serialize;dur={metrics.serializer_seconds * 1000:.1f}',
+        f'total;dur={seconds * 1000:.1f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    """Times each request and its queries; see the module docstring."""
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument_serializers()
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - start
+
+        size = None if response.streaming else len(response.content)
+        route = route_label(request)
+        record(route, request.method, response.status_code, seconds, metrics, size)
+        response['Server-Timing'] = server_timing(seconds, metrics)
+        if seconds * 1000 >= slow_request_ms():
+            self.log_slow_request(request, response, seconds, metrics, size)
+        return response
+
+    def log_slow_request(self, request, response, seconds, metrics, size):
+        lines = [
+            f'  {count}x {total * 1000:.1f}ms {sql}'
+            for sql, (count, total) in metrics.slowest_fingerprints()
+        ]
+        logger.warning(
+            "Slow request %s %s -> %s in %.0fms (%d queries, %.0fms db, %.0fms serializers, %s bytes)%s",
+            request.method, request.get_full_path(), response.status_code, seconds * 1000,
+            metrics.queries, metrics.db_seconds * 1000, metrics.serializer_seconds * 1000,
+            size if size is not None else 'streamed',
+            ''.join('\n' + line for line in lines),
+        )
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def prometheus_text():
+    """Render this process's request totals and connection counters in Prometheus text format."""
+    with _totals_lock:
+        routes = {key: dict(value, buckets=list(value['buckets'])) for key, value in _routes.items()}
+        responses = dict(_responses)
+
+    lines = [
+        '# HELP visitors_http_requests_total Requests handled, by route, method and status.',
+        '# TYPE visitors_http_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(responses.items()):
+        lines.append(f'visitors_http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+
+    lines += [
+        '# HELP visitors_http_request_duration_seconds Wall time per request.',
+        '# TYPE visitors_http_request_duration_seconds histogram',
+    ]
+    for (route, method), totals in sorted(routes.items()):
+        for bound, count in zip(DURATION_BUCKETS, totals['buckets']):
+            lines.append('visitors_http_request_duration_seconds_bucket'
+                         f'{_labels(route=route, method=method, le=bound)} {count}')
+        lines.append('visitors_http_request_duration_seconds_bucket'
+                     f'{_labels(route=route, method=method, le="+Inf")} {totals["requests"]}')
+        lines.append(f'visitors_http_request_duration_seconds_sum{_labels(route=route, method=method)} '
+                     f'{totals["seconds"]:.6f}')
+        lines.append(f'visitors_http_request_duration_seconds_count{_labels(route=route, method=method)} '
+                     f'{totals["requests"]}')
+
+    for name, key, help_text in (
+        ('visitors_db_queries_total', 'queries', 'SQL queries executed.'),
+        ('visitors_db_query_seconds_total', 'db_seconds', 'Time spent executing SQL.'),
+        ('visitors_serializer_seconds_total', 'serializer_seconds', 'Time spent in serializer .data.'),
+        ('visitors_http_response_bytes_total', 'response_bytes', 'Non-streamed response body bytes.'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (route, method), totals in sorted(routes.items()):
+            value = totals[key]
+            value = f'{value:.6f}' if isinstance(value, float) else value
+            lines.append(f'{name}{_labels(route=route, method=method)} {value}')
+
+    for key, value in connection_stats().items():
+        if value is None or key == 'requests':
+            continue
+        kind = 'gauge' if key == 'reuse_ratio' else 'counter'
+        name = f'visitors_db_{key}' if kind == 'gauge' else f'visitors_db_{key}_total'
+        lines += [f'# TYPE {name} {kind}', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
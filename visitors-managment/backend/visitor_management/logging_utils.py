@@ -0,0 +1,142 @@
+"""
+Logging setup: JSON output, sampled debug records and a non-blocking handler.
+
+``QueueingStreamHandler`` only puts records on an in-memory queue; a
+background ``QueueListener`` thread formats and writes them, so a request
+never waits on stdout. When the queue is full records are dropped (and
+counted) rather than blocking. ``SamplingFilter`` lets through only a share
+of DEBUG records so verbose loggers can stay on in production.
+
+Log with ``%`` arguments (``logger.debug("visit %s", visit.pk)``), not
+f-strings: the message is then only built for records that pass the level
+and sampling checks.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed via ``extra``.
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+QUEUE_SIZE = 10000
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, ``extra`` fields and traceback."""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass all INFO-and-above records and a ``rate`` fraction of DEBUG records."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than fail when stopping with a full queue.
+        self.queue.put(self._sentinel)
+
+
+class QueueingStreamHandler(QueueHandler):
+    """
+    Hand records to a background thread that writes them to ``stream``.
+
+    The formatter configured on this handler is used by the writer thread.
+    """
+
+    def __init__(self, stream=None, maxsize=QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self.listener = _Listener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+        self._stopped = False
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the writer thread (idempotent)."""
+        if not self._stopped:
+            self._stopped = True
+            self.listener.stop()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve the message now so later changes to its arguments don't leak
+        # in; the formatter (JSON, tracebacks) runs on the writer thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+def logging_config(level='INFO', fmt='json', debug_sample_rate=1.0):
+    """Build the ``LOGGING`` setting used by both settings modules."""
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'json': {'()': 'visitor_management.logging_utils.JSONFormatter'},
+            'text': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        },
+        'filters': {
+            'sample_debug': {'()': 'visitor_management.logging_utils.SamplingFilter', 'rate': debug_sample_rate},
+        },
+        'handlers': {
+            'console': {
+                '()': 'visitor_management.logging_utils.QueueingStreamHandler',
+                'formatter': fmt,
+                'filters': ['sample_debug'],
+            },
+        },
+        'root': {'handlers': ['console'], 'level': 'WARNING'},
+        'loggers': {
+            'django': {'level': 'INFO'},
+            # 4xx responses are routine; server errors are still logged.
+            'django.request': {'level': 'ERROR'},
+            'visitors': {'level': level},
+            'visitor_management': {'level': level},
+        },
+    }
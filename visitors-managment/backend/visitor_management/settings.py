@@ -2,12 +2,17 @@
 Django settings for visitor_management project.
 """
 
+import logging
 import os
+import sys
 from pathlib import Path
 from decouple import config, Csv
 import dj_database_url
 from urllib.parse import urlparse
 
+from visitor_management.cache_utils import cache_config
+from visitor_management.logging_utils import logging_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Inert unless REQUEST_METRICS_ENABLED is set
+    'visitor_management.instrumentation.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -73,30 +80,34 @@ DATABASES = {
     }
 }
 
+# Connection lifetime and pooling
+# DB_CONN_MAX_AGE: seconds Django keeps a connection open between requests (0 = close per request).
+# DB_POOL: borrow connections from an in-process pool instead (forces CONN_MAX_AGE to 0).
+# DB_PGBOUNCER: set when connecting through pgbouncer in transaction-pooling mode.
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_POOL_MIN_SIZE = config('DB_POOL_MIN_SIZE', default=1, cast=int)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=10, cast=int)
+DB_POOL_HEALTH_CHECK_INTERVAL = config('DB_POOL_HEALTH_CHECK_INTERVAL', default=30, cast=int)
+DB_PGBOUNCER = config('DB_PGBOUNCER', default=False, cast=bool)
+
 # Always check for PostgreSQL first, regardless of DEBUG setting
 DATABASE_URL = os.environ.get('DATABASE_URL')
-print(f"DEBUG: DATABASE_URL from environment: {DATABASE_URL}")
-print(f"DEBUG: DEBUG setting: {DEBUG}")
 
 # Force PostgreSQL configuration for Render deployment
 # Override the default SQLite configuration
 if True:  # Always try PostgreSQL first
-    print("DEBUG: Attempting PostgreSQL configuration")
-    
     if not DATABASE_URL:
-        print("DEBUG: No DATABASE_URL found, constructing for Render")
         # Use Render's internal database connection format
         DATABASE_URL = "postgresql://visitor_user@visitor-management-db:5432/visitor_management"
     
-    print(f"DEBUG: Using DATABASE_URL: {DATABASE_URL}")
-    
     try:
         import dj_database_url
         
         # Parse database configuration
         db_config = dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=0,
+            conn_max_age=DB_CONN_MAX_AGE,
             conn_health_checks=True,
             ssl_require=False
         )
@@ -117,13 +128,28 @@ if True:  # Always try PostgreSQL first
             'sslmode': 'prefer',
         }
         
-        DATABASES['default']['CONN_MAX_AGE'] = 0
+        if DB_POOL:
+            # Django hands the connection back to the pool at the end of each request.
+            DATABASES['default']['ENGINE'] = 'visitor_management.db_pool'
+            DATABASES['default']['CONN_MAX_AGE'] = 0
+            DATABASES['default']['POOL'] = {
+                'min_size': DB_POOL_MIN_SIZE,
+                'max_size': DB_POOL_MAX_SIZE,
+                'health_check_interval': DB_POOL_HEALTH_CHECK_INTERVAL,
+            }
+        else:
+            DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
         
-        print(f"DEBUG: PostgreSQL config applied: {DATABASES['default']}")
+        if DB_PGBOUNCER:
+            # Server-side cursors don't survive transaction pooling.
+            DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
         
     except Exception as e:
-        print(f"DEBUG: PostgreSQL configuration failed: {e}")
-        print("DEBUG: Falling back to SQLite")
+        # LOGGING is not configured yet; warnings still reach stderr. Never log
+        # DATABASE_URL or DATABASES here, they contain credentials.
+        logging.getLogger('visitor_management.settings').warning(
+            "PostgreSQL configuration failed (%s); falling back to SQLite", type(e).__name__
+        )
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -171,6 +197,62 @@ if os.path.exists(static_dir):
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# How /media/ is served: django (streamed, with ranges), x-accel-redirect (nginx),
+# x-sendfile (Apache) or off (the web server maps MEDIA_ROOT itself)
+MEDIA_SERVE_MODE = config('MEDIA_SERVE_MODE', default='django')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+
+# Background export jobs: size of the in-process worker pool.
+# Set to 0 to leave jobs for `python manage.py run_export_jobs`.
+EXPORT_JOB_WORKERS = config('EXPORT_JOB_WORKERS', default=2, cast=int)
+
+# Check-in photo/signature storage workers (0 = run only via `manage.py process_media_tasks`)
+MEDIA_TASK_WORKERS = config('MEDIA_TASK_WORKERS', default=2, cast=int)
+
+# Upload size limits (bytes), enforced from Content-Length before the body is read
+PHOTO_UPLOAD_MAX_BYTES = config('PHOTO_UPLOAD_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+SIGNATURE_UPLOAD_MAX_BYTES = config('SIGNATURE_UPLOAD_MAX_BYTES', default=2 * 1024 * 1024, cast=int)
+
+# Live active-visitor stream (/api/visitors/active/stream/): seconds between event
+# log polls, and how long one connection stays open before the client reconnects
+VISIT_EVENTS_POLL_INTERVAL = config('VISIT_EVENTS_POLL_INTERVAL', default=1.0, cast=float)
+VISIT_EVENTS_STREAM_SECONDS = config('VISIT_EVENTS_STREAM_SECONDS', default=300, cast=int)
+# Under WSGI a stream holds a worker, so it is cut short and the client long-polls
+VISIT_EVENTS_WSGI_STREAM_SECONDS = config('VISIT_EVENTS_WSGI_STREAM_SECONDS', default=25, cast=int)
+
+# Cache backend: locmem:// (per-process LRU), file:///path, redis://host:6379/0
+# or dummy://. READ_CACHE_TIMEOUT caps how long cached detail/list
+# responses are kept (0 disables them); writes invalidate them immediately.
+CACHE_URL = config('CACHE_URL', default='locmem://')
+CACHE_MAX_ENTRIES = config('CACHE_MAX_ENTRIES', default=1000, cast=int)
+READ_CACHE_TIMEOUT = config('READ_CACHE_TIMEOUT', default=300, cast=int)
+CACHES = cache_config(CACHE_URL, timeout=READ_CACHE_TIMEOUT or 300, max_entries=CACHE_MAX_ENTRIES)
+
+# Returning-visitor lookups (search, check-in) cache lifetime (seconds); writes
+# invalidate them immediately. Phones without a +/00 prefix are keyed with
+# PHONE_DEFAULT_COUNTRY_CODE (e.g. 44), or on their digits alone when empty.
+VISITOR_LOOKUP_CACHE_SECONDS = config('VISITOR_LOOKUP_CACHE_SECONDS', default=30, cast=int)
+PHONE_DEFAULT_COUNTRY_CODE = config('PHONE_DEFAULT_COUNTRY_CODE', default='')
+
+# Most items accepted by one bulk check-in/check-out request
+BULK_MAX_ITEMS = config('BULK_MAX_ITEMS', default=500, cast=int)
+
+# Lobby dashboard stats cache lifetime (seconds); writes invalidate it immediately
+LOBBY_STATS_CACHE_SECONDS = config('LOBBY_STATS_CACHE_SECONDS', default=60, cast=int)
+
+# Request timing/query instrumentation: Server-Timing headers, /metrics/ and
+# slow-request logging (with SQL fingerprints) above REQUEST_METRICS_SLOW_MS
+REQUEST_METRICS_ENABLED = config('REQUEST_METRICS_ENABLED', default=False, cast=bool)
+REQUEST_METRICS_SLOW_MS = config('REQUEST_METRICS_SLOW_MS', default=500, cast=int)
+
+# Logging: JSON (or text) lines written by a background thread; DEBUG records
+# from the app are kept with probability LOG_DEBUG_SAMPLE_RATE. The level
+# defaults to WARNING under `manage.py test`, so the run only shows results.
+TESTING = sys.argv[1:2] == ['test']
+LOG_LEVEL = config('LOG_LEVEL', default='WARNING' if TESTING else 'INFO')
+LOG_FORMAT = config('LOG_FORMAT', default='json')
+LOG_DEBUG_SAMPLE_RATE = config('LOG_DEBUG_SAMPLE_RATE', default=1.0, cast=float)
+LOGGING = logging_config(level=LOG_LEVEL, fmt=LOG_FORMAT, debug_sample_rate=LOG_DEBUG_SAMPLE_RATE)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
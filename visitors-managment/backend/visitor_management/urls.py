@@ -2,11 +2,12 @@
 URL configuration for visitor_management project.
 """
 import os
+import re
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from visitors.views import home, admin_login, admin_dashboard, admin_logout
+from visitors.views_media import serve_media
 
 urlpatterns = [
     path('', home, name='home'),
@@ -20,6 +21,8 @@ urlpatterns = [
     path('admin-logout/', admin_logout, name='admin_logout'),
 ]
 
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Serve media files with cache validators and ranges, unless the web server does it
+if getattr(settings, 'MEDIA_SERVE_MODE', 'django') != 'off':
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+    ]
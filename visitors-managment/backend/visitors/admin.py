@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Visitor, Visit, VisitorPhoto
+from django.db.models import Count
+from .models import Visitor, Visit, VisitorPhoto, ExportJob, MediaTask, MediaBlob, VisitDailyRollup
 
 
 @admin.register(Visitor)
@@ -10,6 +11,9 @@ class VisitorAdmin(admin.ModelAdmin):
     readonly_fields = ['id', 'created_at', 'updated_at']
     ordering = ['-created_at']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(total_visits=Count('visits'))
+
 
 @admin.register(Visit)
 class VisitAdmin(admin.ModelAdmin):
@@ -31,4 +35,38 @@ class VisitorPhotoAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['visitor__name', 'visit__purpose']
     readonly_fields = ['id', 'created_at']
-    ordering = ['-created_at'] 
\ No newline at end of file
+    ordering = ['-created_at']
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'export_format', 'status', 'processed_rows', 'total_rows', 'created_at', 'finished_at']
+    list_filter = ['status', 'export_format']
+    readonly_fields = ['id', 'created_at', 'started_at', 'finished_at']
+    ordering = ['-created_at']
+
+
+@admin.register(MediaTask)
+class MediaTaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'visit', 'status', 'attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    exclude = ['file']
+    readonly_fields = ['id', 'created_at', 'finished_at']
+    ordering = ['-created_at']
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'ref_count', 'created_at', 'updated_at']
+    search_fields = ['name']
+    readonly_fields = ['name', 'ref_count', 'created_at', 'updated_at']
+    ordering = ['-created_at']
+
+
+@admin.register(VisitDailyRollup)
+class VisitDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'host_name', 'purpose', 'visits', 'total_duration_minutes', 'updated_at']
+    list_filter = ['date']
+    search_fields = ['host_name', 'purpose']
+    readonly_fields = [field.name for field in VisitDailyRollup._meta.fields]
+    ordering = ['-date']
@@ -3,4 +3,15 @@ from django.apps import AppConfig
 
 class VisitorsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'visitors' 
\ No newline at end of file
+    name = 'visitors'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from visitor_management import db_utils
+        from . import blobs, conditional
+
+        request_started.connect(db_utils.on_request_started, dispatch_uid='db_stats_request_started')
+        connection_created.connect(db_utils.on_connection_created, dispatch_uid='db_stats_connection_created')
+        blobs.connect_signals()
+        conditional.connect_signals()
@@ -0,0 +1,135 @@
+"""
+Reference counting for shared, content-hashed media files.
+
+Every row whose file field points at a stored file holds one reference in
+``MediaBlob``. Saving a row with a new file acquires a reference; replacing
+the file or deleting the row (including via CASCADE) releases one. A file and
+its renditions are removed once the transaction that dropped its last
+reference commits.
+
+Releasing the last reference leaves a zero-count row behind; the deletion
+locks that row and re-checks it, and removes it together with the file.
+``ContentHashStorage`` locks the same row (``reserve``) before reusing or
+writing a file, so a file cannot be deleted between being reused by an upload
+and that upload's reference being counted, as long as both happen in one
+transaction.
+
+Rows updated with ``QuerySet.update()`` bypass the signals below and must call
+``acquire``/``release`` themselves.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+
+from . import renditions
+from .models import MediaBlob, Visit, VisitorPhoto
+
+logger = logging.getLogger(__name__)
+
+# Models and the file fields whose files are reference counted.
+TRACKED_FIELDS = {
+    VisitorPhoto: ('image',),
+    Visit: ('signature_image',),
+}
+
+
+def reserve(name):
+    """Lock ``name``'s row, creating it without references, until the transaction ends."""
+    MediaBlob.objects.select_for_update().get_or_create(name=name)
+
+
+def acquire(name):
+    """Add a reference to the stored file ``name``."""
+    if not name:
+        return
+    with transaction.atomic():
+        blob, created = MediaBlob.objects.select_for_update().get_or_create(
+            name=name, defaults={'ref_count': 1}
+        )
+        if not created:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+
+
+def release(name, storage):
+    """Drop a reference to ``name``; the file is deleted after commit if it was the last."""
+    if not name:
+        return
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            # Not tracked (e.g. stored before reference counting); leave it alone.
+            return
+        if blob.ref_count > 0:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+        if blob.ref_count > 1:
+            return
+    transaction.on_commit(lambda: delete_if_unreferenced(name, storage))
+
+
+def delete_if_unreferenced(name, storage):
+    """Delete ``name``, its renditions and its row, unless it has been referenced again."""
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+        # Someone may have uploaded the same bytes again since the last release,
+        # or another process already deleted it.
+        if blob is None or blob.ref_count > 0:
+            return
+        storage.delete(name)
+        renditions.delete_renditions(name)
+        blob.delete()
+    logger.info("Deleted unreferenced media file %s", name)
+
+
+def stored_name(value):
+    """Storage name held by a file field's raw instance value, or ''."""
+    if isinstance(value, FieldFile):
+        return value.name or ''
+    if isinstance(value, str):
+        return value
+    return ''
+
+
+def remember_files(sender, instance, **kwargs):
+    """post_init: note the stored file names so post_save can tell what changed."""
+    instance._stored_files = {
+        field: stored_name(instance.__dict__[field])
+        for field in TRACKED_FIELDS[sender]
+        if field in instance.__dict__
+    }
+
+
+def update_file_references(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """post_save: acquire newly stored files and release replaced ones."""
+    if raw:
+        return
+    stored = getattr(instance, '_stored_files', {})
+    for field in TRACKED_FIELDS[sender]:
+        if update_fields is not None and field not in update_fields:
+            continue
+        if not created and field not in stored:
+            continue  # deferred and never loaded
+        old = '' if created else stored[field]
+        new = stored_name(getattr(instance, field))
+        if old != new:
+            acquire(new)
+            release(old, instance._meta.get_field(field).storage)
+        stored[field] = new
+    instance._stored_files = stored
+
+
+def release_file_references(sender, instance, **kwargs):
+    """post_delete: release the row's files (also runs for CASCADE deletes)."""
+    for field in TRACKED_FIELDS[sender]:
+        release(stored_name(getattr(instance, field)), instance._meta.get_field(field).storage)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_init, post_save
+
+    for model in TRACKED_FIELDS:
+        uid = f'media_blobs_{model._meta.model_name}'
+        post_init.connect(remember_files, sender=model, dispatch_uid=f'{uid}_init')
+        post_save.connect(update_file_references, sender=model, dispatch_uid=f'{uid}_save')
+        post_delete.connect(release_file_references, sender=model, dispatch_uid=f'{uid}_delete')
@@ -0,0 +1,183 @@
+"""
+Bulk check-in and check-out, for registration desks and end-of-day sweeps.
+
+Every item is validated first and gets its own result; the valid ones are then
+written with a fixed number of statements, whatever the batch size:
+
+* check-in matches returning visitors with one query on the normalized
+  email/phone keys, upserts new and changed visitors with one
+  ``bulk_create(update_conflicts=True)`` on the primary key and inserts the
+  visits with one ``bulk_create``;
+* check-out sets ``check_out_time`` and computes ``duration_minutes`` in a
+  single ``UPDATE``, then reads the rows back for the daily rollups.
+
+``bulk_create`` and ``update()`` bypass ``save()`` and model signals, so the
+visitors' derived columns, visit events, rollups and the list data version are
+maintained here instead. Photos and signatures are not accepted in bulk.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, F, Func, IntegerField, Q, Value
+from django.utils import timezone
+
+from . import conditional, events
+from .models import Visit, VisitDailyRollup, Visitor, VisitEvent
+from .search import email_key, phone_key
+from .serializers import BulkCheckInItemSerializer, CheckOutSerializer
+
+logger = logging.getLogger(__name__)
+
+VISITOR_FIELDS = ('name', 'email', 'phone')
+DUPLICATE_ERROR = 'This visitor appears more than once in the batch.'
+
+
+def max_items():
+    return getattr(settings, 'BULK_MAX_ITEMS', 500)
+
+
+class MinutesBetween(Func):
+    """Whole minutes from ``start`` to ``end``, truncated like ``Visit.check_out``."""
+    output_field = IntegerField()
+    arity = 2
+    template = 'CAST(FLOOR(EXTRACT(EPOCH FROM (%(end)s - %(start)s)) / 60) AS INTEGER)'
+
+    def as_sql(self, compiler, connection, template=None, **extra_context):
+        start, end = (compiler.compile(expression) for expression in self.get_source_expressions())
+        sql = (template or self.template) % {'start': start[0], 'end': end[0]}
+        return sql, (*end[1], *start[1])
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Django registers django_timestamp_diff (microseconds) on SQLite connections.
+        return self.as_sql(compiler, connection, template='(django_timestamp_diff(%(end)s, %(start)s) / 60000000)')
+
+
+def error(index, errors):
+    return {'index': index, 'status': 'error', 'errors': errors}
+
+
+def check_in_many(items):
+    """Check in each visitor in ``items``; returns one result per item, in order."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        serializer = BulkCheckInItemSerializer(data=item)
+        if serializer.is_valid():
+            data = serializer.validated_data
+            valid.append((index, data, email_key(data['email']), phone_key(data['phone'])))
+        else:
+            results[index] = error(index, serializer.errors)
+    if not valid:
+        return results
+
+    emails = {key_email for _, _, key_email, _ in valid}
+    phones = {key_phone for _, _, _, key_phone in valid}
+    by_email, by_phone = {}, {}
+    for visitor in Visitor.objects.filter(Q(email_key__in=emails) | Q(phone_key__in=phones)):
+        by_email.setdefault(visitor.email_key, visitor)
+        by_phone.setdefault(visitor.phone_key, visitor)
+
+    upserts, visits, checked_in = [], [], []
+    claimed = set()
+    for index, data, key_email, key_phone in valid:
+        # Like a single check-in: the email match wins, then the phone match.
+        visitor = by_email.get(key_email) or by_phone.get(key_phone)
+        phone_owner = by_phone.get(key_phone)
+        if visitor is not None and phone_owner is not None and phone_owner.pk != visitor.pk:
+            results[index] = error(index, {'phone': ['This phone number belongs to another visitor.']})
+            continue
+        claims = {('email', key_email), ('phone', key_phone)}
+        if visitor is not None:
+            claims.add(('visitor', visitor.pk))
+        if claims & claimed:
+            results[index] = error(index, {'non_field_errors': [DUPLICATE_ERROR]})
+            continue
+        claimed |= claims
+
+        returning = visitor is not None
+        if not returning:
+            visitor = Visitor(**{field: data[field] for field in VISITOR_FIELDS})
+        if not returning or any(getattr(visitor, field) != data[field] for field in VISITOR_FIELDS):
+            for field in VISITOR_FIELDS:
+                setattr(visitor, field, data[field])
+            visitor.set_derived_fields()
+            upserts.append(visitor)
+        visits.append(Visit(visitor=visitor, purpose=data['purpose'], host_name=data.get('host_name', '')))
+        checked_in.append((index, returning))
+
+    if not visits:
+        return results
+    with transaction.atomic():
+        if upserts:
+            Visitor.objects.bulk_create(
+                upserts, update_conflicts=True, unique_fields=['id'],
+                update_fields=['name', 'email', 'phone', 'phone_digits', 'email_key', 'phone_key', 'updated_at'],
+            )
+        Visit.objects.bulk_create(visits)
+        events.record_events(VisitEvent.KIND_CHECK_IN, [visit.pk for visit in visits])
+        conditional.bump()
+
+    for (index, returning), visit in zip(checked_in, visits):
+        results[index] = {
+            'index': index,
+            'status': 'checked_in',
+            'visit_id': visit.pk,
+            'visitor_id': visit.visitor_id,
+            'check_in_time': visit.check_in_time,
+            'is_returning_visitor': returning,
+        }
+    logger.info("Bulk checked in %d of %d visitor(s), %d new or updated",
+                len(visits), len(items), len(upserts))
+    return results
+
+
+def check_out_many(items):
+    """Check out each ``{"visit_id": ...}`` in ``items``; returns one result per item, in order."""
+    results = [None] * len(items)
+    requested = {}
+    for index, item in enumerate(items):
+        serializer = CheckOutSerializer(data=item)
+        if not serializer.is_valid():
+            results[index] = error(index, serializer.errors)
+        elif serializer.validated_data['visit_id'] in requested:
+            results[index] = error(index, {'visit_id': ['This visit appears more than once in the batch.']})
+        else:
+            requested[serializer.validated_data['visit_id']] = index
+    if not requested:
+        return results
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Visit.objects.filter(pk__in=requested, check_out_time__isnull=True).update(
+            check_out_time=now,
+            duration_minutes=MinutesBetween(F('check_in_time'), Value(now, output_field=DateTimeField())),
+        )
+        visits = {
+            visit.pk: visit
+            for visit in Visit.objects.filter(pk__in=requested).only(
+                'id', 'check_in_time', 'check_out_time', 'duration_minutes', 'host_name', 'purpose')
+        }
+        # Rows this UPDATE completed carry its exact timestamp.
+        checked_out = [visit for visit in visits.values() if visit.check_out_time == now]
+        if checked_out:
+            VisitDailyRollup.add_visits(checked_out)
+            events.record_events(VisitEvent.KIND_CHECK_OUT, [visit.pk for visit in checked_out])
+            conditional.bump()
+
+    for visit_id, index in requested.items():
+        visit = visits.get(visit_id)
+        if visit is None:
+            results[index] = error(index, {'visit_id': ['Visit not found']})
+        elif visit.check_out_time != now:
+            results[index] = error(index, {'visit_id': ['Visitor has already been checked out']})
+        else:
+            results[index] = {
+                'index': index,
+                'status': 'checked_out',
+                'visit_id': visit_id,
+                'check_out_time': visit.check_out_time,
+                'duration_minutes': visit.duration_minutes,
+            }
+    logger.info("Bulk checked out %d of %d visit(s)", updated, len(items))
+    return results
@@ -0,0 +1,95 @@
+"""
+Read-through response cache for visitor detail and visit lists.
+
+Entries are keyed by the current ``DataVersion`` (see ``visitors.conditional``)
+and the absolute request URL. Saving or deleting a ``Visitor``, ``Visit`` or
+``VisitorPhoto`` bumps that version via model signals once the write commits,
+so every process, whatever the ``CACHES`` backend, stops using older entries
+at once; they are then evicted by LRU or ``READ_CACHE_TIMEOUT``. The version
+is read before the data, so an entry is never older than its key.
+
+Responses built inside a transaction are not stored, since they may reflect
+uncommitted writes.
+"""
+import functools
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .conditional import request_version
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def cache_timeout():
+    return getattr(settings, 'READ_CACHE_TIMEOUT', 300)
+
+
+def count_lookup(namespace, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'bypassed': 0})
+        counters[outcome] += 1
+
+
+def cache_stats():
+    """Per-process hit/miss counters for each cached endpoint, with the hit ratio."""
+    with _stats_lock:
+        stats = {namespace: dict(counters) for namespace, counters in _stats.items()}
+    for counters in stats.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 4) if lookups else None
+    return stats
+
+
+def prometheus_text():
+    """Hit/miss counters in Prometheus text format, for ``/metrics/``."""
+    lines = [
+        '# HELP visitors_read_cache_lookups_total Read cache lookups by endpoint and outcome.',
+        '# TYPE visitors_read_cache_lookups_total counter',
+    ]
+    with _stats_lock:
+        for namespace, counters in sorted(_stats.items()):
+            for outcome, count in sorted(counters.items()):
+                lines.append(f'visitors_read_cache_lookups_total{{cache="{namespace}",outcome="{outcome}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def cache_key(namespace, request):
+    digest = hashlib.md5(request.build_absolute_uri().encode(), usedforsecurity=False).hexdigest()
+    return f'visitors:{namespace}:{request_version(request)}:{digest}'
+
+
+def cached_response(namespace):
+    """Cache the data of successful GET responses from a viewset method."""
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            timeout = cache_timeout()
+            if request.method != 'GET' or timeout <= 0:
+                return view_method(self, request, *args, **kwargs)
+            if transaction.get_connection().in_atomic_block:
+                count_lookup(namespace, 'bypassed')
+                return view_method(self, request, *args, **kwargs)
+
+            key = cache_key(namespace, request)
+            data = cache.get(key)
+            if data is not None:
+                count_lookup(namespace, 'hits')
+                return Response(data)
+            count_lookup(namespace, 'misses')
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                cache.set(key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
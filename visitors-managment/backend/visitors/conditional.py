@@ -0,0 +1,98 @@
+"""
+Conditional GET for the visit and visitor list endpoints.
+
+Listings embed visitors, visits and photos, so a single ``DataVersion`` row
+is bumped whenever any of them is written. The ETag of a list response is that
+version plus a digest of the URL (filters, page, cursor) and the negotiated
+media type; a poll whose ``If-None-Match`` still matches gets 304 without the
+list being queried or serialized.
+
+Rows changed with ``QuerySet.update()`` or ``bulk_create()`` skip the signals
+below and must call ``bump`` themselves.
+"""
+import functools
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .models import DataVersion, Visit, Visitor, VisitorPhoto
+
+VERSION_NAME = 'visits'
+TRACKED_MODELS = (Visitor, Visit, VisitorPhoto)
+
+
+def current_version():
+    return DataVersion.objects.filter(name=VERSION_NAME).values_list('version', flat=True).first() or 0
+
+
+def request_version(request):
+    """``current_version()`` read once per request, so its ETag and cache keys agree."""
+    version = getattr(request, '_data_version', None)
+    if version is None:
+        version = request._data_version = current_version()
+    return version
+
+
+def _increment():
+    if not DataVersion.objects.filter(name=VERSION_NAME).update(version=F('version') + 1):
+        try:
+            DataVersion.objects.create(name=VERSION_NAME, version=1)
+        except IntegrityError:
+            DataVersion.objects.filter(name=VERSION_NAME).update(version=F('version') + 1)
+
+
+def bump():
+    """
+    Invalidate list ETags once the current transaction commits.
+
+    Bumping after commit keeps the counter row out of the writer's locks; a
+    reader that sees the old version meanwhile just gets one more full response.
+    """
+    transaction.on_commit(_increment)
+
+
+def list_etag(request, version=None):
+    if version is None:
+        version = request_version(request)
+    accepted = getattr(request, 'accepted_media_type', '') or ''
+    digest = hashlib.md5(f'{request.get_full_path()}|{accepted}'.encode(), usedforsecurity=False)
+    return quote_etag(f'{VERSION_NAME}-{version}-{digest.hexdigest()[:16]}')
+
+
+def conditional_list(view_method):
+    """Answer GETs of a viewset list/action with 304 while the data version is unchanged."""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_method(self, request, *args, **kwargs)
+        etag = list_etag(request)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response['ETag'] = etag
+        else:
+            response = not_modified
+        # Clients must revalidate each poll rather than reuse a stale copy.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
+
+
+def bump_on_write(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    bump()
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+
+    for model in TRACKED_MODELS:
+        uid = f'data_version_{model._meta.model_name}'
+        post_save.connect(bump_on_write, sender=model, dispatch_uid=f'{uid}_save')
+        post_delete.connect(bump_on_write, sender=model, dispatch_uid=f'{uid}_delete')
@@ -0,0 +1,192 @@
+"""
+Server-Sent Events stream of active visitor changes for lobby screens.
+
+A new connection first receives a ``snapshot`` event with the full active list
+(the same body as ``/visitors/active/``), then ``check_in``, ``check_out`` and
+``media`` events as ``VisitEvent`` rows appear, each with its ``event_id``
+in the data.
+
+Ids are allocated at INSERT but rows appear at COMMIT, so a lower id can show
+up after a higher one. The stream therefore only moves its cursor past events
+older than ``EVENT_SETTLE_TIME`` and re-reads everything after it on each
+poll, skipping the ids it has already sent. The SSE ``id`` of each message is
+that cursor rather than the event's own id, so a client reconnecting with
+``Last-Event-ID`` gets every event it may have missed (or a fresh snapshot if
+those events were pruned); events from the last few seconds can be repeated,
+and clients drop them by ``event_id``.
+
+The log lives in the database so every worker process sees every change. The
+stream polls it with one indexed query per ``VISIT_EVENTS_POLL_INTERVAL``.
+Under ASGI the stream is an async iterator and holds no thread while idle.
+Connections end after ``VISIT_EVENTS_STREAM_SECONDS`` and the browser's
+EventSource reconnects. Under WSGI (``runserver``, the Vercel function) each
+stream holds a worker, so it degrades to long-polling: connections end after
+``VISIT_EVENTS_WSGI_STREAM_SECONDS``, well inside gunicorn's worker timeout.
+"""
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Visit, VisitEvent
+
+HEARTBEAT_SECONDS = 15
+DEFAULT_RETENTION = timedelta(days=1)
+RECONNECT_MS = 3000
+EVENT_BATCH_SIZE = 100
+# How long a transaction may hold an event between INSERT and COMMIT and
+# still have it streamed.
+EVENT_SETTLE_TIME = timedelta(seconds=5)
+
+
+def poll_interval():
+    return getattr(settings, 'VISIT_EVENTS_POLL_INTERVAL', 1.0)
+
+
+def stream_seconds():
+    return getattr(settings, 'VISIT_EVENTS_STREAM_SECONDS', 300)
+
+
+def wsgi_stream_seconds():
+    return getattr(settings, 'VISIT_EVENTS_WSGI_STREAM_SECONDS', 25)
+
+
+def record_event(kind, visit_id):
+    """Log a change for the stream; every ``VisitEvent`` is written here or by ``record_events``."""
+    return VisitEvent.objects.create(kind=kind, visit_id=visit_id)
+
+
+def record_events(kind, visit_ids):
+    """``record_event`` for many visits in one INSERT."""
+    return VisitEvent.objects.bulk_create([VisitEvent(kind=kind, visit_id=visit_id) for visit_id in visit_ids])
+
+
+def prune_events(older_than):
+    """Delete events older than the ``older_than`` timedelta; returns how many."""
+    deleted, _ = VisitEvent.objects.filter(created_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+def format_event(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ActiveVisitStream:
+    """Iterable of SSE chunks for one client; sync under WSGI, async under ASGI."""
+
+    def __init__(self, request, last_event_id=None):
+        self.request = request
+        # Every event up to ``cursor`` has been sent; ``sent`` maps the ids
+        # sent after it to their creation time.
+        self.cursor = last_event_id
+        self.sent = {}
+
+    def _serialize(self, visits):
+        # serializers imports jobs, which logs events through this module.
+        from .serializers import VisitSerializer
+
+        return VisitSerializer(visits, many=True, context={'request': self.request}).data
+
+    def open(self):
+        """Chunks sent on connect: reconnect hint plus a snapshot unless resuming."""
+        chunks = [f'retry: {RECONNECT_MS}\n\n']
+        latest = VisitEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        if self.cursor is not None:
+            oldest = VisitEvent.objects.order_by('id').values_list('id', flat=True).first()
+            if self.cursor <= latest and (oldest is None or oldest <= self.cursor + 1):
+                return chunks
+        # The snapshot covers every event committed so far, but ones that have
+        # not settled may still be overtaken by a lower id committing later.
+        self.cursor = VisitEvent.objects.filter(
+            id__lte=latest, created_at__lt=timezone.now() - EVENT_SETTLE_TIME
+        ).order_by('-id').values_list('id', flat=True).first() or 0
+        self.sent = dict(
+            VisitEvent.objects.filter(id__gt=self.cursor, id__lte=latest).values_list('id', 'created_at')
+        )
+        active = self._serialize(Visit.objects.for_listing().filter(check_out_time__isnull=True))
+        chunks.append(format_event(
+            {'active_visitors': active, 'count': len(active)}, event='snapshot', event_id=self.cursor
+        ))
+        return chunks
+
+    def _settle(self, recent):
+        """Record ``(id, created_at)`` pairs as sent and advance the cursor past settled ones."""
+        self.sent.update(recent)
+        cutoff = timezone.now() - EVENT_SETTLE_TIME
+        settled = [event_id for event_id, created_at in self.sent.items() if created_at < cutoff]
+        if settled:
+            self.cursor = max(self.cursor, *settled)
+        self.sent = {event_id: created_at for event_id, created_at in self.sent.items() if event_id > self.cursor}
+
+    def poll(self):
+        """Chunks for events logged since the cursor that have not been sent yet."""
+        events = list(
+            VisitEvent.objects.filter(id__gt=self.cursor).exclude(id__in=list(self.sent))
+            .order_by('id')[:EVENT_BATCH_SIZE]
+        )
+        if not events:
+            self._settle({})
+            return []
+        visits = Visit.objects.for_listing().filter(pk__in={event.visit_id for event in events})
+        by_id = {str(visit['id']): visit for visit in self._serialize(visits)}
+        self._settle((event.id, event.created_at) for event in events)
+        chunks = []
+        for event in events:
+            data = {'type': event.kind, 'event_id': event.id, 'visit_id': str(event.visit_id),
+                    'visit': by_id.get(str(event.visit_id))}
+            # Resuming here re-sends this event's successors and anything unsettled.
+            chunks.append(format_event(data, event=event.kind, event_id=min(self.cursor, event.id)))
+        return chunks
+
+    def __iter__(self):
+        yield from self.open()
+        deadline = time.monotonic() + min(stream_seconds(), wsgi_stream_seconds())
+        last_sent = time.monotonic()
+        while True:
+            chunks = self.poll()
+            if chunks:
+                yield ''.join(chunks)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+                yield ': keep-alive\n\n'
+                last_sent = time.monotonic()
+            if time.monotonic() >= deadline:
+                return
+            time.sleep(poll_interval())
+
+    async def __aiter__(self):
+        for chunk in await sync_to_async(self.open)():
+            yield chunk
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + stream_seconds()
+        last_sent = loop.time()
+        while True:
+            chunks = await sync_to_async(self.poll)()
+            if chunks:
+                yield ''.join(chunks)
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= HEARTBEAT_SECONDS:
+                yield ': keep-alive\n\n'
+                last_sent = loop.time()
+            if loop.time() >= deadline:
+                return
+            await asyncio.sleep(poll_interval())
+
@@ -0,0 +1,173 @@
+"""
+Visit history export writers (CSV, XLSX and the legacy Word document).
+
+CSV and XLSX rows are produced from ``queryset.iterator()`` so memory use stays
+flat no matter how many visits are exported.
+"""
+import csv
+import io
+import tempfile
+from datetime import datetime
+
+from django.http import FileResponse, StreamingHttpResponse
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches
+from openpyxl import Workbook
+
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_HEADERS = [
+    'Visitor ID', 'Visitor Name', 'Email', 'Phone Number',
+    'Purpose of Visit', 'Host Name', 'Approval Status', 'Visit ID',
+    'Check-in Time', 'Check-out Time', 'Duration (minutes)',
+    'Duration (formatted)', 'Is Active', 'Photo URL', 'Visitor Created At',
+    'Visitor Updated At', 'Visit Created At'
+]
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def export_filename(extension):
+    return f'visit_history_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+
+
+def iter_visits(queryset):
+    """Iterate visits in chunks with the visitor joined and photos prefetched."""
+    return queryset.for_listing().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def visit_row(visit, build_uri):
+    """
+    Return the export columns for a single visit.
+
+    ``build_uri`` turns a media path into an absolute URL, normally
+    ``request.build_absolute_uri``.
+    """
+    photo_url = ""
+    photos = list(visit.photos.all())
+    if photos and photos[0].image:
+        photo_url = build_uri(photos[0].image.url)
+
+    visitor = visit.visitor
+    return [
+        str(visitor.id),
+        visitor.name,
+        visitor.email,
+        visitor.phone,
+        visit.purpose,
+        visit.host_name or 'N/A',
+        visit.status,
+        str(visit.id),
+        visit.check_in_time.strftime(TIMESTAMP_FORMAT),
+        visit.check_out_time.strftime(TIMESTAMP_FORMAT) if visit.check_out_time else 'N/A',
+        str(visit.duration_minutes) if visit.duration_minutes is not None else 'N/A',
+        visit.duration_formatted,
+        'Yes' if visit.is_active else 'No',
+        photo_url,
+        visitor.created_at.strftime(TIMESTAMP_FORMAT),
+        visitor.updated_at.strftime(TIMESTAMP_FORMAT),
+        visit.check_in_time.strftime(TIMESTAMP_FORMAT),  # Visit created at is same as check-in time
+    ]
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(queryset, request):
+    """Stream the visits as CSV, one encoded row at a time."""
+    writer = csv.writer(_Echo())
+
+    def rows():
+        yield writer.writerow(EXPORT_HEADERS)
+        for visit in iter_visits(queryset):
+            yield writer.writerow(visit_row(visit, request.build_absolute_uri))
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{export_filename("csv")}"'
+    return response
+
+
+def write_csv(queryset, build_uri, fileobj, progress=None):
+    """
+    Write the visits to the text file ``fileobj`` as CSV.
+
+    ``progress`` is called with the number of rows written so far.
+    """
+    writer = csv.writer(fileobj)
+    writer.writerow(EXPORT_HEADERS)
+    for written, visit in enumerate(iter_visits(queryset), start=1):
+        writer.writerow(visit_row(visit, build_uri))
+        if progress and written % EXPORT_CHUNK_SIZE == 0:
+            progress(written)
+
+
+def write_xlsx(queryset, build_uri, fileobj, progress=None):
+    """
+    Write the visits to ``fileobj`` as an XLSX workbook in write-only mode.
+
+    ``progress`` is called with the number of rows written so far.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Visit History')
+    sheet.append(EXPORT_HEADERS)
+    for written, visit in enumerate(iter_visits(queryset), start=1):
+        sheet.append(visit_row(visit, build_uri))
+        if progress and written % EXPORT_CHUNK_SIZE == 0:
+            progress(written)
+    workbook.save(fileobj)
+
+
+def xlsx_response(queryset, request):
+    """
+    Stream the visits as an XLSX workbook.
+
+    The workbook is spooled to a temporary file (XLSX is a zip archive and can
+    only be finalised once complete) and then sent in blocks by ``FileResponse``.
+    """
+    tmp = tempfile.TemporaryFile()
+    write_xlsx(queryset, request.build_absolute_uri, tmp)
+    tmp.seek(0)
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=export_filename('xlsx'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def build_docx(queryset, request):
+    """Build the legacy Word document export and return its bytes."""
+    doc = Document()
+
+    title = doc.add_heading('Visit History', level=1)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    export_date = doc.add_paragraph(f'Exported on: {datetime.now().strftime(TIMESTAMP_FORMAT)}')
+    export_date.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    table = doc.add_table(rows=1, cols=len(EXPORT_HEADERS))
+    table.style = 'Table Grid'
+
+    hdr_cells = table.rows[0].cells
+    for i, header in enumerate(EXPORT_HEADERS):
+        hdr_cells[i].text = header
+        hdr_cells[i].paragraphs[0].runs[0].bold = True
+        hdr_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    for visit in iter_visits(queryset):
+        row_cells = table.add_row().cells
+        for i, value in enumerate(visit_row(visit, request.build_absolute_uri)):
+            row_cells[i].text = str(value)
+
+    for section in doc.sections:
+        section.left_margin = Inches(0.5)
+        section.right_margin = Inches(0.5)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,59 @@
+"""
+Shared filtering for visit history listings and exports.
+"""
+from datetime import datetime, time, timedelta
+
+import django_filters
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Visit
+from .search import visitor_match_q
+
+
+def start_of_day(value):
+    """Return the aware datetime at which ``value`` begins in the current time zone (TIME_ZONE)."""
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+class VisitHistoryFilter(django_filters.FilterSet):
+    """
+    Search filters shared by ``history``, ``export`` and export jobs.
+
+    Visitor fields are matched through the visitor search index (see
+    ``visitors.search``).
+
+    Date bounds are turned into a half-open ``[start, end)`` range on the raw
+    ``check_in_time`` column rather than ``check_in_time__date`` so the
+    database can use the ``(check_in_time, id)`` index.
+    """
+    name = django_filters.CharFilter(method='filter_visitor')
+    phone = django_filters.CharFilter(method='filter_visitor')
+    email = django_filters.CharFilter(method='filter_visitor')
+    date_from = django_filters.DateFilter(method='filter_date_from')
+    date_to = django_filters.DateFilter(method='filter_date_to')
+
+    class Meta:
+        model = Visit
+        fields = []
+
+    def filter_visitor(self, queryset, name, value):
+        return queryset.filter(visitor_match_q(value, fields=(name,), prefix='visitor__'))
+
+    def filter_date_from(self, queryset, name, value):
+        return queryset.filter(check_in_time__gte=start_of_day(value))
+
+    def filter_date_to(self, queryset, name, value):
+        # date_to is inclusive: stop at the start of the following day.
+        return queryset.filter(check_in_time__lt=start_of_day(value + timedelta(days=1)))
+
+
+VISIT_FILTER_PARAMS = tuple(VisitHistoryFilter.base_filters)
+
+
+def filter_visits(visits, params):
+    """Apply the history search filters found in ``params`` to ``visits``."""
+    filterset = VisitHistoryFilter(params, queryset=visits)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
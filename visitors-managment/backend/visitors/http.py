@@ -0,0 +1,90 @@
+"""
+HTTP helpers for serving stored files with byte-range support.
+"""
+import re
+
+from django.http import HttpResponse, StreamingHttpResponse
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    Parse a single ``Range: bytes=start-end`` header against a file of ``size`` bytes.
+
+    Returns ``(start, end)`` inclusive, ``None`` when the header should be ignored
+    (absent, malformed or multi-range), or ``False`` when it cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def iter_file_range(fileobj, start, length, block_size=STREAM_BLOCK_SIZE):
+    """Yield ``length`` bytes of ``fileobj`` starting at ``start``, then close it."""
+    try:
+        fileobj.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fileobj.read(min(block_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def ranged_file_response(request, fileobj, size, content_type, filename=None, headers=None):
+    """
+    Stream ``fileobj`` honouring a single byte range from the request.
+
+    Returns 206 with ``Content-Range`` for a satisfiable range, 416 for an
+    unsatisfiable one and a plain 200 otherwise. ``headers`` are copied onto
+    every response (e.g. caching validators); a range whose ``If-Range`` does
+    not match the ``ETag`` among them is ignored.
+    """
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if byte_range is not None and if_range and if_range != (headers or {}).get('ETag'):
+        byte_range = None
+
+    if byte_range is False:
+        fileobj.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None:
+        response = StreamingHttpResponse(iter_file_range(fileobj, 0, size), content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            iter_file_range(fileobj, start, length), content_type=content_type, status=206
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
@@ -0,0 +1,284 @@
+"""
+Background runners for visit history export jobs, check-in media tasks and
+photo renditions.
+
+Work is executed by in-process thread pools so no external broker is needed.
+With ``EXPORT_JOB_WORKERS = 0`` (or ``MEDIA_TASK_WORKERS = 0``) it stays
+pending until ``python manage.py run_export_jobs`` (or
+``process_media_tasks``) picks it up.
+"""
+import io
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import blobs, conditional, events, exports, renditions
+from .filters import filter_visits
+from .models import ExportJob, MediaTask, Visit, VisitEvent, VisitorPhoto
+from .signatures import signature_filename
+
+logger = logging.getLogger(__name__)
+
+# Worker pools by name, sized from the matching setting.
+POOL_SETTINGS = {
+    'export-job': ('EXPORT_JOB_WORKERS', 2),
+    'media-task': ('MEDIA_TASK_WORKERS', 2),
+}
+
+MEDIA_TASK_MAX_ATTEMPTS = 3
+# Seconds before the first retry; doubled after each further failure.
+MEDIA_TASK_RETRY_DELAY = 5
+
+_executors = {}
+_executor_lock = threading.Lock()
+# Photos whose renditions are queued in this process, so listings queue each once.
+_queued_renditions = set()
+_queued_renditions_lock = threading.Lock()
+
+
+def get_worker_count(pool='export-job'):
+    setting, default = POOL_SETTINGS[pool]
+    return getattr(settings, setting, default)
+
+
+def get_executor(pool='export-job'):
+    with _executor_lock:
+        if pool not in _executors:
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=get_worker_count(pool), thread_name_prefix=pool
+            )
+        return _executors[pool]
+
+
+def enqueue_export_job(job):
+    """
+    Schedule ``job`` on the local thread pool once the current transaction commits.
+
+    Returns False when in-process workers are disabled and the job is left for
+    the ``run_export_jobs`` management command.
+    """
+    if get_worker_count() <= 0:
+        return False
+    transaction.on_commit(lambda: get_executor().submit(_run_in_thread, run_export_job, job.pk))
+    return True
+
+
+def _run_in_thread(func, *args):
+    try:
+        func(*args)
+    finally:
+        # Worker threads get their own connection; don't leak it.
+        connection.close()
+
+
+def run_export_job(job_id):
+    """
+    Run a pending export job to completion.
+
+    The job is claimed with a conditional UPDATE so two workers never run the
+    same job. Returns True if this call ran the job.
+    """
+    claimed = ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_PENDING).update(
+        status=ExportJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        visits = filter_visits(Visit.objects.order_by('-check_in_time'), job.filters)
+        job.total_rows = visits.count()
+        ExportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+        def progress(written):
+            ExportJob.objects.filter(pk=job.pk).update(processed_rows=written)
+
+        def build_uri(path):
+            return urljoin(job.base_url, path)
+
+        with tempfile.TemporaryFile() as tmp:
+            if job.export_format == 'xlsx':
+                exports.write_xlsx(visits, build_uri, tmp, progress)
+            else:
+                text = io.TextIOWrapper(tmp, encoding='utf-8', newline='')
+                exports.write_csv(visits, build_uri, text, progress)
+                text.flush()
+                text.detach()
+            tmp.seek(0)
+            job.file.save(exports.export_filename(job.export_format), File(tmp), save=False)
+
+        job.status = ExportJob.STATUS_COMPLETED
+        job.processed_rows = job.total_rows
+    except Exception as e:
+        logger.exception("Export job %s failed", job_id)
+        job.status = ExportJob.STATUS_FAILED
+        job.error = str(e)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file', 'processed_rows', 'total_rows', 'error', 'finished_at'])
+    return True
+
+
+def enqueue_media_tasks(tasks):
+    """
+    Schedule media ``tasks`` on the local thread pool once the current transaction commits.
+
+    Returns False when in-process workers are disabled and the tasks are left
+    for the ``process_media_tasks`` management command.
+    """
+    if get_worker_count('media-task') <= 0:
+        return False
+    task_ids = [task.pk for task in tasks]
+    transaction.on_commit(lambda: [_submit_media_task(task_id) for task_id in task_ids])
+    return True
+
+
+def _submit_media_task(task_id):
+    get_executor('media-task').submit(_run_in_thread, run_media_task, task_id)
+
+
+def _schedule_retry(task_id, delay):
+    if get_worker_count('media-task') <= 0:
+        return
+    timer = threading.Timer(delay, _submit_media_task, args=[task_id])
+    timer.daemon = True
+    timer.start()
+
+
+def store_media(task):
+    """Store the task's staged file where the visit expects it; returns the new photo, if any."""
+    visit = task.visit
+    with task.file.open('rb') as staged:
+        if task.kind == MediaTask.KIND_PHOTO:
+            return VisitorPhoto.objects.create(
+                visitor_id=visit.visitor_id,
+                visit=visit,
+                image=File(staged.file, name=f"visitor_photo_{visit.id}.{task.file_ext}"),
+            )
+        visit.signature_image.save(signature_filename(task.file_ext), File(staged.file), save=False)
+    Visit.objects.filter(pk=visit.pk).update(signature_image=visit.signature_image.name)
+    # update() skips post_save, so count the reference and bump list ETags here.
+    blobs.acquire(visit.signature_image.name)
+    conditional.bump()
+    return None
+
+
+def run_media_task(task_id, ignore_delay=False):
+    """
+    Run a pending media task once.
+
+    The task is claimed with a conditional UPDATE so two workers never run it
+    together. Failures are retried with exponential backoff up to
+    ``MEDIA_TASK_MAX_ATTEMPTS`` times. Returns True if this call ran the task.
+    """
+    claim = MediaTask.objects.filter(pk=task_id, status=MediaTask.STATUS_PENDING)
+    if not ignore_delay:
+        claim = claim.filter(run_after__lte=timezone.now())
+    if not claim.update(status=MediaTask.STATUS_RUNNING, attempts=F('attempts') + 1):
+        return False
+
+    task = MediaTask.objects.select_related('visit').get(pk=task_id)
+    staged = task.file
+    photo = None
+    try:
+        with transaction.atomic():
+            photo = store_media(task)
+            task.status = MediaTask.STATUS_COMPLETED
+            task.file = None
+            task.error = ''
+            task.finished_at = timezone.now()
+            task.save(update_fields=['status', 'file', 'error', 'finished_at'])
+    except Exception as e:
+        logger.exception("Media task %s failed (attempt %s)", task_id, task.attempts)
+        task.error = str(e)
+        if task.attempts < MEDIA_TASK_MAX_ATTEMPTS:
+            delay = MEDIA_TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+            task.status = MediaTask.STATUS_PENDING
+            task.run_after = timezone.now() + timedelta(seconds=delay)
+            task.save(update_fields=['status', 'run_after', 'error'])
+            _schedule_retry(task_id, delay)
+            return True
+        task.status = MediaTask.STATUS_FAILED
+        task.finished_at = timezone.now()
+        task.save(update_fields=['status', 'error', 'finished_at'])
+
+    if task.status == MediaTask.STATUS_COMPLETED:
+        # Only now that the stored copy is committed.
+        staged.storage.delete(staged.name)
+    if photo is not None:
+        renditions.create_photo_renditions(photo)
+    update_media_status(task.visit_id)
+    return True
+
+
+def update_media_status(visit_id):
+    """Mark the visit's media ready (or failed) once none of its tasks are outstanding."""
+    statuses = set(MediaTask.objects.filter(visit_id=visit_id).values_list('status', flat=True))
+    if statuses & {MediaTask.STATUS_PENDING, MediaTask.STATUS_RUNNING}:
+        return
+    media_status = Visit.MEDIA_FAILED if MediaTask.STATUS_FAILED in statuses else Visit.MEDIA_READY
+    Visit.objects.filter(pk=visit_id).update(media_status=media_status)
+    conditional.bump()
+    events.record_event(VisitEvent.KIND_MEDIA, visit_id)
+
+
+def enqueue_renditions(photo):
+    """
+    Create a pending photo's renditions on the media pool, once per process.
+
+    Returns False when in-process workers are disabled and the photo is left
+    for the ``process_media_tasks`` management command.
+    """
+    if get_worker_count('media-task') <= 0:
+        return False
+    with _queued_renditions_lock:
+        if photo.pk in _queued_renditions:
+            return True
+        _queued_renditions.add(photo.pk)
+    photo_id = photo.pk
+    transaction.on_commit(
+        lambda: get_executor('media-task').submit(_run_in_thread, run_rendition_task, photo_id)
+    )
+    return True
+
+
+def run_rendition_task(photo_id):
+    """Create the missing renditions of a pending photo; returns True if it was pending."""
+    try:
+        photo = VisitorPhoto.objects.filter(
+            pk=photo_id, renditions_status=VisitorPhoto.RENDITIONS_PENDING
+        ).first()
+        if photo is None:
+            return False
+        renditions.create_photo_renditions(photo, missing_only=True)
+        return True
+    finally:
+        with _queued_renditions_lock:
+            _queued_renditions.discard(photo_id)
+
+
+def run_pending_renditions():
+    """Create renditions for every pending photo; returns how many were processed."""
+    pending = VisitorPhoto.objects.filter(renditions_status=VisitorPhoto.RENDITIONS_PENDING)
+    return sum(run_rendition_task(photo_id) for photo_id in pending.values_list('id', flat=True))
+
+
+def run_pending_media_tasks(ignore_delay=False):
+    """Run every pending media task in creation order; returns how many were run."""
+    pending = MediaTask.objects.filter(status=MediaTask.STATUS_PENDING)
+    if not ignore_delay:
+        pending = pending.filter(run_after__lte=timezone.now())
+    ran = 0
+    for task_id in pending.order_by('created_at').values_list('id', flat=True):
+        if run_media_task(task_id, ignore_delay=ignore_delay):
+            ran += 1
+    return ran
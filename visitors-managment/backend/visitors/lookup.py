@@ -0,0 +1,120 @@
+"""
+Returning-visitor lookup by email or phone.
+
+The check-in form calls ``/api/visitors/search/`` as soon as an email or phone
+is entered, and check-in itself looks the visitor up again. Both use
+``find_returning_visitor``: a single query on the indexed ``email_key`` and
+``phone_key`` columns (lower-cased email, E.164 phone) that also selects the
+visit count, last check-in and active visit as correlated subqueries, so
+``VisitorSerializer`` needs no per-visitor queries of its own.
+
+Results, including "not found", are cached for
+``VISITOR_LOOKUP_CACHE_SECONDS`` under the current ``DataVersion``, so any
+committed visitor or visit write retires them in every process. Lookups made
+inside a transaction are not cached.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .caching import count_lookup
+from .conditional import current_version
+from .models import Visit, Visitor
+from .search import email_key, phone_key
+
+CACHE_NAMESPACE = 'lookup'
+# Emails and phones are unique, but legacy rows may differ only by case or
+# phone formatting; a handful of candidates is enough to rank them.
+MAX_CANDIDATES = 5
+
+_missing = object()
+
+
+def cache_timeout():
+    return getattr(settings, 'VISITOR_LOOKUP_CACHE_SECONDS', 30)
+
+
+def with_lookup_stats(queryset):
+    """Annotate what ``VisitorSerializer`` reads, without joins or GROUP BY."""
+    visits = Visit.objects.filter(visitor=OuterRef('pk')).order_by()
+    return queryset.annotate(
+        total_visits=Coalesce(Subquery(visits.values('visitor').annotate(count=Count('pk')).values('count')), 0),
+        last_check_in=Subquery(visits.order_by('-check_in_time').values('check_in_time')[:1]),
+        active_visit_pk=Subquery(
+            visits.filter(check_out_time__isnull=True).order_by('-check_in_time').values('pk')[:1]
+        ),
+    )
+
+
+def _query(email, key_email, key_phone):
+    """Return the best email match and the best phone match, from one query."""
+    condition = Q()
+    if key_email:
+        condition |= Q(email_key=key_email)
+    if key_phone:
+        condition |= Q(phone_key=key_phone)
+    candidates = list(with_lookup_stats(Visitor.objects.filter(condition))[:MAX_CANDIDATES])
+    # Among case variants of the email, prefer the exact spelling.
+    by_email = sorted((v for v in candidates if key_email and v.email_key == key_email),
+                      key=lambda visitor: visitor.email != email)
+    by_phone = [v for v in candidates if key_phone and v.phone_key == key_phone]
+    return (by_email[0] if by_email else None), (by_phone[0] if by_phone else None)
+
+
+def _cache_key(version, kind, value):
+    digest = hashlib.md5(value.encode(), usedforsecurity=False).hexdigest()
+    return f'visitors:{CACHE_NAMESPACE}:{version}:{kind}:{digest}'
+
+
+def find_returning_visitor(email=None, phone=None):
+    """
+    Return the visitor with this email or, failing that, this phone, or ``None``.
+
+    The visitor carries ``total_visits``, ``last_check_in`` and
+    ``active_visit_pk`` annotations. The email and phone results are cached
+    separately, so a search by email alone also serves a check-in that adds
+    the phone.
+    """
+    key_email, key_phone = email_key(email), phone_key(phone)
+    if not key_email and not key_phone:
+        return None
+    timeout = cache_timeout()
+    if timeout > 0 and transaction.get_connection().in_atomic_block:
+        count_lookup(CACHE_NAMESPACE, 'bypassed')
+        timeout = 0
+    if timeout <= 0:
+        by_email, by_phone = _query(email, key_email, key_phone)
+        return by_email or by_phone
+
+    version = current_version()
+    keys = {}
+    if key_email:
+        keys['email'] = _cache_key(version, 'email', f'{key_email}|{email}')
+    if key_phone:
+        keys['phone'] = _cache_key(version, 'phone', key_phone)
+    cached = cache.get_many(keys.values())
+    by_email = cached.get(keys.get('email'), _missing) if key_email else None
+    by_phone = cached.get(keys.get('phone'), _missing) if key_phone else None
+    # An email match answers on its own; otherwise the phone result is needed too.
+    if by_email is not _missing and (by_email is not None or by_phone is not _missing):
+        count_lookup(CACHE_NAMESPACE, 'hits')
+        return by_email or by_phone
+
+    count_lookup(CACHE_NAMESPACE, 'misses')
+    by_email, by_phone = _query(email, key_email, key_phone)
+    cache.set_many({keys[kind]: visitor for kind, visitor in (('email', by_email), ('phone', by_phone))
+                    if kind in keys}, timeout)
+    return by_email or by_phone
+
+
+def attach_active_visit(visitor):
+    """Load the visitor's active visit, if any, where ``VisitorSerializer`` looks for it."""
+    if visitor.active_visit_pk is None:
+        visitor.active_visits = []
+    else:
+        visitor.active_visits = list(Visit.objects.for_listing().filter(pk=visitor.active_visit_pk))
+    return visitor
@@ -0,0 +1,39 @@
+"""
+Django management command to rebuild the daily visit rollups used by analytics
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from visitors.rollups import rebuild
+
+
+def date_argument(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Recompute VisitDailyRollup rows from completed visits (all days by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=date_argument,
+            help='First check-in date to rebuild (YYYY-MM-DD); defaults to the earliest visit'
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=date_argument,
+            help='Last check-in date to rebuild (YYYY-MM-DD); defaults to today'
+        )
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['date_from'], options['date_to']
+        if date_from and date_to and date_from > date_to:
+            raise CommandError('--from must not be after --to')
+        written = rebuild(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} rollup row(s)'))
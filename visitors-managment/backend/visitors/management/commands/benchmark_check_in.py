@@ -0,0 +1,90 @@
+"""
+Django management command to measure queries and latency per check-in
+"""
+import base64
+import io
+import statistics
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+
+
+def png_data_url(size=(300, 120)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark queries and latency per check-in (all writes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Check-ins per scenario (default: 50)'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        signature = png_data_url()
+        scenarios = [
+            ('new visitor', lambda i: self.payload(uuid.uuid4().hex)),
+            ('returning visitor', lambda i: self.payload('returning')),
+            ('returning + signature', lambda i: dict(self.payload('returning'), signature_data=signature)),
+        ]
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['*']):
+            client = Client()
+            try:
+                with transaction.atomic():
+                    # Seed the returning visitor.
+                    client.post('/api/visitors/check_in/', self.payload('returning'),
+                                content_type='application/json')
+                    for label, make_payload in scenarios:
+                        self.run_scenario(client, label, make_payload, iterations)
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def payload(self, key):
+        return {
+            'name': f'Benchmark {key}',
+            'email': f'{key}@benchmark.invalid',
+            'phone': f'+1{abs(hash(key)) % 10**10:010d}',
+            'purpose': 'Benchmark',
+            'host_name': 'Host',
+        }
+
+    def run_scenario(self, client, label, make_payload, iterations):
+        queries = []
+        timings = []
+        for i in range(iterations):
+            payload = make_payload(i)
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.post('/api/visitors/check_in/', payload, content_type='application/json')
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 201:
+                self.stdout.write(self.style.ERROR(f"{label}: HTTP {response.status_code} {response.content[:200]}"))
+                return
+            queries.append(len(ctx.captured_queries))
+
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(
+            f"{label:<24} queries/check-in: {statistics.mean(queries):5.1f}   "
+            f"mean: {statistics.mean(timings):7.2f} ms   p95: {p95:7.2f} ms"
+        )
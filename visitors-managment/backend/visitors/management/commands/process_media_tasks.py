@@ -0,0 +1,85 @@
+"""
+Django management command to inspect and drain the check-in media task queue
+and create pending photo renditions
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from visitors.jobs import run_pending_media_tasks, run_pending_renditions
+from visitors.models import MediaTask, Visit
+
+
+class Command(BaseCommand):
+    help = 'Run pending photo/signature tasks left by check-in, or list the queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Show queue counts and unfinished tasks without running anything'
+        )
+        parser.add_argument(
+            '--requeue-running',
+            action='store_true',
+            help='Reset tasks left "running" by a crashed worker back to pending first'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Give failed tasks a fresh set of attempts first'
+        )
+        parser.add_argument(
+            '--ignore-delay',
+            action='store_true',
+            help='Run tasks that are waiting out a retry delay now'
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self.list_queue()
+            return
+
+        if options['requeue_running']:
+            requeued = MediaTask.objects.filter(status=MediaTask.STATUS_RUNNING).update(
+                status=MediaTask.STATUS_PENDING
+            )
+            self.stdout.write(f"Requeued {requeued} running task(s)")
+
+        if options['retry_failed']:
+            failed = MediaTask.objects.filter(status=MediaTask.STATUS_FAILED)
+            visit_ids = set(failed.values_list('visit_id', flat=True))
+            retried = failed.update(
+                status=MediaTask.STATUS_PENDING, attempts=0, run_after=timezone.now(), finished_at=None
+            )
+            self.stdout.write(f"Retrying {retried} failed task(s)")
+            # Visits go back to "processing" until their tasks finish again.
+            Visit.objects.filter(pk__in=visit_ids).update(media_status=Visit.MEDIA_PROCESSING)
+
+        ran = run_pending_media_tasks(ignore_delay=options['ignore_delay'])
+        self.stdout.write(f"Processed {ran} media task(s)")
+        self.stdout.write(f"Created renditions for {run_pending_renditions()} photo(s)")
+        self.list_failed()
+
+    def list_queue(self):
+        counts = dict(
+            MediaTask.objects.values_list('status').annotate(n=Count('id')).order_by()
+        )
+        for status, label in MediaTask.STATUS_CHOICES:
+            self.stdout.write(f"{label:<10} {counts.get(status, 0)}")
+
+        unfinished = MediaTask.objects.filter(
+            status__in=[MediaTask.STATUS_PENDING, MediaTask.STATUS_RUNNING]
+        ).order_by('created_at')
+        for task in unfinished:
+            self.stdout.write(
+                f"{task.id}  {task.kind:<9} {task.status:<8} attempts={task.attempts} "
+                f"run_after={task.run_after:%Y-%m-%d %H:%M:%S}"
+            )
+        self.list_failed()
+
+    def list_failed(self):
+        for task in MediaTask.objects.filter(status=MediaTask.STATUS_FAILED).order_by('created_at'):
+            self.stdout.write(self.style.ERROR(
+                f"{task.id}  {task.kind:<9} failed after {task.attempts} attempt(s): {task.error}"
+            ))
@@ -0,0 +1,24 @@
+"""
+Django management command to delete old entries from the active-visitor event log
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from visitors.events import DEFAULT_RETENTION, prune_events
+
+
+class Command(BaseCommand):
+    help = 'Delete visit events older than the retention period (clients then resync from a snapshot)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            default=DEFAULT_RETENTION.total_seconds() / 86400,
+            help='Keep events from the last N days (default: %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_events(timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} visit events'))
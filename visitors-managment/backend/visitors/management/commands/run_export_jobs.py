@@ -0,0 +1,36 @@
+"""
+Django management command to run pending background export jobs
+"""
+from django.core.management.base import BaseCommand
+
+from visitors.jobs import run_export_job
+from visitors.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Run pending visit history export jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requeue-running',
+            action='store_true',
+            help='Reset jobs left "running" by a crashed worker back to pending first'
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            requeued = ExportJob.objects.filter(status=ExportJob.STATUS_RUNNING).update(
+                status=ExportJob.STATUS_PENDING, started_at=None, processed_rows=0
+            )
+            self.stdout.write(f"Requeued {requeued} running job(s)")
+
+        pending = ExportJob.objects.filter(status=ExportJob.STATUS_PENDING).order_by('created_at')
+        ran = 0
+        for job_id in pending.values_list('id', flat=True):
+            if run_export_job(job_id):
+                job = ExportJob.objects.get(pk=job_id)
+                style = self.style.SUCCESS if job.status == ExportJob.STATUS_COMPLETED else self.style.ERROR
+                self.stdout.write(style(f"Export job {job_id}: {job.status}"))
+                ran += 1
+
+        self.stdout.write(f"Processed {ran} export job(s)")
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+ACTIVE_FALLBACK_INDEX = models.Index(
+    fields=['check_out_time', 'check_in_time'], name='visit_active_fallback_idx'
+)
+
+
+def add_active_fallback_index(apps, schema_editor):
+    """Backends without partial indexes get a plain (check_out_time, check_in_time) index."""
+    if schema_editor.connection.features.supports_partial_indexes:
+        return
+    schema_editor.add_index(apps.get_model('visitors', 'Visit'), ACTIVE_FALLBACK_INDEX)
+
+
+def remove_active_fallback_index(apps, schema_editor):
+    if schema_editor.connection.features.supports_partial_indexes:
+        return
+    schema_editor.remove_index(apps.get_model('visitors', 'Visit'), ACTIVE_FALLBACK_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['check_in_time', 'id'], name='visit_checkin_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['visitor', 'check_in_time'], name='visit_visitor_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(condition=models.Q(('check_out_time__isnull', True)), fields=['check_in_time'], name='visit_active_idx'),
+        ),
+        migrations.RunPython(add_active_fallback_index, remove_active_fallback_index),
+        # visit_visitor_checkin_idx covers visitor_id lookups, so drop the FK's own index.
+        migrations.AlterField(
+            model_name='visit',
+            name='visitor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='visits', to='visitors.visitor'),
+        ),
+        migrations.AddIndex(
+            model_name='visitorphoto',
+            index=models.Index(fields=['visit', 'created_at'], name='photo_visit_created_idx'),
+        ),
+        # photo_visit_created_idx covers visit_id lookups, so drop the FK's own index.
+        migrations.AlterField(
+            model_name='visitorphoto',
+            name='visit',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='visitors.visit'),
+        ),
+    ]
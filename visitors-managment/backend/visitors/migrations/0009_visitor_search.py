@@ -0,0 +1,111 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:59
+
+import logging
+import re
+
+from django.db import migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX IF NOT EXISTS visitor_name_trgm_idx ON visitors_visitor USING gin (UPPER(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS visitor_email_trgm_idx ON visitors_visitor USING gin (UPPER(email) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS visitor_phone_digits_trgm_idx ON visitors_visitor USING gin (phone_digits gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS visitor_name_trgm_idx",
+    "DROP INDEX IF EXISTS visitor_email_trgm_idx",
+    "DROP INDEX IF EXISTS visitor_phone_digits_trgm_idx",
+]
+
+# SQLite: FTS5 trigram table (substring matching) kept in sync by triggers.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE visitors_visitor_fts USING fts5("
+    "id UNINDEXED, name, email, phone_digits, tokenize='trigram')",
+    "INSERT INTO visitors_visitor_fts (id, name, email, phone_digits) "
+    "SELECT id, name, email, phone_digits FROM visitors_visitor",
+    "CREATE TRIGGER visitors_visitor_fts_insert AFTER INSERT ON visitors_visitor BEGIN "
+    "INSERT INTO visitors_visitor_fts (id, name, email, phone_digits) "
+    "VALUES (new.id, new.name, new.email, new.phone_digits); END",
+    "CREATE TRIGGER visitors_visitor_fts_delete AFTER DELETE ON visitors_visitor BEGIN "
+    "DELETE FROM visitors_visitor_fts WHERE id = old.id; END",
+    "CREATE TRIGGER visitors_visitor_fts_update AFTER UPDATE ON visitors_visitor "
+    "WHEN old.name IS NOT new.name OR old.email IS NOT new.email "
+    "OR old.phone_digits IS NOT new.phone_digits BEGIN "
+    "UPDATE visitors_visitor_fts SET name = new.name, email = new.email, "
+    "phone_digits = new.phone_digits WHERE id = old.id; END",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS visitors_visitor_fts_insert",
+    "DROP TRIGGER IF EXISTS visitors_visitor_fts_delete",
+    "DROP TRIGGER IF EXISTS visitors_visitor_fts_update",
+    "DROP TABLE IF EXISTS visitors_visitor_fts",
+]
+
+
+def backfill_phone_digits(apps, schema_editor):
+    Visitor = apps.get_model('visitors', 'Visitor')
+    batch = []
+    for visitor in Visitor.objects.only('id', 'phone').iterator(chunk_size=BATCH_SIZE):
+        visitor.phone_digits = re.sub(r'\D', '', visitor.phone or '')
+        batch.append(visitor)
+        if len(batch) >= BATCH_SIZE:
+            Visitor.objects.bulk_update(batch, ['phone_digits'])
+            batch = []
+    if batch:
+        Visitor.objects.bulk_update(batch, ['phone_digits'])
+
+
+def sqlite_supports_trigram_fts(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+            cursor.execute("DROP TABLE temp.fts_probe")
+        except Exception:
+            return False
+    return True
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception as e:
+            logger.warning("pg_trgm unavailable, visitor search will not be indexed: %s", e)
+            return
+        for sql in POSTGRES_FORWARD:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        if not sqlite_supports_trigram_fts(schema_editor):
+            logger.warning("SQLite lacks the FTS5 trigram tokenizer; visitor search will use LIKE")
+            return
+        for sql in SQLITE_FORWARD:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0008_visit_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitor',
+            name='phone_digits',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Digits of the phone number, for search', max_length=20),
+        ),
+        migrations.RunPython(backfill_phone_digits, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
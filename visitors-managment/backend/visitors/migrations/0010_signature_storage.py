@@ -0,0 +1,113 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:06
+
+import base64
+import binascii
+import json
+import logging
+import uuid
+
+from django.core.files.base import ContentFile
+from django.db import migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+
+# The parsing below is a frozen copy of what visitors.signatures did when this
+# migration was written, so later changes to the app cannot change its result.
+IMAGE_SIGNATURES = {
+    b'\x89PNG': 'png',
+    b'\xff\xd8\xff': 'jpg',
+    b'RIFF': 'webp',
+    b'GIF8': 'gif',
+}
+
+
+def compact_vector(value):
+    if not value.lstrip().startswith(('{', '[')):
+        return None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return None
+    if not isinstance(parsed, (dict, list)):
+        return None
+    return json.dumps(parsed, separators=(',', ':'))
+
+
+def decode_image(value):
+    """Return ``(ext, bytes)`` for a data URL or bare base64 image; raises ValueError."""
+    if value.startswith('data:image/'):
+        if ';base64,' not in value:
+            raise ValueError("expected a base64 data URL")
+        value = value.split(';base64,', 1)[1]
+    try:
+        raw = base64.b64decode(value, validate=True)
+    except binascii.Error as e:
+        raise ValueError(str(e))
+    for magic, ext in IMAGE_SIGNATURES.items():
+        if raw.startswith(magic):
+            return ext, raw
+    raise ValueError("not a recognised image")
+
+
+def parse_signature(value):
+    """Return ``(vector_json, image_file)``; raises ValueError if the value is neither."""
+    vector = compact_vector(value)
+    if vector is not None:
+        return vector, None
+    ext, raw = decode_image(value)
+    return None, ContentFile(raw, name=f'signature_migrated_{uuid.uuid4().hex[:8]}.{ext}')
+
+
+def move_signature_blobs(apps, schema_editor):
+    """
+    Store each existing signature once.
+
+    Base64 images become files in ``signature_image`` (or are dropped when the
+    visit already has that file); vector JSON is compacted in place. Values
+    that decode as neither are left as they are. Each batch commits on its own
+    so large tables are not locked for the whole run.
+    """
+    Visit = apps.get_model('visitors', 'Visit')
+    alias = schema_editor.connection.alias
+    pending = Visit.objects.using(alias).filter(signature_data__isnull=False).exclude(signature_data='')
+    last_pk = None
+    while True:
+        batch = pending.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch.only('pk', 'signature_data', 'signature_image')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        with transaction.atomic(using=alias):
+            for visit in batch:
+                update_fields = ['signature_data']
+                try:
+                    vector, image = parse_signature(visit.signature_data)
+                except ValueError as e:
+                    logger.warning("Keeping undecodable signature of visit %s as is: %s", visit.pk, e)
+                    continue
+                visit.signature_data = vector
+                if image is not None and not visit.signature_image:
+                    visit.signature_image.save(image.name, image, save=False)
+                    update_fields.append('signature_image')
+                visit.save(update_fields=update_fields)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('visitors', '0009_visitor_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visit',
+            name='signature_data',
+            field=models.TextField(blank=True, help_text='Vector signature as compact JSON; images go in signature_image', null=True),
+        ),
+        migrations.RunPython(move_signature_blobs, migrations.RunPython.noop),
+    ]
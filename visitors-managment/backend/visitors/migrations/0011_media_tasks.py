@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0010_signature_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visit',
+            name='media_status',
+            field=models.CharField(choices=[('ready', 'Ready'), ('processing', 'Processing'), ('failed', 'Failed')], default='ready', help_text='Whether photos and signature from check-in are stored yet', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='MediaTask',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('photo', 'Photo'), ('signature', 'Signature')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('payload', models.BinaryField(blank=True)),
+                ('file_ext', models.CharField(default='png', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Not retried before this time')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media_tasks', to='visitors.visit')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='mediatask_queue_idx')],
+            },
+        ),
+    ]
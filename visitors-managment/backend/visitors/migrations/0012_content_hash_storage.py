@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:11
+
+from django.db import migrations, models
+import visitors.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0011_media_tasks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visit',
+            name='signature_image',
+            field=models.ImageField(blank=True, null=True, storage=visitors.storage.ContentHashStorage(), upload_to='visitor_signatures/'),
+        ),
+        migrations.AlterField(
+            model_name='visitorphoto',
+            name='image',
+            field=models.ImageField(storage=visitors.storage.ContentHashStorage(), upload_to='visitor_photos/'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:13
+
+from collections import Counter
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def count_existing_references(apps, schema_editor):
+    """Create a MediaBlob for every stored photo/signature with its number of references."""
+    alias = schema_editor.connection.alias
+    MediaBlob = apps.get_model('visitors', 'MediaBlob')
+    Visit = apps.get_model('visitors', 'Visit')
+    VisitorPhoto = apps.get_model('visitors', 'VisitorPhoto')
+
+    counts = Counter()
+    for model, field in ((VisitorPhoto, 'image'), (Visit, 'signature_image')):
+        rows = (
+            model.objects.using(alias)
+            .exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            .values_list(field).annotate(n=models.Count('pk')).order_by()
+        )
+        for name, n in rows:
+            counts[name] += n
+
+    MediaBlob.objects.using(alias).bulk_create(
+        [MediaBlob(name=name, ref_count=n) for name, n in counts.items()],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0012_content_hash_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(count_existing_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0013_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('check_in', 'Checked in'), ('check_out', 'Checked out'), ('media', 'Media ready')], max_length=20)),
+                ('visit_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0015_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('host_name', models.CharField(blank=True, max_length=200)),
+                ('purpose', models.CharField(max_length=200)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('total_duration_minutes', models.BigIntegerField(default=0)),
+                ('min_duration_minutes', models.IntegerField(blank=True, null=True)),
+                ('max_duration_minutes', models.IntegerField(blank=True, null=True)),
+                ('duration_histogram', models.JSONField(default=list, help_text='Visit counts per DURATION_BUCKETS bucket')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['date', 'host_name', 'purpose'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='visitdailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'host_name', 'purpose'), name='rollup_day_host_purpose_uniq'),
+        ),
+    ]
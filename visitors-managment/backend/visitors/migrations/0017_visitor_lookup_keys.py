@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:27
+
+from django.db import migrations, models
+
+from visitors.search import email_key, phone_key
+
+BATCH_SIZE = 1000
+
+# Adding columns rebuilds visitors_visitor on SQLite, which drops the FTS5
+# sync triggers from 0009; they are re-created after each rebuild.
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS visitors_visitor_fts_insert AFTER INSERT ON visitors_visitor BEGIN "
+    "INSERT INTO visitors_visitor_fts (id, name, email, phone_digits) "
+    "VALUES (new.id, new.name, new.email, new.phone_digits); END",
+    "CREATE TRIGGER IF NOT EXISTS visitors_visitor_fts_delete AFTER DELETE ON visitors_visitor BEGIN "
+    "DELETE FROM visitors_visitor_fts WHERE id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS visitors_visitor_fts_update AFTER UPDATE ON visitors_visitor "
+    "WHEN old.name IS NOT new.name OR old.email IS NOT new.email "
+    "OR old.phone_digits IS NOT new.phone_digits BEGIN "
+    "UPDATE visitors_visitor_fts SET name = new.name, email = new.email, "
+    "phone_digits = new.phone_digits WHERE id = old.id; END",
+]
+
+
+def backfill_lookup_keys(apps, schema_editor):
+    Visitor = apps.get_model('visitors', 'Visitor')
+    batch = []
+    for visitor in Visitor.objects.only('id', 'email', 'phone').iterator(chunk_size=BATCH_SIZE):
+        visitor.email_key = email_key(visitor.email)
+        visitor.phone_key = phone_key(visitor.phone)
+        batch.append(visitor)
+        if len(batch) >= BATCH_SIZE:
+            Visitor.objects.bulk_update(batch, ['email_key', 'phone_key'])
+            batch = []
+    if batch:
+        Visitor.objects.bulk_update(batch, ['email_key', 'phone_key'])
+
+
+def restore_fts_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or 'visitors_visitor_fts' not in connection.introspection.table_names():
+        return
+    for sql in SQLITE_TRIGGERS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0016_visit_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddField(
+            model_name='visitor',
+            name='email_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Lower-cased email, for returning-visitor lookup', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='visitor',
+            name='phone_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Phone number in E.164 form, for returning-visitor lookup', max_length=21),
+        ),
+        migrations.RunPython(backfill_lookup_keys, migrations.RunPython.noop),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+    ]
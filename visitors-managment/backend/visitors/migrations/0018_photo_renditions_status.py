@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0017_visitor_lookup_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitorphoto',
+            name='renditions_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', help_text='Whether the thumbnail/medium renditions exist', max_length=20),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:44
+
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+
+import visitors.models
+
+
+def move_payloads_to_files(apps, schema_editor):
+    """Stage the payloads of unfinished tasks as files before the column is dropped."""
+    MediaTask = apps.get_model('visitors', 'MediaTask')
+    unfinished = MediaTask.objects.exclude(status='completed').exclude(payload=b'')
+    for task in unfinished.iterator(chunk_size=100):
+        task.file.save(f'{task.pk}.{task.file_ext}', ContentFile(bytes(task.payload)), save=False)
+        MediaTask.objects.filter(pk=task.pk).update(file=task.file.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitors', '0018_photo_renditions_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediatask',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, upload_to=visitors.models.media_task_path),
+        ),
+        migrations.RunPython(move_payloads_to_files, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='mediatask',
+            name='payload',
+        ),
+    ]
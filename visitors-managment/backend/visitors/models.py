@@ -1,7 +1,29 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 import uuid
 
+from .search import email_key, normalize_phone, phone_key
+from .storage import ContentHashStorage
+
+
+class VisitorQuerySet(models.QuerySet):
+    """QuerySet helpers for visitor listings."""
+
+    def with_visit_stats(self):
+        """
+        Annotate visit count and last check-in, and prefetch the active visit.
+
+        Keeps ``VisitorSerializer`` at a constant number of queries per page and
+        lets ``total_visits`` be used for ordering in SQL.
+        """
+        active_visits = Visit.objects.for_listing().filter(check_out_time__isnull=True)
+        return self.annotate(
+            total_visits=models.Count('visits'),
+            last_check_in=models.Max('visits__check_in_time'),
+        ).prefetch_related(
+            models.Prefetch('visits', queryset=active_visits, to_attr='active_visits')
+        ).order_by(*Visitor._meta.ordering)  # Meta.ordering is not applied to GROUP BY queries
+
 
 class Visitor(models.Model):
     """Model for storing visitor information."""
@@ -9,50 +31,132 @@ class Visitor(models.Model):
     name = models.CharField(max_length=200)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, unique=True)
+    phone_digits = models.CharField(max_length=20, blank=True, default='', editable=False,
+                                    help_text="Digits of the phone number, for search")
+    # Normalized keys for matching returning visitors; see ``visitors.lookup``.
+    email_key = models.CharField(max_length=254, blank=True, default='', editable=False, db_index=True,
+                                 help_text="Lower-cased email, for returning-visitor lookup")
+    phone_key = models.CharField(max_length=21, blank=True, default='', editable=False, db_index=True,
+                                 help_text="Phone number in E.164 form, for returning-visitor lookup")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = VisitorQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return f"{self.name} ({self.email})"
 
+    def save(self, *args, **kwargs):
+        self.set_derived_fields()
+        super().save(*args, **kwargs)
+
+    def set_derived_fields(self):
+        """Fill the search and lookup columns from email and phone; ``bulk_create`` callers must call this."""
+        self.phone_digits = normalize_phone(self.phone)
+        self.email_key = email_key(self.email)
+        self.phone_key = phone_key(self.phone)
+
     @property
     def total_visits(self):
+        # Use the value annotated by ``with_visit_stats()`` when present.
+        if getattr(self, '_total_visits', None) is not None:
+            return self._total_visits
         return self.visits.count()
 
+    @total_visits.setter
+    def total_visits(self, value):
+        self._total_visits = value
+
     @property
     def last_visit(self):
         return self.visits.order_by('-check_in_time').first()
 
 
+class VisitQuerySet(models.QuerySet):
+    """QuerySet helpers for visit listings."""
+
+    def for_listing(self):
+        """Join the visitor and prefetch photos so serializing rows issues no extra queries."""
+        return self.select_related('visitor').prefetch_related('photos')
+
+
 class Visit(models.Model):
     """Model for storing individual visit records."""
+    MEDIA_READY = 'ready'
+    MEDIA_PROCESSING = 'processing'
+    MEDIA_FAILED = 'failed'
+    MEDIA_STATUS_CHOICES = [
+        (MEDIA_READY, 'Ready'),
+        (MEDIA_PROCESSING, 'Processing'),
+        (MEDIA_FAILED, 'Failed'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    visitor = models.ForeignKey(Visitor, on_delete=models.CASCADE, related_name='visits')
+    # Indexed by visit_visitor_checkin_idx.
+    visitor = models.ForeignKey(Visitor, on_delete=models.CASCADE, related_name='visits', db_index=False)
     purpose = models.TextField()
     host_name = models.CharField(max_length=200, blank=True, help_text="Name of the person being visited")
     check_in_time = models.DateTimeField(auto_now_add=True)
     check_out_time = models.DateTimeField(null=True, blank=True)
     duration_minutes = models.IntegerField(null=True, blank=True)
-    signature_data = models.TextField(null=True, blank=True, help_text="Base64 encoded signature data")
-    signature_image = models.ImageField(upload_to='visitor_signatures/', null=True, blank=True)
+    signature_data = models.TextField(null=True, blank=True,
+                                      help_text="Vector signature as compact JSON; images go in signature_image")
+    signature_image = models.ImageField(upload_to='visitor_signatures/', storage=ContentHashStorage(),
+                                        null=True, blank=True)
+    media_status = models.CharField(max_length=20, choices=MEDIA_STATUS_CHOICES, default=MEDIA_READY,
+                                    help_text="Whether photos and signature from check-in are stored yet")
+
+    objects = VisitQuerySet.as_manager()
 
     class Meta:
         ordering = ['-check_in_time']
+        indexes = [
+            # History listing and keyset pagination on (check_in_time, id).
+            models.Index(fields=['check_in_time', 'id'], name='visit_checkin_id_idx'),
+            # Per-visitor lookups: last visit, visit counts.
+            models.Index(fields=['visitor', 'check_in_time'], name='visit_visitor_checkin_idx'),
+            # Active visitors only; partial index on PostgreSQL and SQLite.
+            models.Index(
+                fields=['check_in_time'],
+                condition=models.Q(check_out_time__isnull=True),
+                name='visit_active_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.visitor.name} - {self.check_in_time.strftime('%Y-%m-%d %H:%M')}"
 
     def check_out(self):
-        """Check out the visitor and calculate duration."""
-        if not self.check_out_time:
-            self.check_out_time = timezone.now()
-            duration = self.check_out_time - self.check_in_time
-            self.duration_minutes = int(duration.total_seconds() / 60)
-            self.save()
-        return self
+        """
+        Check out the visitor and calculate duration.
+
+        The visit is closed with a conditional UPDATE, so when two check-outs
+        (or a check-out and a bulk check-out) overlap only one of them counts
+        the visit in the rollup and logs the event. Returns True if this call
+        checked the visit out; otherwise the instance is refreshed from the row.
+        """
+        # Both modules import this one.
+        from . import conditional, events
+
+        now = timezone.now()
+        duration_minutes = int((now - self.check_in_time).total_seconds() / 60)
+        with transaction.atomic():
+            updated = Visit.objects.filter(pk=self.pk, check_out_time__isnull=True).update(
+                check_out_time=now, duration_minutes=duration_minutes
+            )
+            if not updated:
+                self.refresh_from_db(fields=['check_out_time', 'duration_minutes'])
+                return False
+            self.check_out_time = now
+            self.duration_minutes = duration_minutes
+            VisitDailyRollup.add_visit(self)
+            events.record_event(VisitEvent.KIND_CHECK_OUT, self.pk)
+            # update() skips post_save.
+            conditional.bump()
+        return True
 
     @property
     def is_active(self):
@@ -80,19 +184,280 @@ class Visit(models.Model):
 
 class VisitorPhoto(models.Model):
     """Model for storing visitor photos."""
+    RENDITIONS_PENDING = 'pending'
+    RENDITIONS_READY = 'ready'
+    RENDITIONS_FAILED = 'failed'
+    RENDITIONS_STATUS_CHOICES = [
+        (RENDITIONS_PENDING, 'Pending'),
+        (RENDITIONS_READY, 'Ready'),
+        (RENDITIONS_FAILED, 'Failed'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     visitor = models.ForeignKey(Visitor, on_delete=models.CASCADE, related_name='photos')
-    visit = models.ForeignKey(Visit, on_delete=models.CASCADE, related_name='photos')
-    image = models.ImageField(upload_to='visitor_photos/')
+    # Indexed by photo_visit_created_idx, which also serves the default ordering.
+    visit = models.ForeignKey(Visit, on_delete=models.CASCADE, related_name='photos', db_index=False)
+    image = models.ImageField(upload_to='visitor_photos/', storage=ContentHashStorage())
+    renditions_status = models.CharField(max_length=20, choices=RENDITIONS_STATUS_CHOICES, default=RENDITIONS_PENDING,
+                                         help_text="Whether the thumbnail/medium renditions exist")
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Prefetching a visit's photos in their default order.
+            models.Index(fields=['visit', 'created_at'], name='photo_visit_created_idx'),
+        ]
 
     def __str__(self):
         return f"Photo of {self.visitor.name} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
 
+class VisitEvent(models.Model):
+    """
+    Append-only log of changes to the active visitor list.
+
+    Streamed to lobby screens by ``visitors.events``; rows only need to live
+    as long as a client might reconnect with ``Last-Event-ID``.
+    """
+    KIND_CHECK_IN = 'check_in'
+    KIND_CHECK_OUT = 'check_out'
+    KIND_MEDIA = 'media'
+    KIND_CHOICES = [
+        (KIND_CHECK_IN, 'Checked in'),
+        (KIND_CHECK_OUT, 'Checked out'),
+        (KIND_MEDIA, 'Media ready'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Not a foreign key: events outlive deleted visits until they are pruned.
+    visit_id = models.UUIDField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.kind} {self.visit_id}"
+
+
+class VisitDailyRollup(models.Model):
+    """
+    Completed visits per check-in day (local time), host and purpose.
+
+    Analytics read only these rows (see ``visitors.rollups``). ``Visit.check_out``
+    adds each visit as it completes; ``manage.py backfill_visit_rollups``
+    rebuilds a date range from the visits table. Durations are also counted
+    in ``DURATION_BUCKETS`` so percentiles can be merged across rows.
+    """
+    # Upper bounds (minutes, inclusive) of the histogram buckets; one more
+    # bucket holds anything longer.
+    DURATION_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 360, 480, 720, 1440)
+    PURPOSE_MAX_LENGTH = 200
+
+    date = models.DateField()
+    host_name = models.CharField(max_length=200, blank=True)
+    # Visit.purpose is free text; rollups group on its first 200 characters.
+    purpose = models.CharField(max_length=PURPOSE_MAX_LENGTH)
+    visits = models.PositiveIntegerField(default=0)
+    total_duration_minutes = models.BigIntegerField(default=0)
+    min_duration_minutes = models.IntegerField(null=True, blank=True)
+    max_duration_minutes = models.IntegerField(null=True, blank=True)
+    duration_histogram = models.JSONField(default=list, help_text="Visit counts per DURATION_BUCKETS bucket")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date', 'host_name', 'purpose']
+        constraints = [
+            # Also serves date range scans.
+            models.UniqueConstraint(fields=['date', 'host_name', 'purpose'], name='rollup_day_host_purpose_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.host_name or '-'} / {self.purpose}: {self.visits} visits"
+
+    @classmethod
+    def bucket_index(cls, minutes):
+        for index, bound in enumerate(cls.DURATION_BUCKETS):
+            if minutes <= bound:
+                return index
+        return len(cls.DURATION_BUCKETS)
+
+    @classmethod
+    def key_for(cls, visit):
+        return {
+            'date': timezone.localdate(visit.check_in_time),
+            'host_name': visit.host_name,
+            'purpose': visit.purpose[:cls.PURPOSE_MAX_LENGTH],
+        }
+
+    @classmethod
+    def add_visit(cls, visit):
+        """Count a checked-out visit in its day's rollup."""
+        cls.add_visits([visit])
+
+    @classmethod
+    def add_visits(cls, visits):
+        """Count checked-out visits in their days' rollups, updating each rollup row once."""
+        groups = {}
+        for visit in visits:
+            if visit.duration_minutes is not None:
+                key = tuple(cls.key_for(visit).items())
+                groups.setdefault(key, []).append(visit.duration_minutes)
+        if not groups:
+            return
+        with transaction.atomic():
+            # Lock rows in a fixed order so concurrent batches cannot deadlock.
+            for key in sorted(groups):
+                durations = groups[key]
+                rollup, _ = cls.objects.select_for_update().get_or_create(**dict(key))
+                histogram = rollup.duration_histogram or [0] * (len(cls.DURATION_BUCKETS) + 1)
+                for minutes in durations:
+                    histogram[cls.bucket_index(minutes)] += 1
+                rollup.duration_histogram = histogram
+                if rollup.visits:
+                    rollup.min_duration_minutes = min(rollup.min_duration_minutes, *durations)
+                    rollup.max_duration_minutes = max(rollup.max_duration_minutes, *durations)
+                else:
+                    rollup.min_duration_minutes = min(durations)
+                    rollup.max_duration_minutes = max(durations)
+                rollup.visits += len(durations)
+                rollup.total_duration_minutes += sum(durations)
+                rollup.save()
+
+
+class MediaBlob(models.Model):
+    """
+    Reference count of a stored photo/signature file.
+
+    Content-hashed files are shared by every row that uploaded the same bytes;
+    a file is deleted only when its last reference goes (see ``visitors.blobs``).
+    """
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class DataVersion(models.Model):
+    """
+    Counter bumped after every committed write to visitors, visits or photos.
+
+    List endpoints derive their ETag from it, so a poll can be answered with
+    304 from one primary-key lookup (see ``visitors.conditional``).
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class ExportJob(models.Model):
+    """Background visit history export, written to MEDIA_ROOT by a worker."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    filters = models.JSONField(default=dict, blank=True)
+    base_url = models.CharField(max_length=500, blank=True, help_text="Absolute URL prefix used for photo links")
+    total_rows = models.IntegerField(null=True, blank=True)
+    processed_rows = models.IntegerField(default=0)
+    file = models.FileField(upload_to='exports/', null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.export_format} export ({self.status}) - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+
+    @property
+    def progress(self):
+        """Return progress as a percentage, or None while the total is unknown."""
+        if self.status == self.STATUS_COMPLETED:
+            return 100
+        if not self.total_rows:
+            return None
+        return min(99, int(self.processed_rows * 100 / self.total_rows))
+
+
+def media_task_path(task, filename):
+    return f'media-tasks/{task.pk}.{task.file_ext}'
+
+
+class MediaTask(models.Model):
+    """
+    Image work handed off by check-in: store a photo or signature for a visit.
+
+    ``file`` holds the decoded upload under ``media-tasks/`` until a worker
+    has stored it where the visit expects it, after which it is deleted.
+    Uploads are kept as files rather than in the row, so pending tasks do not
+    hold megabytes of image data in the database.
+    """
+    KIND_PHOTO = 'photo'
+    KIND_SIGNATURE = 'signature'
+    KIND_CHOICES = [
+        (KIND_PHOTO, 'Photo'),
+        (KIND_SIGNATURE, 'Signature'),
+    ]
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    visit = models.ForeignKey(Visit, on_delete=models.CASCADE, related_name='media_tasks')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    file = models.FileField(upload_to=media_task_path, max_length=255, blank=True)
+    file_ext = models.CharField(max_length=10, default='png')
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not retried before this time")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='mediatask_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for visit {self.visit_id} ({self.status})"
+
+
 class CustomAdmin(models.Model):
     """Custom admin model for ThorSignia admin login."""
     email = models.EmailField(unique=True)
@@ -0,0 +1,148 @@
+"""
+Keyset (cursor) pagination helpers for visit listings.
+"""
+import base64
+import json
+import uuid
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+
+class VisitKeysetPagination:
+    """
+    Paginate visits newest-first on the ``(check_in_time, id)`` key.
+
+    Each page is fetched with a ``WHERE (check_in_time, id) < cursor`` filter
+    instead of an OFFSET, so page 500 costs the same as page one. The cursor
+    is an opaque urlsafe-base64 token that clients pass back unchanged.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    max_page_size = 100
+    count_modes = ('exact', 'approx', 'none')
+
+    def __init__(self):
+        self.page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 20
+
+    @classmethod
+    def is_requested(cls, request):
+        """Return True when the client asked for cursor mode."""
+        params = request.query_params
+        return cls.cursor_query_param in params or cls.page_size_query_param in params
+
+    @staticmethod
+    def encode_cursor(visit):
+        payload = {'t': visit.check_in_time.isoformat(), 'id': str(visit.id)}
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            check_in_time = parse_datetime(payload['t'])
+            visit_id = uuid.UUID(payload['id'])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+        if check_in_time is None:
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+        return check_in_time, visit_id
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if not value:
+            return self.page_size
+        try:
+            size = int(value)
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        return max(1, min(size, self.max_page_size))
+
+    def get_count_mode(self, request):
+        mode = request.query_params.get(self.count_query_param, 'exact')
+        if mode not in self.count_modes:
+            raise ValidationError({'count': f"Must be one of: {', '.join(self.count_modes)}."})
+        return mode
+
+    def paginate_queryset(self, queryset, request):
+        """Return one page of visits from ``queryset`` and remember the cursor state."""
+        self.request = request
+        self.count_mode = self.get_count_mode(request)
+        self.base_queryset = queryset
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('-check_in_time', '-id')
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            check_in_time, visit_id = self.decode_cursor(token)
+            queryset = queryset.filter(
+                Q(check_in_time__lt=check_in_time) |
+                Q(check_in_time=check_in_time, id__lt=visit_id)
+            )
+
+        # Fetch one extra row to learn whether another page exists.
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_next_cursor(self):
+        if self.has_next and self.page:
+            return self.encode_cursor(self.page[-1])
+        return None
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_count(self):
+        """Return the total row count according to the requested count mode."""
+        self.count_is_approximate = False
+        if self.count_mode == 'none':
+            return None
+        if self.count_mode == 'approx':
+            estimate = estimate_count(self.base_queryset)
+            if estimate is not None:
+                self.count_is_approximate = True
+                return estimate
+        return self.base_queryset.count()
+
+    def get_paginated_data(self, data, key='visits'):
+        result = {
+            key: data,
+            'next_cursor': self.get_next_cursor(),
+            'next': self.get_next_link(),
+        }
+        count = self.get_count()
+        if count is not None:
+            result['count'] = count
+            result['count_is_approximate'] = self.count_is_approximate
+        return result
+
+
+def estimate_count(queryset):
+    """
+    Return the PostgreSQL planner's row estimate for ``queryset``.
+
+    Returns None on other backends so callers can fall back to ``count()``.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
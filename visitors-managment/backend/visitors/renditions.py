@@ -0,0 +1,112 @@
+"""
+Resized renditions of visitor photos.
+
+Listings show photos as small avatars, so each photo gets ``thumbnail`` and
+``medium`` variants written next to the original under ``renditions/``. They
+are created when the photo is stored (upload endpoint or media worker) and
+served as plain media files afterwards. ``VisitorPhoto.renditions_status``
+records the outcome, so serializing a photo never touches storage: until a
+rendition is ready the original's URL is used, and photos still pending
+(e.g. older uploads) are queued for the media worker. Failures are kept and
+not retried on every request.
+
+Renditions live in ``default_storage`` under names derived from the
+original's, so they stay content-addressed when the original is.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from . import conditional
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = {
+    'thumbnail': (160, 160),
+    'medium': (640, 640),
+}
+
+if features.check('webp'):
+    RENDITION_FORMAT, RENDITION_EXT = 'WEBP', 'webp'
+else:
+    RENDITION_FORMAT, RENDITION_EXT = 'JPEG', 'jpg'
+
+RENDITION_QUALITY = 80
+
+
+def rendition_name(name, rendition):
+    """Storage name of ``rendition`` for the original stored as ``name``."""
+    stem = os.path.splitext(name)[0]
+    return f'renditions/{rendition}/{stem}.{RENDITION_EXT}'
+
+
+def render(image, size):
+    """Return ``image`` scaled to fit within ``size``, encoded as RENDITION_FORMAT."""
+    image = image.copy()
+    if image.mode not in ('RGB', 'RGBA') or (RENDITION_FORMAT == 'JPEG' and image.mode == 'RGBA'):
+        image = image.convert('RGB')
+    image.thumbnail(size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format=RENDITION_FORMAT, quality=RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+# Errors that mean the source image cannot be rendered, as opposed to bugs.
+RENDER_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def create_renditions(field_file, renditions=None, missing_only=False):
+    """Write all (or the given) renditions of ``field_file``, replacing existing ones unless ``missing_only``."""
+    storage = default_storage
+    renditions = [
+        rendition for rendition in renditions or RENDITION_SIZES
+        if not (missing_only and storage.exists(rendition_name(field_file.name, rendition)))
+    ]
+    if not renditions:
+        return
+    with field_file.storage.open(field_file.name, 'rb') as source, Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        for rendition in renditions:
+            name = rendition_name(field_file.name, rendition)
+            content = render(original, RENDITION_SIZES[rendition])
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(content))
+
+
+def create_photo_renditions(photo, missing_only=False):
+    """Create ``photo``'s renditions and record the outcome on it; returns True on success."""
+    try:
+        create_renditions(photo.image, missing_only=missing_only)
+    except RENDER_ERRORS as e:
+        logger.warning("Could not create renditions of %s: %s", photo.image.name, e)
+        photo.renditions_status = photo.RENDITIONS_FAILED
+    else:
+        photo.renditions_status = photo.RENDITIONS_READY
+    type(photo).objects.filter(pk=photo.pk).update(renditions_status=photo.renditions_status)
+    # update() skips post_save; listings embed rendition URLs.
+    conditional.bump()
+    return photo.renditions_status == photo.RENDITIONS_READY
+
+
+def rendition_url(photo, rendition):
+    """URL of ``photo``'s ``rendition`` once created, otherwise of the original."""
+    field_file = photo.image
+    if not field_file:
+        return None
+    if photo.renditions_status == photo.RENDITIONS_READY:
+        return default_storage.url(rendition_name(field_file.name, rendition))
+    return field_file.url
+
+
+def delete_renditions(name):
+    """Delete the renditions of the original stored as ``name``."""
+    storage = default_storage
+    for rendition in RENDITION_SIZES:
+        rendition_file = rendition_name(name, rendition)
+        if storage.exists(rendition_file):
+            storage.delete(rendition_file)
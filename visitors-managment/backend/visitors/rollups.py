@@ -0,0 +1,198 @@
+"""
+Visit analytics served from ``VisitDailyRollup``.
+
+Reports never touch the visits table: each rollup row already holds the
+count, total, min, max and a duration histogram of one day's completed visits
+for a host and purpose, so a year of data is a few thousand small rows that
+are merged here. Percentiles are interpolated within histogram buckets, so
+they are estimates with the resolution of ``DURATION_BUCKETS``.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Substr, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .filters import start_of_day
+from .models import Visit, VisitDailyRollup
+
+BUCKETS = VisitDailyRollup.DURATION_BUCKETS
+PERCENTILES = (50, 90, 95)
+DEFAULT_RANGE_DAYS = 30
+REBUILD_CHUNK_DAYS = 31
+
+GROUP_KEYS = {
+    'day': lambda row: row['date'].isoformat(),
+    'month': lambda row: row['date'].strftime('%Y-%m'),
+    'host': lambda row: row['host_name'],
+    'purpose': lambda row: row['purpose'],
+}
+ROW_FIELDS = ('date', 'host_name', 'purpose', 'visits', 'total_duration_minutes',
+              'min_duration_minutes', 'max_duration_minutes', 'duration_histogram')
+
+
+def percentile(histogram, q, lowest, highest):
+    """Estimate the ``q``th percentile of the durations counted in ``histogram``."""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = q / 100 * total
+    seen = 0
+    lower = 0
+    for index, count in enumerate(histogram):
+        upper = BUCKETS[index] if index < len(BUCKETS) else highest
+        if count and seen + count >= rank:
+            value = lower + (upper - lower) * (rank - seen) / count
+            return round(min(max(value, lowest), highest), 1)
+        seen += count
+        lower = upper
+    return highest
+
+
+class DurationSummary:
+    """Merges rollup rows into visit counts and duration statistics."""
+
+    def __init__(self):
+        self.visits = 0
+        self.total = 0
+        self.lowest = None
+        self.highest = None
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, row):
+        if not row['visits']:
+            return
+        self.visits += row['visits']
+        self.total += row['total_duration_minutes']
+        lowest, highest = row['min_duration_minutes'], row['max_duration_minutes']
+        self.lowest = lowest if self.lowest is None else min(self.lowest, lowest)
+        self.highest = highest if self.highest is None else max(self.highest, highest)
+        for index, count in enumerate(row['duration_histogram']):
+            self.histogram[index] += count
+
+    def as_dict(self):
+        data = {
+            'visits': self.visits,
+            'average_duration_minutes': round(self.total / self.visits, 1) if self.visits else None,
+            'min_duration_minutes': self.lowest,
+            'max_duration_minutes': self.highest,
+        }
+        for q in PERCENTILES:
+            data[f'p{q}_duration_minutes'] = (
+                percentile(self.histogram, q, self.lowest, self.highest) if self.visits else None
+            )
+        return data
+
+
+def parse_params(params):
+    """Validate ``date_from``/``date_to``/``group_by``/``host_name`` query parameters."""
+    today = timezone.localdate()
+    dates = {}
+    for name, default in (('date_to', today), ('date_from', None)):
+        value = params.get(name)
+        if not value:
+            dates[name] = default
+            continue
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValidationError({name: ['Enter a valid date (YYYY-MM-DD).']})
+        dates[name] = parsed
+    if dates['date_from'] is None:
+        dates['date_from'] = dates['date_to'] - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if dates['date_from'] > dates['date_to']:
+        raise ValidationError({'date_from': ['date_from must not be after date_to.']})
+    group_by = params.get('group_by', 'day')
+    if group_by not in GROUP_KEYS:
+        raise ValidationError({'group_by': [f"Choose one of: {', '.join(GROUP_KEYS)}."]})
+    return dates['date_from'], dates['date_to'], group_by, params.get('host_name')
+
+
+def visit_analytics(date_from, date_to, group_by='day', host_name=None):
+    """Visit counts and durations between two dates (inclusive), grouped by ``group_by``."""
+    rollups = VisitDailyRollup.objects.filter(date__gte=date_from, date__lte=date_to)
+    if host_name:
+        rollups = rollups.filter(host_name=host_name)
+    key_for = GROUP_KEYS[group_by]
+    totals = DurationSummary()
+    groups = {}
+    for row in rollups.values(*ROW_FIELDS).iterator():
+        totals.add(row)
+        groups.setdefault(key_for(row), DurationSummary()).add(row)
+
+    results = [dict(key=key, **summary.as_dict()) for key, summary in groups.items()]
+    if group_by in ('day', 'month'):
+        results.sort(key=lambda group: group['key'])
+    else:
+        results.sort(key=lambda group: (-group['visits'], group['key']))
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'group_by': group_by,
+        'totals': totals.as_dict(),
+        'groups': results,
+    }
+
+
+def rebuild(date_from=None, date_to=None):
+    """
+    Recompute rollups for check-in dates in ``[date_from, date_to]`` from the visits table.
+
+    Runs in chunks of ``REBUILD_CHUNK_DAYS``, each replacing its rows in one
+    transaction. Meant for backfills and repairs; check-out keeps current
+    days up to date. Returns the number of rollup rows written.
+    """
+    completed = Visit.objects.filter(check_out_time__isnull=False, duration_minutes__isnull=False)
+    if date_from is None:
+        first = completed.aggregate(first=Min('check_in_time'))['first']
+        if first is None:
+            return 0
+        date_from = timezone.localdate(first)
+    if date_to is None:
+        date_to = timezone.localdate()
+
+    bucket_counts = {}
+    lower = None
+    for index, bound in enumerate(BUCKETS + (None,)):
+        condition = Q()
+        if lower is not None:
+            condition &= Q(duration_minutes__gt=lower)
+        if bound is not None:
+            condition &= Q(duration_minutes__lte=bound)
+        bucket_counts[f'bucket_{index}'] = Count('id', filter=condition)
+        lower = bound
+
+    written = 0
+    day = date_from
+    while day <= date_to:
+        end = min(day + timedelta(days=REBUILD_CHUNK_DAYS), date_to + timedelta(days=1))
+        rows = (
+            completed.filter(check_in_time__gte=start_of_day(day), check_in_time__lt=start_of_day(end))
+            .annotate(day=TruncDate('check_in_time'),
+                      purpose_key=Substr('purpose', 1, VisitDailyRollup.PURPOSE_MAX_LENGTH))
+            .values('day', 'host_name', 'purpose_key')
+            .annotate(visits=Count('id'), total=Sum('duration_minutes'),
+                      lowest=Min('duration_minutes'), highest=Max('duration_minutes'), **bucket_counts)
+            .order_by()
+        )
+        rollups = [
+            VisitDailyRollup(
+                date=row['day'],
+                host_name=row['host_name'],
+                purpose=row['purpose_key'],
+                visits=row['visits'],
+                total_duration_minutes=row['total'],
+                min_duration_minutes=row['lowest'],
+                max_duration_minutes=row['highest'],
+                duration_histogram=[row[f'bucket_{index}'] for index in range(len(BUCKETS) + 1)],
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            VisitDailyRollup.objects.filter(date__gte=day, date__lt=end).delete()
+            VisitDailyRollup.objects.bulk_create(rollups)
+        written += len(rollups)
+        day = end
+    return written
@@ -0,0 +1,137 @@
+"""
+Visitor name/email/phone search.
+
+On PostgreSQL, substring matches run as ``UPPER(col) LIKE UPPER('%term%')``
+(Django's ``icontains``), which the ``pg_trgm`` GIN indexes created in
+migration 0009 serve directly. On SQLite the same searches go through the
+``visitors_visitor_fts`` FTS5 trigram table when it exists. Terms that look
+like phone numbers are also matched on their digits, via ``Visitor.phone_digits``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+FTS_TABLE = 'visitors_visitor_fts'
+# The trigram tokenizer cannot match phrases shorter than this.
+MIN_TRIGRAM_LENGTH = 3
+# Terms made only of these characters, with enough digits, are phone numbers.
+PHONE_TERM_RE = re.compile(r'^[\d\s+\-().]+$')
+MIN_PHONE_DIGITS = 3
+
+_fts_tables = {}
+
+
+def normalize_phone(value):
+    """Strip everything but digits from a phone number."""
+    return re.sub(r'\D', '', value or '')
+
+
+def looks_like_phone(term):
+    """True for terms such as ``555-0100`` or ``+1 (555) 010``, not ``john1@corp.com``."""
+    return bool(PHONE_TERM_RE.match(term)) and len(normalize_phone(term)) >= MIN_PHONE_DIGITS
+
+
+def email_key(value):
+    """Case-insensitive lookup key for an email address."""
+    return (value or '').strip().lower()
+
+
+def phone_key(value, country_code=None):
+    """
+    Lookup key for a phone number in E.164 form (``+`` and digits).
+
+    Numbers written with ``+`` or ``00`` are taken as international. Others
+    get ``country_code`` (``PHONE_DEFAULT_COUNTRY_CODE`` by default) in place
+    of their leading trunk ``0``; with no default country they keep their
+    digits as written.
+    """
+    value = (value or '').strip()
+    digits = normalize_phone(value)
+    if not digits:
+        return ''
+    if value.startswith('+'):
+        return '+' + digits
+    if value.startswith('00'):
+        return '+' + digits[2:]
+    if country_code is None:
+        country_code = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '')
+    country_code = normalize_phone(country_code)
+    if country_code:
+        return '+' + country_code + digits.lstrip('0')
+    return '+' + digits
+
+
+def fts_available(using='default'):
+    """Return True when the SQLite FTS5 visitor index exists on ``using``."""
+    if using not in _fts_tables:
+        connection = connections[using]
+        _fts_tables[using] = (
+            connection.vendor == 'sqlite' and
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_tables[using]
+
+
+def _fts_phrase(value):
+    return '"' + value.replace('"', '""') + '"'
+
+
+def visitor_match_q(term, fields=('name', 'email', 'phone'), prefix=''):
+    """
+    Build a Q matching visitors whose ``fields`` contain ``term``.
+
+    ``prefix`` is prepended to every lookup, e.g. ``'visitor__'`` when
+    filtering visits.
+    """
+    term = term.strip()
+    digits = normalize_phone(term) if 'phone' in fields and looks_like_phone(term) else ''
+
+    text_columns = [field for field in fields if field != 'phone']
+    clauses = []
+    if text_columns:
+        clauses.append((text_columns, term))
+    if digits:
+        clauses.append((['phone_digits'], digits))
+
+    if (fts_available() and clauses and
+            all(len(value) >= MIN_TRIGRAM_LENGTH for _, value in clauses)):
+        expression = ' OR '.join(
+            '{%s} : %s' % (' '.join(columns), _fts_phrase(value))
+            for columns, value in clauses
+        )
+        subquery = RawSQL(f'SELECT id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+        return Q(**{f'{prefix}pk__in': subquery})
+
+    query = Q()
+    for field in text_columns:
+        query |= Q(**{f'{prefix}{field}__icontains': term})
+    if digits:
+        query |= Q(**{f'{prefix}phone_digits__contains': digits})
+    elif 'phone' in fields:
+        query |= Q(**{f'{prefix}phone__icontains': term})
+    return query
+
+
+class VisitorSearchFilter(filters.SearchFilter):
+    """``?search=`` over visitor name, email and phone using the visitor search index."""
+    visitor_prefix = ''
+
+    def get_term_q(self, term):
+        return visitor_match_q(term, prefix=self.visitor_prefix)
+
+    def filter_queryset(self, request, queryset, view):
+        for term in self.get_search_terms(request):
+            queryset = queryset.filter(self.get_term_q(term))
+        return queryset
+
+
+class VisitSearchFilter(VisitorSearchFilter):
+    """``?search=`` over the visit's visitor plus its purpose."""
+    visitor_prefix = 'visitor__'
+
+    def get_term_q(self, term):
+        return super().get_term_q(term) | Q(purpose__icontains=term)
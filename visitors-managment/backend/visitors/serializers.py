@@ -1,45 +1,104 @@
+import logging
+
 from rest_framework import serializers
-from .models import Visitor, Visit, VisitorPhoto
-import base64
+from . import jobs, renditions
+from .lookup import find_returning_visitor
+from .models import Visitor, Visit, VisitorPhoto, ExportJob
+from .signatures import decode_data_url
 from django.core.files.base import ContentFile
 from django.conf import settings
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
 
 
 class VisitorPhotoSerializer(serializers.ModelSerializer):
     """Serializer for visitor photos."""
     image_data = serializers.CharField(write_only=True, required=False)
     image_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    medium_url = serializers.SerializerMethodField()
     
     class Meta:
         model = VisitorPhoto
-        fields = ['id', 'image', 'image_url', 'image_data', 'created_at']
+        fields = ['id', 'image', 'image_url', 'thumbnail_url', 'medium_url', 'image_data', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+    def _absolute(self, url):
+        request = self.context.get('request')
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
     def get_image_url(self, obj):
         """Get the full URL for the image."""
         if obj.image:
-            request = self.context.get('request')
-            if request is not None:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return self._absolute(obj.image.url)
         return None
 
+    def get_thumbnail_url(self, obj):
+        return self._rendition_url(obj, 'thumbnail')
+
+    def get_medium_url(self, obj):
+        return self._rendition_url(obj, 'medium')
+
+    def _rendition_url(self, obj, rendition):
+        if obj.image and obj.renditions_status == VisitorPhoto.RENDITIONS_PENDING:
+            jobs.enqueue_renditions(obj)
+        return self._absolute(renditions.rendition_url(obj, rendition))
+
     def create(self, validated_data):
         image_data = validated_data.pop('image_data', None)
         if image_data:
             # Handle base64 image data
             try:
-                format, imgstr = image_data.split(';base64,')
-                ext = format.split('/')[-1]
-                image_name = f"visitor_photo_{validated_data['visit'].id}.{ext}"
-                validated_data['image'] = ContentFile(base64.b64decode(imgstr), name=image_name)
-            except Exception as e:
+                ext, raw = decode_data_url(image_data)
+            except ValueError:
                 raise serializers.ValidationError("Invalid image data format")
+            image_name = f"visitor_photo_{validated_data['visit'].id}.{ext}"
+            validated_data['image'] = ContentFile(raw, name=image_name)
         
         return super().create(validated_data)
 
 
-class VisitSerializer(serializers.ModelSerializer):
+class SignatureURLMixin:
+    """
+    ``signature_url``/``signature_type`` fields for visit serializers.
+
+    Listings only link to the signature: images by their media URL, vector
+    signatures by the visit's ``signature`` endpoint.
+    """
+
+    def get_signature_type(self, obj):
+        if obj.signature_image:
+            return 'image'
+        if obj.signature_data:
+            return 'vector'
+        return None
+
+    def get_signature_url(self, obj):
+        """Get the full URL for the signature if the visit has one."""
+        try:
+            signature_type = self.get_signature_type(obj)
+            if signature_type is None:
+                return None
+            if signature_type == 'image':
+                url = obj.signature_image.url
+            else:
+                url = reverse('visit-signature', args=[obj.pk])
+
+            request = self.context.get('request')
+            if request is not None:
+                return request.build_absolute_uri(url)
+            return url
+
+        except Exception:
+            # Log the error but don't break the API response
+            logger.exception("Error generating signature URL for visit %s", getattr(obj, 'id', 'unknown'))
+            return None
+
+
+class VisitSerializer(SignatureURLMixin, serializers.ModelSerializer):
     """Serializer for visit records."""
     visitor_name = serializers.CharField(source='visitor.name', read_only=True)
     visitor_email = serializers.CharField(source='visitor.email', read_only=True)
@@ -49,41 +108,16 @@ class VisitSerializer(serializers.ModelSerializer):
     status = serializers.CharField(read_only=True)
     photos = serializers.SerializerMethodField()
     signature_url = serializers.SerializerMethodField()
-    signature_data = serializers.CharField(read_only=True)
+    signature_type = serializers.SerializerMethodField()
 
     class Meta:
         model = Visit
         fields = [
             'id', 'visitor', 'visitor_name', 'visitor_email', 'visitor_phone',
             'purpose', 'host_name', 'check_in_time', 'check_out_time', 'duration_minutes',
-            'duration_formatted', 'is_active', 'status', 'photos', 'signature_url', 'signature_data'
+            'duration_formatted', 'is_active', 'status', 'photos', 'signature_url', 'signature_type', 'media_status'
         ]
-        read_only_fields = ['id', 'check_in_time', 'check_out_time', 'duration_minutes']
-
-    def get_signature_url(self, obj):
-        """Get the full URL for the signature image if it exists."""
-        try:
-            # Check if the signature_image field exists and has a value
-            if not hasattr(obj, 'signature_image') or not obj.signature_image:
-                return None
-                
-            # Get the file field value
-            signature_file = obj.signature_image
-            
-            # Check if the file exists in storage
-            if not signature_file:
-                return None
-                
-            # Get the URL
-            request = self.context.get('request')
-            if request is not None:
-                return request.build_absolute_uri(signature_file.url)
-            return signature_file.url
-            
-        except Exception as e:
-            # Log the error but don't break the API response
-            print(f"Error generating signature URL for visit {getattr(obj, 'id', 'unknown')}: {str(e)}")
-            return None
+        read_only_fields = ['id', 'check_in_time', 'check_out_time', 'duration_minutes', 'media_status']
 
     def get_photos(self, obj):
         """Get photos with proper context."""
@@ -107,6 +141,8 @@ class VisitorSerializer(serializers.ModelSerializer):
 
     def get_last_visit(self, obj):
         """Get the last visit datetime for this visitor."""
+        if hasattr(obj, 'last_check_in'):
+            return obj.last_check_in
         last_visit = obj.visits.order_by('-check_in_time').first()
         if last_visit:
             return last_visit.check_in_time
@@ -114,7 +150,10 @@ class VisitorSerializer(serializers.ModelSerializer):
 
     def get_active_visit(self, obj):
         """Get the active visit for this visitor."""
-        active_visit = obj.visits.filter(check_out_time__isnull=True).first()
+        if hasattr(obj, 'active_visits'):
+            active_visit = obj.active_visits[0] if obj.active_visits else None
+        else:
+            active_visit = obj.visits.filter(check_out_time__isnull=True).first()
         if active_visit:
             return VisitSerializer(active_visit, context=self.context).data
         return None
@@ -126,6 +165,7 @@ class CheckInSerializer(serializers.Serializer):
     email = serializers.EmailField()
     phone = serializers.CharField(max_length=20)
     signature_data = serializers.CharField(required=False, allow_blank=True, write_only=True)
+    is_vector_signature = serializers.BooleanField(required=False, default=False)
     purpose = serializers.CharField()
     host_name = serializers.CharField(max_length=200, required=False, allow_blank=True)
     photo = serializers.ImageField(required=False, allow_null=True)
@@ -133,33 +173,28 @@ class CheckInSerializer(serializers.Serializer):
 
     def validate(self, data):
         """Validate check-in data and check for existing visitor."""
-        email = data.get('email')
-        phone = data.get('phone')
-        
-        # Check if visitor exists by email or phone
-        existing_visitor = None
-        if email:
-            try:
-                existing_visitor = Visitor.objects.get(email=email)
-            except Visitor.DoesNotExist:
-                pass
-        
-        if not existing_visitor and phone:
-            try:
-                existing_visitor = Visitor.objects.get(phone=phone)
-            except Visitor.DoesNotExist:
-                pass
+        # One indexed query on the normalized email/phone keys, preferring the email match
+        existing_visitor = find_returning_visitor(data.get('email'), data.get('phone'))
         
         data['existing_visitor'] = existing_visitor
         return data
 
 
+class BulkCheckInItemSerializer(serializers.Serializer):
+    """One visitor in a bulk check-in; returning visitors are matched for the whole batch."""
+    name = serializers.CharField(max_length=200)
+    email = serializers.EmailField()
+    phone = serializers.CharField(max_length=20)
+    purpose = serializers.CharField()
+    host_name = serializers.CharField(max_length=200, required=False, allow_blank=True)
+
+
 class CheckOutSerializer(serializers.Serializer):
     """Serializer for visitor check-out."""
     visit_id = serializers.UUIDField()
 
 
-class VisitHistorySerializer(serializers.ModelSerializer):
+class VisitHistorySerializer(SignatureURLMixin, serializers.ModelSerializer):
     """Serializer for visit history with visitor details."""
     visitor_name = serializers.CharField(source='visitor.name', read_only=True)
     visitor_email = serializers.CharField(source='visitor.email', read_only=True)
@@ -169,47 +204,48 @@ class VisitHistorySerializer(serializers.ModelSerializer):
     status = serializers.CharField(read_only=True)
     photos = serializers.SerializerMethodField()
     signature_url = serializers.SerializerMethodField()
-    signature_data = serializers.SerializerMethodField()
+    signature_type = serializers.SerializerMethodField()
 
     class Meta:
         model = Visit
         fields = [
             'id', 'visitor', 'visitor_name', 'visitor_email', 'visitor_phone',
             'purpose', 'host_name', 'check_in_time', 'check_out_time', 'duration_minutes',
-            'duration_formatted', 'is_active', 'status', 'photos', 'signature_url', 'signature_data'
+            'duration_formatted', 'is_active', 'status', 'photos', 'signature_url', 'signature_type', 'media_status'
         ]
 
-    def get_signature_url(self, obj):
-        """Get the full URL for the signature image if it exists."""
-        try:
-            if not hasattr(obj, 'signature_image') or not obj.signature_image:
-                return None
-                
-            signature_file = obj.signature_image
-            
-            if not signature_file:
-                return None
-                
-            request = self.context.get('request')
-            if request is not None:
-                return request.build_absolute_uri(signature_file.url)
-            return signature_file.url
-            
-        except Exception as e:
-            print(f"Error generating signature URL for visit {getattr(obj, 'id', 'unknown')}: {str(e)}")
-            return None
-
-    def get_signature_data(self, obj):
-        """Get base64 encoded signature data if available."""
-        try:
-            if hasattr(obj, 'signature_data') and obj.signature_data:
-                return obj.signature_data
-            return None
-        except Exception as e:
-            print(f"Error getting signature data: {str(e)}")
-            return None
-
     def get_photos(self, obj):
         """Get photos with proper context."""
         photos = obj.photos.all()
-        return VisitorPhotoSerializer(photos, many=True, context=self.context).data
\ No newline at end of file
+        return VisitorPhotoSerializer(photos, many=True, context=self.context).data
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Serializer for background export job status."""
+    progress = serializers.IntegerField(read_only=True)
+    status_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'status', 'export_format', 'filters', 'total_rows', 'processed_rows',
+            'progress', 'error', 'created_at', 'started_at', 'finished_at',
+            'status_url', 'download_url'
+        ]
+        read_only_fields = fields
+
+    def _absolute(self, path):
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(path)
+        return path
+
+    def get_status_url(self, obj):
+        return self._absolute(reverse('exportjob-detail', args=[obj.pk]))
+
+    def get_download_url(self, obj):
+        """Only completed jobs have something to download."""
+        if obj.status != ExportJob.STATUS_COMPLETED or not obj.file:
+            return None
+        return self._absolute(reverse('exportjob-download', args=[obj.pk]))
@@ -0,0 +1,88 @@
+"""
+Signature storage.
+
+A visit keeps its signature exactly once: drawn (vector) signatures as compact
+JSON in ``Visit.signature_data``, everything else as a file in
+``Visit.signature_image``. Base64 image data is never stored in the database.
+"""
+import base64
+import binascii
+import io
+import json
+import uuid
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .uploads import image_format_extension
+
+
+def signature_filename(ext):
+    return f"signature_{timezone.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{ext}"
+
+
+def decode_data_url(data_url):
+    """
+    Split a ``data:image/<type>;base64,<payload>`` URL into ``(ext, bytes)``.
+
+    The extension comes from the decoded image, not the declared type.
+    Raises ValueError if the URL is not base64-encoded PNG, JPEG, WebP or
+    GIF data.
+    """
+    if ';base64,' not in data_url:
+        raise ValueError("expected a base64 data URL")
+    payload = data_url.split(';base64,', 1)[1]
+    try:
+        raw = base64.b64decode(payload, validate=True)
+    except binascii.Error as e:
+        raise ValueError(str(e))
+    return image_extension(raw), raw
+
+
+def compact_vector(value, is_vector=False):
+    """
+    Return ``value`` re-encoded as compact JSON if it is a vector signature, else None.
+
+    Vector signatures are a JSON array of strokes or an object with a
+    ``paths`` list; any JSON object is accepted when the client flagged the
+    value with ``is_vector_signature``.
+    """
+    if not value.lstrip().startswith(('{', '[')):
+        return None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return None
+    if isinstance(parsed, dict):
+        if not is_vector and not isinstance(parsed.get('paths'), list):
+            return None
+    elif not isinstance(parsed, list):
+        return None
+    return json.dumps(parsed, separators=(',', ':'))
+
+
+def image_extension(raw):
+    """Extension for image bytes; raises ValueError unless they are an image we store."""
+    return image_format_extension(io.BytesIO(raw))
+
+
+def parse_signature(value, is_vector=False):
+    """
+    Turn submitted ``signature_data`` into ``(vector_json, image_file)``.
+
+    Exactly one of the two is set. Raises ValueError for data that is neither
+    a vector signature nor a (data URL or bare) base64 image.
+    """
+    vector = compact_vector(value, is_vector)
+    if vector is not None:
+        return vector, None
+
+    if value.startswith('data:image/'):
+        ext, raw = decode_data_url(value)
+    else:
+        try:
+            raw = base64.b64decode(value, validate=True)
+        except binascii.Error:
+            raise ValueError("signature is neither vector JSON nor base64 image data")
+        ext = image_extension(raw)
+    return None, ContentFile(raw, name=signature_filename(ext))
@@ -0,0 +1,65 @@
+"""
+Lobby dashboard statistics.
+
+Dashboards refresh every few seconds, so the figures are cached under the
+current ``DataVersion`` (see ``visitors.conditional``): any committed write to
+visitors, visits or photos moves readers to a new key, and until then every
+refresh is served from the cache without touching the visits table. The key
+also carries today's date, so counts roll over at local midnight.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from .conditional import current_version
+from .filters import start_of_day
+from .models import Visit, Visitor
+
+BUSIEST_HOSTS_LIMIT = 5
+
+
+def cache_seconds():
+    return getattr(settings, 'LOBBY_STATS_CACHE_SECONDS', 60)
+
+
+def compute_stats(today):
+    """Today's check-ins, active visitors, average visit length and busiest hosts."""
+    start = start_of_day(today)
+    todays = Visit.objects.filter(check_in_time__gte=start, check_in_time__lt=start + timedelta(days=1))
+    totals = todays.aggregate(
+        check_ins=Count('id'),
+        checked_out=Count('id', filter=Q(check_out_time__isnull=False)),
+        average_duration=Avg('duration_minutes', filter=Q(check_out_time__isnull=False)),
+    )
+    busiest_hosts = (
+        todays.exclude(host_name='')
+        .values('host_name')
+        .annotate(visits=Count('id'))
+        .order_by('-visits', 'host_name')[:BUSIEST_HOSTS_LIMIT]
+    )
+    average = totals['average_duration']
+    return {
+        'date': today,
+        'today_check_ins': totals['check_ins'],
+        'today_check_outs': totals['checked_out'],
+        'active_visitors': Visit.objects.filter(check_out_time__isnull=True).count(),
+        'average_duration_minutes': round(average, 1) if average is not None else None,
+        'busiest_hosts': list(busiest_hosts),
+        'total_visitors': Visitor.objects.count(),
+    }
+
+
+def lobby_stats(version=None):
+    """Return the dashboard figures, computing them at most once per data version and day."""
+    if version is None:
+        version = current_version()
+    today = timezone.localdate()
+    key = f'visitors:lobby-stats:{version}:{today.isoformat()}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(today)
+        cache.set(key, stats, cache_seconds())
+    return stats
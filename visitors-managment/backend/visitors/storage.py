@@ -0,0 +1,73 @@
+"""
+Content-hashed file storage for visitor photos and signatures.
+
+Files are stored as ``<upload_to>/<sha256>.<ext>``. A name therefore always
+refers to the same bytes, which lets the media view mark responses immutable
+and use the digest as a strong ETag, and a duplicate upload simply reuses the
+existing file. Shared files are reference counted by ``visitors.blobs``.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}$')
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """SHA-256 hex digest of a Django File, leaving it rewound."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def name_hash(name):
+    """Return the digest a hashed file ``name`` was stored under, or None."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return stem if HASHED_NAME_RE.match(stem) else None
+
+
+def hashed_name(name, digest):
+    directory, basename = os.path.split(name)
+    ext = os.path.splitext(basename)[1].lower()
+    return os.path.join(directory, f'{digest}{ext}')
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names each file after the hash of its content.
+
+    Saving bytes that are already stored returns the existing name without
+    writing anything (a stored file of the wrong size, e.g. from an
+    interrupted write, is replaced).
+
+    The file's ``MediaBlob`` row is locked first (see ``visitors.blobs``), so
+    save inside the transaction that records the reference; the model saves
+    in this app do.
+    """
+
+    def save(self, name, content, max_length=None):
+        from . import blobs
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if name_hash(name) is not None:
+            return super().save(name, content, max_length=max_length)
+        name = hashed_name(name, content_hash(content))
+        with transaction.atomic():
+            blobs.reserve(name)
+            if self.exists(name):
+                if self.size(name) == content.size:
+                    return name
+                self.delete(name)
+            return super().save(name, content, max_length=max_length)
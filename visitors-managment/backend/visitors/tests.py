@@ -0,0 +1,1286 @@
+import base64
+import hashlib
+import importlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from visitor_management import instrumentation, logging_utils
+from visitor_management.cache_utils import cache_config
+
+from . import caching, conditional, events, renditions, rollups
+
+from .filters import filter_visits, start_of_day
+from .jobs import MEDIA_TASK_MAX_ATTEMPTS, run_export_job, run_pending_media_tasks, run_pending_renditions
+from .models import (
+    Visitor, Visit, VisitorPhoto, ExportJob, MediaTask, MediaBlob, VisitEvent, VisitDailyRollup
+)
+from .search import FTS_TABLE, fts_available, phone_key, visitor_match_q
+
+
+def make_visits(count, visitor=None):
+    """Create ``count`` visits with distinct, descending check-in times."""
+    if visitor is None:
+        visitor = Visitor.objects.create(name='Ada Lovelace', email='ada@example.com', phone='+15550001')
+    now = timezone.now()
+    visits = []
+    for i in range(count):
+        visit = Visit.objects.create(visitor=visitor, purpose=f'Meeting {i}', host_name='Host')
+        Visit.objects.filter(pk=visit.pk).update(check_in_time=now - timedelta(minutes=i))
+        visits.append(visit)
+    return visitor, visits
+
+
+class TempMediaRootMixin:
+    """Point MEDIA_ROOT at a fresh temporary directory (``self.media_root``) for each test."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+
+class HistoryCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_legacy_mode_returns_everything(self):
+        make_visits(5)
+        response = self.client.get('/api/visitors/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['visits']), 5)
+        self.assertEqual(response.data['count'], 5)
+
+    def test_cursor_walks_all_pages_without_duplicates(self):
+        visitor, _ = make_visits(5)
+        # Two visits sharing a timestamp must still be split deterministically by id.
+        tie = Visit.objects.create(visitor=visitor, purpose='Tie', host_name='Host')
+        Visit.objects.filter(pk=tie.pk).update(
+            check_in_time=Visit.objects.order_by('-check_in_time').first().check_in_time
+        )
+
+        seen = []
+        cursor = ''
+        while True:
+            response = self.client.get('/api/visitors/history/', {'cursor': cursor, 'page_size': 2})
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['visits'])
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+
+    def test_page_size_is_bounded_and_count_can_be_skipped(self):
+        make_visits(3)
+        response = self.client.get('/api/visitors/history/', {'page_size': 1000, 'count': 'none'})
+        self.assertEqual(len(response.data['visits']), 3)
+        self.assertNotIn('count', response.data)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/visitors/history/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        for payload in ({'t': timezone.now().isoformat(), 'id': 'zzz'}, {'t': timezone.now().isoformat(), 'id': 7}):
+            token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+            response = self.client.get('/api/visitors/history/', {'cursor': token})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data, {'cursor': 'Invalid cursor.'})
+
+
+class ListQueryBudgetTests(TestCase):
+    """List endpoints must issue a constant number of queries regardless of row count."""
+    budget = 4
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def add_visits_with_photos(self, count, start):
+        for i in range(start, start + count):
+            visitor = Visitor.objects.create(
+                name=f'Visitor {i}', email=f'visitor{i}@example.com', phone=f'+1555{i:04d}'
+            )
+            visit = Visit.objects.create(visitor=visitor, purpose='Meeting', host_name='Host')
+            VisitorPhoto.objects.create(visitor=visitor, visit=visit, image=f'visitor_photos/{i}.jpg')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # The ETag version lookup is one fixed query on top of the listing.
+        return sum('"visitors_dataversion"' not in query['sql'] for query in ctx.captured_queries)
+
+    def assert_constant_queries(self, url):
+        self.add_visits_with_photos(2, start=0)
+        small = self.count_queries(url)
+        self.add_visits_with_photos(10, start=2)
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.budget)
+
+    def test_history(self):
+        self.assert_constant_queries('/api/visitors/history/')
+
+    def test_active(self):
+        self.assert_constant_queries('/api/visitors/active/')
+
+    def test_visit_list(self):
+        self.assert_constant_queries('/api/visits/')
+
+    def test_visitor_list(self):
+        self.assert_constant_queries('/api/visitors/')
+
+
+class VisitorStatsAnnotationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_ordering_by_total_visits_and_active_visit(self):
+        busy, _ = make_visits(3)
+        quiet = Visitor.objects.create(name='Grace Hopper', email='grace@example.com', phone='+15550002')
+        Visit.objects.filter(visitor=busy).exclude(
+            pk=Visit.objects.filter(visitor=busy).first().pk
+        ).update(check_out_time=timezone.now())
+
+        response = self.client.get('/api/visitors/', {'ordering': '-total_visits'})
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['results']
+        self.assertEqual([row['id'] for row in rows], [str(busy.id), str(quiet.id)])
+        self.assertEqual(rows[0]['total_visits'], 3)
+        self.assertIsNotNone(rows[0]['active_visit'])
+        self.assertIsNotNone(rows[0]['last_visit'])
+        self.assertEqual(rows[1]['total_visits'], 0)
+        self.assertIsNone(rows[1]['active_visit'])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        make_visits(3)
+
+    def test_csv_is_streamed(self):
+        response = self.client.get('/api/visitors/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').strip().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('Visitor ID,Visitor Name'))
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/api/visitors/export/', {'export_format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        self.assertEqual(len(list(workbook.active.rows)), 4)
+
+    def test_docx_is_opt_in(self):
+        response = self.client.get('/api/visitors/export/', {'export_format': 'docx'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertTrue(response.data['filename'].endswith('.docx'))
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/visitors/export/', {'export_format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(EXPORT_JOB_WORKERS=0)
+class ExportJobTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        make_visits(3)
+
+    def test_job_lifecycle_and_ranged_download(self):
+        response = self.client.post('/api/visitors/export/', {'export_format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+        self.assertEqual(response.data['status'], ExportJob.STATUS_PENDING)
+        self.assertIsNone(response.data['download_url'])
+
+        status_response = self.client.get(f'/api/export-jobs/{job_id}/')
+        self.assertEqual(status_response['Retry-After'], '2')
+        self.assertEqual(self.client.get(f'/api/export-jobs/{job_id}/download/').status_code, 409)
+
+        self.assertTrue(run_export_job(job_id))
+        self.assertFalse(run_export_job(job_id))
+        status_response = self.client.get(f'/api/export-jobs/{job_id}/')
+        self.assertEqual(status_response.data['status'], ExportJob.STATUS_COMPLETED)
+        self.assertEqual(status_response.data['progress'], 100)
+        self.assertIsNotNone(status_response.data['download_url'])
+
+        full = self.client.get(f'/api/export-jobs/{job_id}/download/')
+        self.assertEqual(full.status_code, 200)
+        body = b''.join(full.streaming_content)
+        self.assertEqual(len(body.decode('utf-8').strip().splitlines()), 4)
+
+        partial = self.client.get(f'/api/export-jobs/{job_id}/download/', HTTP_RANGE='bytes=10-')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b''.join(partial.streaming_content), body[10:])
+        self.assertEqual(partial['Content-Range'], f'bytes 10-{len(body) - 1}/{len(body)}')
+
+        beyond = self.client.get(f'/api/export-jobs/{job_id}/download/', HTTP_RANGE=f'bytes={len(body)}-')
+        self.assertEqual(beyond.status_code, 416)
+
+    def test_rejects_unknown_format(self):
+        response = self.client.post('/api/visitors/export/', {'export_format': 'docx'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class IndexUsageTests(TestCase):
+    """EXPLAIN the queries behind the list endpoints and check the planner picks our indexes."""
+
+    def setUp(self):
+        make_visits(3)
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be sequentially scanned.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_active_uses_partial_index(self):
+        plan = self.explain(Visit.objects.for_listing().filter(check_out_time__isnull=True))
+        self.assertIn('visit_active_idx', plan)
+
+    def test_history_page_uses_checkin_id_index(self):
+        plan = self.explain(Visit.objects.order_by('-check_in_time', '-id')[:21])
+        self.assertIn('visit_checkin_id_idx', plan)
+
+    def test_visitor_last_visit_uses_visitor_checkin_index(self):
+        visitor = Visitor.objects.get()
+        plan = self.explain(visitor.visits.order_by('-check_in_time')[:1])
+        self.assertIn('visit_visitor_checkin_idx', plan)
+
+    def test_photo_prefetch_uses_visit_index(self):
+        visit_ids = list(Visit.objects.values_list('id', flat=True))
+        plan = self.explain(VisitorPhoto.objects.filter(visit_id__in=visit_ids))
+        self.assertIn('photo_visit_created_idx', plan)
+
+
+class HistoryDateFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        visitor = Visitor.objects.create(name='Ada Lovelace', email='ada@example.com', phone='+15550001')
+        self.late = Visit.objects.create(visitor=visitor, purpose='Late meeting')
+        # 22:00 on Jan 1 in New York is 03:00 on Jan 2 in UTC.
+        Visit.objects.filter(pk=self.late.pk).update(
+            check_in_time=datetime(2024, 1, 2, 3, 0, tzinfo=dt_timezone.utc)
+        )
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_dates_follow_time_zone_setting(self):
+        response = self.client.get('/api/visitors/history/', {'date_from': '2024-01-01', 'date_to': '2024-01-01'})
+        self.assertEqual([row['id'] for row in response.data['visits']], [str(self.late.id)])
+        response = self.client.get('/api/visitors/history/', {'date_from': '2024-01-02'})
+        self.assertEqual(response.data['visits'], [])
+
+    def test_invalid_date_is_rejected(self):
+        response = self.client.get('/api/visitors/history/', {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_date_range_is_index_driven(self):
+        visits = filter_visits(Visit.objects.order_by('-check_in_time'), {
+            'date_from': '2024-01-01', 'date_to': '2024-12-31',
+        })
+        self.assertNotIn('django_datetime_cast_date', str(visits.query))
+        if connection.vendor == 'sqlite':
+            self.assertIn('visit_checkin_id_idx', visits.explain())
+
+
+class VisitorSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.ada = Visitor.objects.create(name='Ada Lovelace', email='ada@example.com', phone='+1 (555) 000-1111')
+        self.grace = Visitor.objects.create(name='Grace Hopper', email='grace@navy.mil', phone='+1 555 000 2222')
+        Visit.objects.create(visitor=self.ada, purpose='Analytical engine demo')
+        Visit.objects.create(visitor=self.grace, purpose='Compiler review')
+
+    def search_ids(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['results'] if 'results' in response.data else response.data['visits']
+        return {row['id'] for row in rows}
+
+    def test_visitor_search_matches_substrings(self):
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': 'lovel'}), {str(self.ada.id)})
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': 'NAVY'}), {str(self.grace.id)})
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': 'Ho'}), {str(self.grace.id)})
+
+    def test_phone_matches_on_digits_only(self):
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': '000-1111'}), {str(self.ada.id)})
+        self.grace.phone = '+1 555 999 3333'
+        self.grace.save()
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': '9993333'}), {str(self.grace.id)})
+
+    def test_digits_in_names_and_emails_do_not_match_phones(self):
+        john = Visitor.objects.create(name='John Smith', email='john1@corp.com', phone='+44 20 7946 0018')
+        unit = Visitor.objects.create(name='Unit 5550', email='desk@corp.com', phone='+44 20 7946 0019')
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': 'john1@corp.com'}), {str(john.id)})
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': 'Unit 5550'}), {str(unit.id)})
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': '(555) 000'}),
+                         {str(self.ada.id), str(self.grace.id)})
+
+    def test_visit_search_and_history_filters(self):
+        visits = self.search_ids('/api/visits/', {'search': 'compiler'})
+        self.assertEqual(visits, {str(Visit.objects.get(visitor=self.grace).id)})
+        history = self.search_ids('/api/visitors/history/', {'phone': '(555) 000-1111'})
+        self.assertEqual(history, {str(Visit.objects.get(visitor=self.ada).id)})
+
+    def test_deleted_visitors_leave_the_index(self):
+        self.ada.delete()
+        self.assertEqual(self.search_ids('/api/visitors/', {'search': 'lovelace'}), set())
+
+    def test_sqlite_uses_fts_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite-only')
+        self.assertTrue(fts_available())
+        self.assertIn(FTS_TABLE, str(Visitor.objects.filter(visitor_match_q('lovelace')).query))
+
+    def test_returning_visitor_lookup_uses_normalized_keys(self):
+        Visit.objects.filter(visitor=self.ada).update(check_out_time=timezone.now(), duration_minutes=5)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/visitors/search/', {'email': ' ADA@Example.com'})
+        self.assertEqual(response.data['visitor']['id'], str(self.ada.id))
+        self.assertEqual(response.data['visitor']['total_visits'], 1)
+        self.assertIsNone(response.data['visitor']['active_visit'])
+
+        response = self.client.get('/api/visitors/search/', {'phone': '+1 555-000-2222'})
+        self.assertEqual(response.data['visitor']['id'], str(self.grace.id))
+        self.assertIsNotNone(response.data['visitor']['active_visit'])
+        # The email match wins over a different visitor's phone.
+        response = self.client.get('/api/visitors/search/', {'email': 'ada@example.com', 'phone': '15550002222'})
+        self.assertEqual(response.data['visitor']['id'], str(self.ada.id))
+        self.assertFalse(self.client.get('/api/visitors/search/', {'phone': '555 000 2222'}).data['found'])
+
+    def test_phone_key_is_e164(self):
+        self.assertEqual(phone_key('0044 20 7946 0018'), '+442079460018')
+        self.assertEqual(phone_key('020 7946 0018', country_code='44'), '+442079460018')
+        self.assertEqual(phone_key('(555) 000-1111'), '+5550001111')
+        self.assertEqual(phone_key(''), '')
+
+
+class DbStatsTests(TestCase):
+    def test_reports_reuse_ratio(self):
+        client = APIClient()
+        client.get('/api/test-connection/')
+        response = client.get('/api/db-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.data['requests'], 2)
+        self.assertIn('reuse_ratio', response.data)
+        self.assertLessEqual(response.data['reuse_ratio'], 1)
+
+
+class DbPoolTests(TestCase):
+    """Pool bookkeeping with stand-in connections; no PostgreSQL server is involved."""
+
+    def fake_connection(self, *args, **kwargs):
+        import psycopg2.extensions
+        conn = SimpleNamespace(closed=0, info=SimpleNamespace(
+            transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE))
+        conn.close = lambda: setattr(conn, 'closed', 1)
+        return conn
+
+    def test_returned_connections_stay_pooled_up_to_max_size(self):
+        try:
+            from visitor_management.db_pool.base import HealthCheckedPool
+        except (ImportError, ImproperlyConfigured):
+            self.skipTest('psycopg2 is not installed')
+        with mock.patch('psycopg2.pool.psycopg2.connect', side_effect=self.fake_connection) as connect:
+            pool = HealthCheckedPool(1, 3, 30)
+            for _ in range(2):
+                conns = [pool.checkout() for _ in range(3)]
+                for conn in conns:
+                    pool.checkin(conn)
+            self.assertEqual(connect.call_count, 3)
+            self.assertEqual(len(pool._pool), 3)
+            self.assertFalse(any(conn.closed for conn in pool._pool))
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SLOW_MS=10_000)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+        self.client = APIClient()
+        make_visits(2)
+
+    def test_server_timing_and_prometheus_totals(self):
+        response = self.client.get('/api/visitors/active/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+')
+        self.assertNotIn('desc="0 queries"', timing)
+
+        text = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('visitors_http_requests_total{route="visitor-active",method="GET",status="200"} 1', text)
+        self.assertIn('visitors_http_request_duration_seconds_count{route="visitor-active",method="GET"} 1', text)
+        self.assertRegex(text, r'visitors_db_queries_total\{route="visitor-active",method="GET"\} [1-9]')
+        self.assertIn(f'visitors_http_response_bytes_total{{route="visitor-active",method="GET"}} '
+                      f'{len(response.content)}', text)
+
+    def test_slow_requests_log_sql_fingerprints(self):
+        with override_settings(REQUEST_METRICS_SLOW_MS=0), \
+                self.assertLogs('visitor_management.instrumentation', 'WARNING') as logs:
+            self.client.get('/api/visitors/history/', {'name': 'Ada'})
+        self.assertIn('Slow request GET /api/visitors/history/?name=Ada', logs.output[0])
+        self.assertIn('FROM "visitors_visit"', logs.output[0])
+        self.assertNotIn('Ada', logs.output[0].split('\n', 1)[1])
+
+    def test_fingerprint_groups_parameters(self):
+        self.assertEqual(
+            instrumentation.fingerprint("SELECT * FROM t WHERE id IN (%s, %s,%s) AND name = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/visitors/active/'))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+
+class LoggingTests(TestCase):
+    def make_record(self, level=logging.INFO, msg='visit %s', args=('v1',), **extra):
+        record = logging.LogRecord('visitors.views', level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter(self):
+        line = logging_utils.JSONFormatter().format(self.make_record(visit_id='v1'))
+        data = json.loads(line)
+        self.assertEqual((data['level'], data['logger'], data['message']), ('INFO', 'visitors.views', 'visit v1'))
+        self.assertEqual(data['visit_id'], 'v1')
+
+    def test_sampling_keeps_info_and_samples_debug(self):
+        sampler = logging_utils.SamplingFilter(rate=0)
+        self.assertTrue(sampler.filter(self.make_record(logging.INFO)))
+        self.assertFalse(sampler.filter(self.make_record(logging.DEBUG)))
+        self.assertTrue(logging_utils.SamplingFilter(rate=1).filter(self.make_record(logging.DEBUG)))
+
+    def test_queue_handler_writes_in_background_and_drops_when_full(self):
+        stream = io.StringIO()
+        handler = logging_utils.QueueingStreamHandler(stream)
+        handler.setFormatter(logging_utils.JSONFormatter())
+        args = ['v1']
+        record = self.make_record(args=(args,))
+        handler.handle(record)
+        args.append('changed')
+        handler.close()
+        self.assertEqual(json.loads(stream.getvalue())['message'], "visit ['v1']")
+
+        handler = logging_utils.QueueingStreamHandler(io.StringIO(), maxsize=1)
+        self.addCleanup(handler.close)
+        handler.stop()  # nothing drains the queue now
+        handler.handle(self.make_record())
+        handler.handle(self.make_record())
+        self.assertEqual(handler.dropped, 1)
+
+
+class CheckInTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.payload = {
+            'name': 'Ada Lovelace', 'email': 'ada@example.com', 'phone': '+15550001',
+            'purpose': 'Demo', 'host_name': 'Charles',
+        }
+
+    def check_in(self, **extra):
+        return self.client.post('/api/visitors/check_in/', dict(self.payload, **extra), format='json')
+
+    def test_returning_visitor_without_changes_skips_update(self):
+        self.assertEqual(self.check_in().status_code, 201)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.check_in()
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['is_returning_visitor'])
+        statements = [query['sql'] for query in ctx.captured_queries]
+        self.assertFalse(any(sql.startswith('UPDATE') for sql in statements))
+        inserts = [sql for sql in statements if sql.startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+        self.assertIn('"visitors_visitevent"', inserts[1])
+
+    def test_returning_visitor_matched_by_phone_is_updated(self):
+        self.check_in()
+        response = self.check_in(email='ada@lovelace.example')
+        self.assertTrue(response.data['is_returning_visitor'])
+        self.assertEqual(Visitor.objects.get().email, 'ada@lovelace.example')
+
+    def test_returning_visitor_matched_ignoring_email_case(self):
+        self.check_in()
+        response = self.check_in(email='Ada@Example.com', phone='+1 555 0001')
+        self.assertTrue(response.data['is_returning_visitor'])
+        visitor = Visitor.objects.get()
+        self.assertEqual((visitor.email, visitor.email_key), ('Ada@Example.com', 'ada@example.com'))
+        self.assertEqual((visitor.phone, visitor.phone_key), ('+1 555 0001', '+15550001'))
+
+    def test_signature_data_url_is_stored_by_the_media_worker(self):
+        content = png_bytes()
+        signature = 'data:image/png;base64,' + base64.b64encode(content).decode()
+        response = self.check_in(signature_data=signature)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['visit']['media_status'], 'processing')
+        self.assertNotIn('signature_data', response.data['visit'])
+
+        self.assertEqual(run_pending_media_tasks(), 1)
+        visit = Visit.objects.get()
+        self.assertEqual(visit.media_status, Visit.MEDIA_READY)
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(visit.signature_image.name, f'visitor_signatures/{digest}.png')
+        self.assertIsNone(visit.signature_data)
+        self.assertFalse(MediaTask.objects.get().file)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'media-tasks')), [])
+
+        visit_data = self.client.get(f'/api/visits/{visit.id}/').data
+        self.assertEqual(visit_data['signature_type'], 'image')
+        self.assertIsNotNone(visit_data['signature_url'])
+
+    def test_photo_is_stored_off_request_and_retried(self):
+        photo = 'data:image/png;base64,' + base64.b64encode(png_bytes()).decode()
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.check_in(photo_data=photo)
+        # The media task submission, besides the list version bumps.
+        self.assertEqual(len([cb for cb in callbacks if cb is not conditional._increment]), 1)
+        self.assertEqual(response.data['visit']['photos'], [])
+        self.assertFalse(VisitorPhoto.objects.exists())
+
+        with mock.patch('visitors.jobs.store_media', side_effect=OSError('disk full')), \
+                self.assertLogs('visitors.jobs', 'ERROR'):
+            self.assertEqual(run_pending_media_tasks(), 1)
+        task = MediaTask.objects.get()
+        self.assertEqual((task.status, task.attempts, task.error), (MediaTask.STATUS_PENDING, 1, 'disk full'))
+        self.assertGreater(task.run_after, timezone.now())
+        self.assertEqual(run_pending_media_tasks(), 0)  # still backing off
+
+        call_command('process_media_tasks', '--ignore-delay', stdout=io.StringIO())
+        self.assertEqual(Visit.objects.get().media_status, Visit.MEDIA_READY)
+        self.assertEqual(VisitorPhoto.objects.get().visit_id, task.visit_id)
+
+    def test_media_task_fails_after_max_attempts(self):
+        photo = 'data:image/png;base64,' + base64.b64encode(png_bytes()).decode()
+        self.check_in(photo_data=photo)
+        with mock.patch('visitors.jobs.store_media', side_effect=OSError('disk full')), \
+                self.assertLogs('visitors.jobs', 'ERROR'):
+            for _ in range(MEDIA_TASK_MAX_ATTEMPTS):
+                run_pending_media_tasks(ignore_delay=True)
+        self.assertEqual(MediaTask.objects.get().status, MediaTask.STATUS_FAILED)
+        self.assertEqual(Visit.objects.get().media_status, Visit.MEDIA_FAILED)
+
+        out = io.StringIO()
+        call_command('process_media_tasks', '--list', stdout=out)
+        self.assertIn('failed after 3 attempt(s): disk full', out.getvalue())
+
+    def test_vector_signature_is_stored_compactly_and_linked(self):
+        signature = '{\n  "paths": [[{"x": 1, "y": 2}]],\n  "type": "vector"\n}'
+        response = self.check_in(signature_data=signature)
+        visit = Visit.objects.get()
+        self.assertEqual(visit.signature_data, '{"paths":[[{"x":1,"y":2}]],"type":"vector"}')
+        self.assertFalse(visit.signature_image)
+        self.assertEqual(response.data['visit']['signature_type'], 'vector')
+
+        history = self.client.get('/api/visitors/history/')
+        url = history.data['visits'][0]['signature_url']
+        self.assertTrue(url.endswith(f'/api/visits/{visit.id}/signature/'))
+        self.assertEqual(self.client.get(url).json(), {'paths': [[{'x': 1, 'y': 2}]], 'type': 'vector'})
+
+    def test_stroke_array_signature_is_stored_as_vector(self):
+        signature = '[{"points": [{"x": 1, "y": 2}], "lineColor": "#000"}]'
+        response = self.check_in(signature_data=signature, is_vector_signature='true')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Visit.objects.get().signature_data, '[{"points":[{"x":1,"y":2}],"lineColor":"#000"}]')
+
+    def test_undecodable_signature_is_rejected(self):
+        response = self.check_in(signature_data='data:image/png;base64,iVBORw0KGgo')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('signature_data', response.data)
+        self.assertFalse(Visit.objects.exists())
+
+    def test_existing_signature_blobs_are_moved_out(self):
+        migration = importlib.import_module('visitors.migrations.0010_signature_storage')
+        _, (image_visit, vector_visit, junk_visit) = make_visits(3)
+        png = base64.b64encode(png_bytes()).decode()
+        Visit.objects.filter(pk=image_visit.pk).update(signature_data=png)
+        Visit.objects.filter(pk=vector_visit.pk).update(signature_data='{"paths": []}')
+        Visit.objects.filter(pk=junk_visit.pk).update(signature_data='not a signature')
+
+        with self.assertLogs(migration.__name__, 'WARNING'):
+            migration.move_signature_blobs(django_apps, SimpleNamespace(connection=connection))
+
+        image_visit.refresh_from_db()
+        self.assertIsNone(image_visit.signature_data)
+        self.assertTrue(image_visit.signature_image.name.endswith('.png'))
+        self.assertEqual(Visit.objects.get(pk=vector_visit.pk).signature_data, '{"paths":[]}')
+        self.assertEqual(Visit.objects.get(pk=junk_visit.pk).signature_data, 'not a signature')
+
+    def test_invalid_photo_data_writes_nothing(self):
+        response = self.check_in(photo_data='data:image/jpeg;base64,@@@')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Visitor.objects.exists())
+        self.assertFalse(Visit.objects.exists())
+
+    def test_media_extension_comes_from_the_image_not_the_client(self):
+        svg = base64.b64encode(b'<svg xmlns="http://www.w3.org/2000/svg"/>').decode()
+        response = self.check_in(photo_data=f'data:image/svg+xml;base64,{svg}')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Visit.objects.exists())
+
+        upload = io.BytesIO(b'<html></html>')
+        upload.name = 'photo.png'
+        response = self.client.post('/api/visitors/check_in/', dict(self.payload, photo=upload), format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('photo', response.data)
+        self.assertFalse(Visit.objects.exists())
+
+        png = base64.b64encode(png_bytes()).decode()
+        response = self.check_in(photo_data=f'data:image/{"x" * 20};base64,{png}')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(MediaTask.objects.get().file_ext, 'png')
+        run_pending_media_tasks()
+        self.assertTrue(VisitorPhoto.objects.get().image.name.endswith('.png'))
+
+
+def png_bytes(size=(20, 10)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class BinaryUploadTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        _, (self.visit,) = make_visits(1)
+
+    def test_raw_photo_upload(self):
+        response = self.client.generic('POST', f'/api/visits/{self.visit.id}/photo/',
+                                       png_bytes(), content_type='image/png')
+        self.assertEqual(response.status_code, 201)
+        photo = VisitorPhoto.objects.get()
+        self.assertEqual(photo.visit, self.visit)
+        self.assertTrue(photo.image.name.endswith('.png'))
+
+    def test_upload_extension_ignores_the_file_name(self):
+        upload = io.BytesIO(png_bytes())
+        upload.name = 'photo.html'
+        response = self.client.post(f'/api/visits/{self.visit.id}/photo/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(VisitorPhoto.objects.get().image.name.endswith('.png'))
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='BMP')
+        response = self.client.generic('POST', f'/api/visits/{self.visit.id}/photo/',
+                                       buffer.getvalue(), content_type='image/png')
+        self.assertEqual(response.status_code, 400)
+
+    def test_multipart_signature_upload_replaces_previous(self):
+        url = f'/api/visits/{self.visit.id}/signature/'
+        for _ in range(2):
+            upload = io.BytesIO(png_bytes())
+            upload.name = 'signature.png'
+            response = self.client.put(url, {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, 200)
+        self.visit.refresh_from_db()
+        self.assertTrue(self.visit.signature_image.storage.exists(self.visit.signature_image.name))
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'visitor_signatures'))), 1)
+
+    @override_settings(PHOTO_UPLOAD_MAX_BYTES=10)
+    def test_oversized_upload_is_refused_before_reading(self):
+        response = self.client.generic('POST', f'/api/visits/{self.visit.id}/photo/',
+                                       png_bytes(), content_type='image/png')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(VisitorPhoto.objects.exists())
+
+    def test_photo_renditions_are_created_and_linked(self):
+        response = self.client.generic('POST', f'/api/visits/{self.visit.id}/photo/',
+                                       png_bytes((1200, 800)), content_type='image/png')
+        self.assertEqual(response.status_code, 201)
+        photo = VisitorPhoto.objects.get()
+        thumbnail = os.path.join(self.media_root, renditions.rendition_name(photo.image.name, 'thumbnail'))
+        with Image.open(thumbnail) as image:
+            self.assertEqual(image.size, (160, 107))
+        self.assertTrue(response.data['thumbnail_url'].endswith('.' + renditions.RENDITION_EXT))
+
+        # Pending photos (e.g. uploaded before renditions existed) are listed with the
+        # original and queued for the media worker, once.
+        os.remove(thumbnail)
+        VisitorPhoto.objects.update(renditions_status=VisitorPhoto.RENDITIONS_PENDING)
+        with mock.patch('visitors.jobs.get_executor') as get_executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            for _ in range(2):
+                history = self.client.get('/api/visitors/history/')
+        self.assertEqual(history.data['visits'][0]['photos'][0]['thumbnail_url'], response.data['image_url'])
+        self.assertEqual(get_executor.return_value.submit.call_count, 1)
+
+        self.assertEqual(run_pending_renditions(), 1)
+        self.assertTrue(os.path.exists(thumbnail))
+        history = self.client.get('/api/visitors/history/')
+        self.assertEqual(history.data['visits'][0]['photos'][0]['thumbnail_url'], response.data['thumbnail_url'])
+
+    def test_photo_that_cannot_be_rendered_is_not_retried(self):
+        with mock.patch('visitors.renditions.render', side_effect=Image.DecompressionBombError('too big')), \
+                self.assertLogs('visitors.renditions', 'WARNING'):
+            response = self.client.generic('POST', f'/api/visits/{self.visit.id}/photo/',
+                                           png_bytes(), content_type='image/png')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['thumbnail_url'], response.data['image_url'])
+        self.assertEqual(VisitorPhoto.objects.get().renditions_status, VisitorPhoto.RENDITIONS_FAILED)
+
+        with mock.patch('visitors.jobs.get_executor') as get_executor, \
+                mock.patch('visitors.renditions.create_renditions') as create_renditions:
+            self.client.get('/api/visitors/history/')
+        get_executor.assert_not_called()
+        create_renditions.assert_not_called()
+
+    def test_rejects_non_images(self):
+        response = self.client.generic('POST', f'/api/visits/{self.visit.id}/photo/',
+                                       b'not an image', content_type='image/png')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.generic('POST', f'/api/visits/{self.visit.id}/photo/',
+                                       b'text', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+
+
+class MediaServingTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        _, (self.visit,) = make_visits(1)
+        self.content = png_bytes()
+        self.client.generic('POST', f'/api/visits/{self.visit.id}/photo/', self.content, content_type='image/png')
+        self.photo = VisitorPhoto.objects.get()
+
+    def test_photos_are_stored_under_their_content_hash(self):
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(self.photo.image.name, f'visitor_photos/{digest}.png')
+
+    def test_hashed_media_is_immutable_and_revalidates_with_304(self):
+        url = self.photo.image.url
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.content).hexdigest()}"')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+        partial = self.client.get(url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b''.join(partial.streaming_content), self.content[:4])
+        stale = self.client.get(url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"old"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_unhashed_media_must_revalidate(self):
+        # Photos stored before content hashing keep their original names.
+        with open(os.path.join(self.media_root, 'visitor_photos', 'legacy.png'), 'wb') as f:
+            f.write(png_bytes())
+        response = self.client.get('/media/visitor_photos/legacy.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertEqual(self.client.get('/media/visitor_photos/legacy.png',
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_exports_and_other_private_media_are_404(self):
+        os.makedirs(os.path.join(self.media_root, 'exports'))
+        with open(os.path.join(self.media_root, 'exports', 'visits.csv'), 'w') as f:
+            f.write('a,b\n')
+        for url in ('/media/exports/visits.csv', '/media/visitor_photos/../exports/visits.csv'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_missing_and_traversal_paths_are_404(self):
+        self.assertEqual(self.client.get('/media/visitor_photos/nope.png').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect')
+    def test_accel_redirect_mode(self):
+        response = self.client.get(self.photo.image.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.photo.image.name}')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class MediaDeduplicationTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.content = png_bytes()
+
+    def upload_photo(self, visit):
+        response = self.client.generic('POST', f'/api/visits/{visit.id}/photo/',
+                                       self.content, content_type='image/png')
+        self.assertEqual(response.status_code, 201)
+        return VisitorPhoto.objects.get(pk=response.data['id'])
+
+    def stored_files(self, directory):
+        path = os.path.join(self.media_root, directory)
+        return os.listdir(path) if os.path.isdir(path) else []
+
+    def test_duplicate_uploads_share_one_file_until_the_last_reference_goes(self):
+        visitor, (first_visit,) = make_visits(1)
+        _, (second_visit,) = make_visits(1, visitor=visitor)
+        first = self.upload_photo(first_visit)
+        second = self.upload_photo(second_visit)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.stored_files('visitor_photos'), [os.path.basename(first.image.name)])
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=second.image.name).ref_count, 1)
+        self.assertEqual(len(self.stored_files('visitor_photos')), 1)
+
+        # Deleting the visitor cascades to the last photo and removes the file and renditions.
+        with self.captureOnCommitCallbacks(execute=True):
+            visitor.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(self.stored_files('visitor_photos'), [])
+        self.assertEqual(self.stored_files('renditions/thumbnail/visitor_photos'), [])
+
+    def test_file_reused_before_pending_delete_runs_is_kept(self):
+        _, (first_visit, second_visit) = make_visits(2)
+        first = self.upload_photo(first_visit)
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).ref_count, 0)
+
+        # The same bytes are uploaded again before the deletion runs.
+        second = self.upload_photo(second_visit)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(MediaBlob.objects.get(name=second.image.name).ref_count, 1)
+        self.assertEqual(self.stored_files('visitor_photos'), [os.path.basename(second.image.name)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(self.stored_files('visitor_photos'), [])
+
+    def test_replaced_signature_is_released(self):
+        _, (visit,) = make_visits(1)
+        url = f'/api/visits/{visit.id}/signature/'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(url, self.content, content_type='image/png')
+            self.client.put(url, png_bytes((30, 10)), content_type='image/png')
+        visit.refresh_from_db()
+        self.assertEqual(list(MediaBlob.objects.values_list('name', 'ref_count')),
+                         [(visit.signature_image.name, 1)])
+        self.assertEqual(self.stored_files('visitor_signatures'), [os.path.basename(visit.signature_image.name)])
+
+    def test_worker_stored_signature_is_counted(self):
+        signature = 'data:image/png;base64,' + base64.b64encode(self.content).decode()
+        payload = {'name': 'Ada', 'email': 'ada@example.com', 'phone': '+15550001', 'purpose': 'Demo'}
+        for email in ('ada@example.com', 'ada@lovelace.example'):
+            self.client.post('/api/visitors/check_in/', dict(payload, email=email, signature_data=signature),
+                             format='json')
+        run_pending_media_tasks()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+        self.assertEqual(len(self.stored_files('visitor_signatures')), 1)
+
+
+@override_settings(VISIT_EVENTS_STREAM_SECONDS=0, VISIT_EVENTS_POLL_INTERVAL=0)
+class ActiveVisitStreamTests(TestCase):
+    url = '/api/visitors/active/stream/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {'name': 'Ada', 'email': 'ada@example.com', 'phone': '+15550001', 'purpose': 'Demo'}
+
+    def read(self, **headers):
+        response = self.client.get(self.url, **headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def parse(self, body):
+        messages = []
+        for block in body.strip().split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line)
+            if 'data' in fields:
+                messages.append(fields)
+        return messages
+
+    def event_ids(self, chunks):
+        return [json.loads(m['data'])['event_id'] for m in self.parse(''.join(chunks))]
+
+    def settled(self):
+        """Run with the clock past ``EVENT_SETTLE_TIME`` for everything logged so far."""
+        return mock.patch('django.utils.timezone.now', return_value=timezone.now() + events.EVENT_SETTLE_TIME)
+
+    def test_new_connection_gets_snapshot(self):
+        self.client.post('/api/visitors/check_in/', self.payload, format='json')
+        with self.settled():
+            (snapshot,) = self.parse(self.read())
+        self.assertEqual(snapshot['event'], 'snapshot')
+        self.assertEqual(snapshot['id'], str(VisitEvent.objects.get().id))
+        self.assertIn('"count":1', snapshot['data'])
+
+    def test_reconnect_gets_only_missed_events(self):
+        (snapshot,) = self.parse(self.read())
+        visit_id = self.client.post('/api/visitors/check_in/', self.payload, format='json').data['visit']['id']
+        self.client.post('/api/visitors/check_out/', {'visit_id': visit_id}, format='json')
+
+        with self.settled():
+            messages = self.parse(self.read(HTTP_LAST_EVENT_ID=snapshot['id']))
+            self.assertEqual([m['event'] for m in messages], ['check_in', 'check_out'])
+            self.assertIn(visit_id, messages[1]['data'])
+            self.assertIn('"check_out_time":"', messages[1]['data'])
+
+            resumed = self.parse(self.read(HTTP_LAST_EVENT_ID=messages[0]['id']))
+            self.assertEqual([m['event'] for m in resumed], ['check_out'])
+
+    def test_async_stream_matches_sync(self):
+        self.client.post('/api/visitors/check_in/', self.payload, format='json')
+
+        async def collect(stream):
+            return [chunk async for chunk in stream]
+
+        chunks = async_to_sync(collect)(events.ActiveVisitStream(request=None))
+        self.assertEqual(chunks, list(events.ActiveVisitStream(request=None)))
+
+    def test_event_committed_out_of_order_is_still_sent(self):
+        stream = events.ActiveVisitStream(request=None)
+        stream.open()
+        # A lower id can commit after a higher one has already been streamed.
+        VisitEvent.objects.create(id=2, kind=VisitEvent.KIND_CHECK_IN, visit_id=uuid.uuid4())
+        self.assertEqual(self.event_ids(stream.poll()), [2])
+        VisitEvent.objects.create(id=1, kind=VisitEvent.KIND_CHECK_IN, visit_id=uuid.uuid4())
+        self.assertEqual(self.event_ids(stream.poll()), [1])
+        self.assertEqual(stream.poll(), [])
+
+        with self.settled():
+            self.assertEqual(stream.poll(), [])
+        self.assertEqual((stream.cursor, stream.sent), (2, {}))
+
+    def test_reconnect_gets_event_committed_out_of_order(self):
+        VisitEvent.objects.create(id=1, kind=VisitEvent.KIND_CHECK_IN, visit_id=uuid.uuid4())
+        with self.settled():
+            (snapshot,) = self.parse(''.join(events.ActiveVisitStream(request=None).open()))
+        self.assertEqual(snapshot['id'], '1')
+
+        stream = events.ActiveVisitStream(request=None, last_event_id=1)
+        stream.open()
+        VisitEvent.objects.create(id=3, kind=VisitEvent.KIND_CHECK_IN, visit_id=uuid.uuid4())
+        (message,) = self.parse(''.join(stream.poll()))
+        # The client disconnects here; event 2 commits before it reconnects.
+        VisitEvent.objects.create(id=2, kind=VisitEvent.KIND_CHECK_IN, visit_id=uuid.uuid4())
+
+        resumed = events.ActiveVisitStream(request=None, last_event_id=int(message['id']))
+        self.assertEqual(len(resumed.open()), 1)  # no snapshot
+        self.assertEqual(self.event_ids(resumed.poll()), [2, 3])
+
+    @override_settings(VISIT_EVENTS_STREAM_SECONDS=300, VISIT_EVENTS_WSGI_STREAM_SECONDS=0)
+    def test_wsgi_stream_ends_early(self):
+        (snapshot,) = self.parse(self.read())
+        self.assertEqual(snapshot['event'], 'snapshot')
+
+    def test_pruned_cursor_falls_back_to_snapshot(self):
+        self.client.post('/api/visitors/check_in/', self.payload, format='json')
+        call_command('prune_visit_events', days=0, stdout=io.StringIO())
+        self.assertFalse(VisitEvent.objects.exists())
+        self.client.post('/api/visitors/check_in/', dict(self.payload, email='b@example.com', phone='+15550002'),
+                         format='json')
+        (snapshot,) = self.parse(self.read(HTTP_LAST_EVENT_ID='0'))
+        self.assertEqual(snapshot['event'], 'snapshot')
+        self.assertIn('"count":2', snapshot['data'])
+
+
+class ConditionalListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visitor, self.visits = make_visits(2)
+
+    def test_unchanged_list_returns_304_without_listing_queries(self):
+        for url in ('/api/visitors/active/', '/api/visitors/history/', '/api/visits/', '/api/visitors/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('no-cache', response['Cache-Control'])
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b'')
+
+    def test_etag_depends_on_query(self):
+        first = self.client.get('/api/visitors/history/')['ETag']
+        self.assertNotEqual(first, self.client.get('/api/visitors/history/?search=Ada')['ETag'])
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get('/api/visitors/active/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/visitors/check_out/', {'visit_id': str(self.visits[0].id)}, format='json')
+        response = self.client.get('/api/visitors/active/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Visitor.objects.filter(pk=self.visitor.pk).first().save()
+        self.assertNotEqual(self.client.get('/api/visitors/active/')['ETag'], etag)
+
+
+class LobbyStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.addCleanup(cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            visitor, visits = make_visits(3)
+            Visit.objects.filter(pk=visits[1].pk).update(host_name='Grace')
+            visits[2].check_out()
+            Visit.objects.filter(pk=visits[2].pk).update(duration_minutes=30)
+            Visit.objects.create(visitor=visitor, purpose='Old', host_name='Host')
+            Visit.objects.filter(purpose='Old').update(check_in_time=timezone.now() - timedelta(days=2))
+
+    def test_stats(self):
+        data = self.client.get('/api/visitors/stats/').data
+        self.assertEqual(data['today_check_ins'], 3)
+        self.assertEqual(data['today_check_outs'], 1)
+        self.assertEqual(data['active_visitors'], 3)
+        self.assertEqual(data['average_duration_minutes'], 30)
+        self.assertEqual(data['busiest_hosts'], [{'host_name': 'Host', 'visits': 2},
+                                                 {'host_name': 'Grace', 'visits': 1}])
+        self.assertEqual(data['total_visitors'], 1)
+
+    def test_cached_until_next_write(self):
+        self.client.get('/api/visitors/stats/')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/visitors/stats/').data['active_visitors'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/visitors/check_out/', {'visit_id': str(Visit.objects.filter(
+                check_out_time__isnull=True).first().id)}, format='json')
+        self.assertEqual(self.client.get('/api/visitors/stats/').data['active_visitors'], 2)
+
+
+class BulkCheckInOutTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.ada = Visitor.objects.create(name='Ada Lovelace', email='ada@example.com', phone='+15550001')
+
+    def item(self, n, **extra):
+        return dict({'name': f'Guest {n}', 'email': f'guest{n}@example.com',
+                     'phone': f'+1555100{n:04d}', 'purpose': 'Conference'}, **extra)
+
+    def bulk_check_in(self, items):
+        return self.client.post('/api/visitors/bulk_check_in/', items, format='json')
+
+    def search_ids(self, term):
+        return {row['id'] for row in self.client.get('/api/visitors/', {'search': term}).data['results']}
+
+    def test_bulk_check_in_upserts_visitors_with_per_item_results(self):
+        items = [
+            self.item(1),
+            self.item(2, name='Ada King', email='ADA@example.com', phone='+15550001'),
+            self.item(3, email='not-an-email'),
+            self.item(4, email='guest1@example.com'),
+        ]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.bulk_check_in(items)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (2, 2))
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['checked_in', 'checked_in', 'error', 'error'])
+        self.assertFalse(results[0]['is_returning_visitor'])
+        self.assertTrue(results[1]['is_returning_visitor'])
+        self.assertIn('email', results[2]['errors'])
+        self.assertIn('non_field_errors', results[3]['errors'])
+        self.assertIn(conditional._increment, callbacks)
+
+        self.ada.refresh_from_db()
+        self.assertEqual((self.ada.name, self.ada.email, self.ada.email_key), ('Ada King', 'ADA@example.com', 'ada@example.com'))
+        guest = Visitor.objects.get(email='guest1@example.com')
+        self.assertEqual((guest.phone_digits, guest.phone_key), ('15551000001', '+15551000001'))
+        self.assertEqual(VisitEvent.objects.filter(kind=VisitEvent.KIND_CHECK_IN).count(), 2)
+        # The search index follows upserted rows.
+        self.assertEqual(self.search_ids('king'), {str(self.ada.id)})
+        self.assertEqual(self.search_ids('guest'), {str(guest.id)})
+
+    def test_bulk_check_in_queries_do_not_grow_with_the_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            self.bulk_check_in([self.item(n) for n in range(2)])
+        with CaptureQueriesContext(connection) as large:
+            self.bulk_check_in([self.item(n) for n in range(10, 30)])
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(Visit.objects.count(), 22)
+
+    def test_bulk_check_out_computes_durations_in_one_update(self):
+        _, visits = make_visits(3, visitor=self.ada)
+        Visit.objects.filter(pk=visits[0].pk).update(check_in_time=timezone.now() - timedelta(minutes=90, seconds=30))
+        visits[2].check_out()
+        missing = '00000000-0000-0000-0000-000000000000'
+        items = [{'visit_id': str(visit.pk)} for visit in visits] + [{'visit_id': missing}, {'visit_id': 'nope'}]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/visitors/bulk_check_out/', items, format='json')
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['checked_out', 'checked_out', 'error', 'error', 'error'])
+        self.assertEqual(results[0]['duration_minutes'], 90)
+        self.assertEqual(results[2]['errors'], {'visit_id': ['Visitor has already been checked out']})
+        self.assertEqual(results[3]['errors'], {'visit_id': ['Visit not found']})
+        updates = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE "visitors_visit"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(Visit.objects.get(pk=visits[0].pk).duration_minutes, 90)
+        self.assertFalse(Visit.objects.filter(check_out_time__isnull=True).exists())
+        self.assertEqual(VisitDailyRollup.objects.aggregate(total=Sum('visits'))['total'], 3)
+        self.assertEqual(VisitEvent.objects.filter(kind=VisitEvent.KIND_CHECK_OUT).count(), 3)
+
+    def test_bulk_endpoints_reject_non_lists_and_oversized_batches(self):
+        self.assertEqual(self.bulk_check_in(self.item(1)).status_code, 400)
+        with override_settings(BULK_MAX_ITEMS=1):
+            self.assertEqual(self.bulk_check_in([self.item(1), self.item(2)]).status_code, 413)
+
+
+class VisitRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.visitor = Visitor.objects.create(name='Ada', email='ada@example.com', phone='+15550001')
+
+    def completed_visit(self, minutes, host='Charles', purpose='Demo', days_ago=0):
+        visit = Visit.objects.create(visitor=self.visitor, purpose=purpose, host_name=host)
+        check_in = start_of_day(timezone.localdate() - timedelta(days=days_ago)) + timedelta(hours=8)
+        Visit.objects.filter(pk=visit.pk).update(check_in_time=check_in)
+        visit.refresh_from_db()
+        with mock.patch('django.utils.timezone.now', return_value=check_in + timedelta(minutes=minutes)):
+            visit.check_out()
+        return visit
+
+    def test_check_out_updates_rollup(self):
+        for minutes in (10, 20, 200):
+            self.completed_visit(minutes)
+        self.completed_visit(5, host='Grace')
+        rollup = VisitDailyRollup.objects.get(host_name='Charles')
+        self.assertEqual((rollup.visits, rollup.total_duration_minutes), (3, 230))
+        self.assertEqual((rollup.min_duration_minutes, rollup.max_duration_minutes), (10, 200))
+        self.assertEqual(sum(rollup.duration_histogram), 3)
+        self.assertEqual(rollup.duration_histogram[VisitDailyRollup.bucket_index(200)], 1)
+
+    def test_overlapping_check_outs_count_once(self):
+        visit = Visit.objects.create(visitor=self.visitor, purpose='Demo', host_name='Charles')
+        first, second = Visit.objects.get(pk=visit.pk), Visit.objects.get(pk=visit.pk)
+        self.assertTrue(first.check_out())
+        self.assertFalse(second.check_out())
+        self.assertEqual(second.check_out_time, first.check_out_time)
+        self.assertEqual(VisitDailyRollup.objects.get().visits, 1)
+        self.assertEqual(VisitEvent.objects.filter(kind=VisitEvent.KIND_CHECK_OUT).count(), 1)
+
+    def test_backfill_matches_incremental_rollups(self):
+        for minutes, host, days_ago in ((10, 'Charles', 0), (20, 'Charles', 0), (45, 'Grace', 3), (600, 'Grace', 40)):
+            self.completed_visit(minutes, host=host, days_ago=days_ago)
+        Visit.objects.create(visitor=self.visitor, purpose='Still here')
+        incremental = list(VisitDailyRollup.objects.values(*rollups.ROW_FIELDS))
+        VisitDailyRollup.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('backfill_visit_rollups', stdout=out)
+        self.assertIn('Wrote 3 rollup row(s)', out.getvalue())
+        self.assertEqual(list(VisitDailyRollup.objects.values(*rollups.ROW_FIELDS)), incremental)
+
+    def test_analytics_reads_only_rollups(self):
+        for minutes in (10, 20, 30, 40):
+            self.completed_visit(minutes)
+        self.completed_visit(90, host='Grace', days_ago=1)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/visits/analytics/', {'group_by': 'host'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('visitors_visitdailyrollup', ctx.captured_queries[0]['sql'])
+
+        totals = response.data['totals']
+        self.assertEqual((totals['visits'], totals['average_duration_minutes']), (5, 38.0))
+        self.assertEqual((totals['min_duration_minutes'], totals['max_duration_minutes']), (10, 90))
+        self.assertTrue(20 <= totals['p50_duration_minutes'] <= 30)
+        self.assertEqual([(group['key'], group['visits']) for group in response.data['groups']],
+                         [('Charles', 4), ('Grace', 1)])
+
+        days = self.client.get('/api/visits/analytics/').data['groups']
+        self.assertEqual([group['visits'] for group in days], [1, 4])
+
+    def test_analytics_rejects_bad_params(self):
+        self.assertEqual(self.client.get('/api/visits/analytics/', {'group_by': 'year'}).status_code, 400)
+        response = self.client.get('/api/visits/analytics/', {'date_from': '2026-02-01', 'date_to': '2026-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReadCacheTests(TransactionTestCase):
+    """Runs outside a test transaction: responses read inside one are never cached."""
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+        self.client = APIClient()
+        self.visitor, self.visits = make_visits(2)
+
+    def test_visit_lists_are_cached_until_a_write(self):
+        first = self.client.get('/api/visitors/active/')
+        with self.assertNumQueries(1):  # just the data version
+            self.assertEqual(self.client.get('/api/visitors/active/').data, first.data)
+
+        self.visits[0].check_out()
+        self.assertEqual(self.client.get('/api/visitors/active/').data['count'], 1)
+        self.assertEqual(caching.cache_stats()['visit-list'],
+                         {'hits': 1, 'misses': 2, 'bypassed': 0, 'hit_ratio': 0.3333})
+
+    def test_visitor_detail_and_search_see_related_writes(self):
+        detail_url = f'/api/visitors/{self.visitor.id}/'
+        search_url = '/api/visitors/search/?email=ada@example.com'
+        self.assertEqual(self.client.get(detail_url).data['total_visits'], 2)
+        self.assertEqual(self.client.get(search_url).data['visitor']['total_visits'], 2)
+        self.client.get(search_url)
+        self.assertEqual(caching.cache_stats()['lookup']['hits'], 1)
+
+        Visit.objects.create(visitor=self.visitor, purpose='Again')
+        self.assertEqual(self.client.get(detail_url).data['total_visits'], 3)
+        self.assertEqual(self.client.get(search_url).data['visitor']['total_visits'], 3)
+
+        Visitor.objects.filter(pk=self.visitor.pk).first().delete()
+        self.assertEqual(self.client.get(detail_url).status_code, 404)
+
+    def test_check_in_reuses_the_search_lookup(self):
+        Visit.objects.update(check_out_time=timezone.now(), duration_minutes=1)
+        self.client.get('/api/visitors/search/', {'email': 'ADA@example.com'})
+        with self.assertNumQueries(1):  # just the data version
+            self.client.get('/api/visitors/search/', {'email': 'ADA@example.com'})
+        response = self.client.post('/api/visitors/check_in/', {
+            'name': 'Ada Lovelace', 'email': 'ADA@example.com', 'phone': '+15550001', 'purpose': 'Demo',
+        }, format='json')
+        self.assertTrue(response.data['is_returning_visitor'])
+        self.assertEqual(caching.cache_stats()['lookup'],
+                         {'hits': 2, 'misses': 1, 'bypassed': 0, 'hit_ratio': 0.6667})
+
+    def test_not_cached_inside_a_transaction(self):
+        with transaction.atomic():
+            self.client.get('/api/visits/')
+            self.client.get('/api/visits/')
+        self.assertEqual(caching.cache_stats()['visit-list']['bypassed'], 2)
+
+    def test_cache_config(self):
+        self.assertEqual(cache_config()['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        file_cache = cache_config('file:///var/tmp/vm-cache')['default']
+        self.assertEqual((file_cache['LOCATION'], file_cache['OPTIONS']), ('/var/tmp/vm-cache', {'MAX_ENTRIES': 1000}))
+        self.assertEqual(cache_config('redis://localhost:6379/1')['default']['LOCATION'], 'redis://localhost:6379/1')
+        with self.assertRaises(ImproperlyConfigured):
+            cache_config('memcached://localhost')
@@ -0,0 +1,145 @@
+"""
+Binary (multipart or raw body) uploads for visitor photos and signatures.
+
+Limits are checked against ``Content-Length`` before any of the body is read.
+The body is then copied in chunks into a ``TemporaryUploadedFile``, which
+``FileSystemStorage`` moves into MEDIA_ROOT instead of copying it again.
+
+Stored file extensions always come from the image format Pillow detects,
+never from the client's file name or Content-Type.
+"""
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Room for multipart boundaries and headers on top of the file itself.
+MULTIPART_OVERHEAD = 16 * 1024
+
+IMAGE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+}
+
+# Pillow format names of the images we store, and the extension used for each.
+IMAGE_FORMAT_EXTENSIONS = {
+    'PNG': 'png',
+    'JPEG': 'jpg',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+
+class UploadError(Exception):
+    """An upload was rejected; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def photo_upload_limit():
+    return getattr(settings, 'PHOTO_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def signature_upload_limit():
+    return getattr(settings, 'SIGNATURE_UPLOAD_MAX_BYTES', 2 * 1024 * 1024)
+
+
+def check_in_body_limit():
+    """Largest check-in body: both images, base64-encoded, plus form fields."""
+    return (photo_upload_limit() + signature_upload_limit()) * 4 // 3 + MULTIPART_OVERHEAD
+
+
+def get_content_length(request):
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return 0
+
+
+def check_content_length(request, limit):
+    """Reject a request whose declared body size exceeds ``limit`` without reading it."""
+    if get_content_length(request) > limit:
+        raise UploadError(f'Upload exceeds the {limit} byte limit', 413)
+
+
+def is_multipart(request):
+    return request.content_type.startswith('multipart/form-data')
+
+
+def read_raw_upload(request, limit):
+    """Copy a raw image request body into a temporary upload file, chunk by chunk."""
+    content_type = request.content_type.split(';')[0].strip()
+    if content_type not in IMAGE_EXTENSIONS:
+        raise UploadError(
+            f"Content-Type must be one of: {', '.join(IMAGE_EXTENSIONS)}", 415
+        )
+    length = get_content_length(request)
+    if not length:
+        raise UploadError('Content-Length is required', 411)
+    check_content_length(request, limit)
+
+    upload = TemporaryUploadedFile(
+        f'upload.{IMAGE_EXTENSIONS[content_type]}', content_type, length, None
+    )
+    stream = request.stream
+    remaining = length
+    while remaining > 0:
+        chunk = stream.read(min(UPLOAD_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        upload.write(chunk)
+        remaining -= len(chunk)
+    upload.flush()
+    upload.seek(0)
+    return upload
+
+
+def get_image_upload(request, limit, field_name='file'):
+    """
+    Return ``(upload, ext)`` for the image in a multipart ``field_name`` or a raw body.
+
+    Raises UploadError for oversized, missing or non-image uploads.
+    """
+    if is_multipart(request):
+        check_content_length(request, limit + MULTIPART_OVERHEAD)
+        upload = request.FILES.get(field_name)
+        if upload is None:
+            raise UploadError(f'Missing "{field_name}" file', 400)
+        if upload.size > limit:
+            raise UploadError(f'Upload exceeds the {limit} byte limit', 413)
+    else:
+        upload = read_raw_upload(request, limit)
+
+    return upload, verify_image(upload)
+
+
+def image_format_extension(file):
+    """
+    Return the extension for an image file from the format Pillow detects.
+
+    Raises ValueError unless ``file`` is a readable PNG, JPEG, WebP or GIF
+    image. The file is left rewound.
+    """
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format = image.format
+            image.verify()
+    except Exception:
+        raise ValueError('Upload is not a valid image')
+    finally:
+        file.seek(0)
+    if image_format not in IMAGE_FORMAT_EXTENSIONS:
+        raise ValueError('Image must be PNG, JPEG, WebP or GIF')
+    return IMAGE_FORMAT_EXTENSIONS[image_format]
+
+
+def verify_image(upload):
+    """Check that ``upload`` is an image we store and return its extension; raises UploadError."""
+    try:
+        return image_format_extension(upload)
+    except ValueError as e:
+        raise UploadError(str(e), 400)
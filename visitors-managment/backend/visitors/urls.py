@@ -1,13 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import VisitorViewSet, VisitViewSet
-from .views_test import test_connection
+from .views import VisitorViewSet, VisitViewSet, ExportJobViewSet, active_visitors_stream
+from .views_test import test_connection, db_stats, cache_stats, metrics
 
 router = DefaultRouter()
 router.register(r'visitors', VisitorViewSet)
 router.register(r'visits', VisitViewSet)
+router.register(r'export-jobs', ExportJobViewSet)
 
 urlpatterns = [
+    path('visitors/active/stream/', active_visitors_stream, name='active-visitors-stream'),
     path('', include(router.urls)),
     path('test-connection/', test_connection, name='test-connection'),
+    path('db-stats/', db_stats, name='db-stats'),
+    path('cache-stats/', cache_stats, name='cache-stats'),
+    path('metrics/', metrics, name='metrics'),
 ] 
\ No newline at end of file
@@ -2,178 +2,177 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.db.models import Q
-from django.http import HttpResponse
+from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import render, redirect
-import csv
-import io
 import base64
-from datetime import datetime
+import logging
+import os
 from django.conf import settings
 from django.utils import timezone
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT
 
-from .models import Visitor, Visit, VisitorPhoto, CustomAdmin
+from . import bulk, events, exports, jobs, renditions, rollups
+from .lookup import attach_active_visit, find_returning_visitor
+from .caching import cached_response
+from .conditional import conditional_list
+from .filters import VISIT_FILTER_PARAMS, filter_visits
+from .http import ranged_file_response
+from .models import Visitor, Visit, VisitorPhoto, CustomAdmin, ExportJob, MediaTask, VisitEvent
+from .pagination import VisitKeysetPagination
+from .search import VisitorSearchFilter, VisitSearchFilter
+from .signatures import decode_data_url, parse_signature, signature_filename
+from .stats import lobby_stats
+from .uploads import (
+    UploadError, check_content_length, check_in_body_limit, get_image_upload,
+    photo_upload_limit, signature_upload_limit, verify_image
+)
 from .serializers import (
     VisitorSerializer, VisitSerializer, CheckInSerializer, CheckOutSerializer,
-    VisitHistorySerializer, VisitorPhotoSerializer
+    VisitHistorySerializer, VisitorPhotoSerializer, ExportJobSerializer
 )
 
+logger = logging.getLogger(__name__)
+
 
 class VisitorViewSet(viewsets.ModelViewSet):
     """ViewSet for visitor management."""
-    queryset = Visitor.objects.all()
+    queryset = Visitor.objects.with_visit_stats()
     serializer_class = VisitorSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, VisitorSearchFilter, filters.OrderingFilter]
     filterset_fields = ['email', 'phone']
     search_fields = ['name', 'email', 'phone']
     ordering_fields = ['name', 'created_at', 'total_visits']
 
+    @conditional_list
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response('visitor')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=['post'])
     def check_in(self, request):
-        """Check in a new visitor or existing visitor."""
+        """
+        Check in a new visitor or existing visitor.
+
+        Uploads are decoded and checked to be PNG, JPEG, WebP or GIF images
+        before any writes; the visitor upsert, the visit and its media tasks
+        are then written in a single transaction. Photo and signature files
+        are stored by a background worker, so the visit
+        is returned with ``media_status: processing`` until they are ready.
+        Oversized bodies are refused before they are read; large files
+        should use the binary ``photo``/``signature`` routes on the visit
+        instead of base64 fields.
+        """
+        try:
+            check_content_length(request, check_in_body_limit())
+        except UploadError as e:
+            return Response({'error': str(e)}, status=e.status)
+
         serializer = CheckInSerializer(data=request.data)
-        if serializer.is_valid():
-            data = serializer.validated_data
-            existing_visitor = data.get('existing_visitor')
-            
-            # If visitor exists, update their information
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        existing_visitor = data.get('existing_visitor')
+
+        signature_file = request.FILES.get('signature_image')
+        photo_file = request.FILES.get('photo')
+        for field, upload, limit in (('signature_image', signature_file, signature_upload_limit()),
+                                     ('photo', photo_file, photo_upload_limit())):
+            if upload and upload.size > limit:
+                return Response({
+                    field: [f'Upload exceeds the {limit} byte limit']
+                }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        # (kind, extension, bytes) for each file the worker has to store.
+        media = []
+        upload_exts = {}
+        for field, upload in (('signature_image', signature_file), ('photo', photo_file)):
+            if upload:
+                try:
+                    upload_exts[field] = verify_image(upload)
+                except UploadError as e:
+                    return Response({field: [str(e)]}, status=e.status)
+
+        signature_data = data.get('signature_data')
+        signature_vector = None
+        if signature_file:
+            media.append((MediaTask.KIND_SIGNATURE, upload_exts['signature_image'], signature_file.read()))
+        elif signature_data:
+            try:
+                signature_vector, signature_content = parse_signature(signature_data, data['is_vector_signature'])
+            except ValueError as e:
+                # The signature is required; let the client resubmit it.
+                return Response({'signature_data': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+            if signature_content:
+                ext = os.path.splitext(signature_content.name)[1].lstrip('.')
+                media.append((MediaTask.KIND_SIGNATURE, ext, signature_content.read()))
+
+        photo_data = data.get('photo_data')
+        if photo_data:
+            try:
+                ext, raw = decode_data_url(photo_data)
+            except ValueError:
+                return Response({
+                    'photo_data': ['Invalid image data format']
+                }, status=status.HTTP_400_BAD_REQUEST)
+            media.append((MediaTask.KIND_PHOTO, ext, raw))
+        elif photo_file:
+            media.append((MediaTask.KIND_PHOTO, upload_exts['photo'], photo_file.read()))
+
+        with transaction.atomic():
             if existing_visitor:
                 visitor = existing_visitor
-                visitor.name = data['name']
-                visitor.email = data['email']
-                visitor.phone = data['phone']
-                visitor.save()
+                changed = [field for field in ('name', 'email', 'phone') if getattr(visitor, field) != data[field]]
+                if changed:
+                    for field in changed:
+                        setattr(visitor, field, data[field])
+                    update_fields = changed + ['updated_at']
+                    if 'email' in changed:
+                        update_fields.append('email_key')
+                    if 'phone' in changed:
+                        update_fields += ['phone_digits', 'phone_key']
+                    visitor.save(update_fields=update_fields)
             else:
-                # Create new visitor
                 visitor = Visitor.objects.create(
                     name=data['name'],
                     email=data['email'],
                     phone=data['phone']
                 )
-            
-            # Create visit record with signature data if available
-            visit_data = {
-                'visitor': visitor,
-                'purpose': data['purpose'],
-                'host_name': data.get('host_name', '')
-            }
-            
-            # Create the visit record first
-            visit = Visit.objects.create(**visit_data)
-            
-            # Handle signature data if provided (either as direct file upload or base64 data)
-            signature_file = request.FILES.get('signature_image')
-            signature_data = data.get('signature_data')
-            is_vector_signature = data.get('is_vector_signature', '').lower() == 'true'
-            
-            try:
-                if signature_file:
-                    # Handle file upload
-                    print(f"Processing signature file upload: {signature_file.name}")
-                    visit.signature_image.save(
-                        f"signature_{timezone.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.png",
-                        signature_file,
-                        save=False
-                    )
-                    if signature_data:
-                        visit.signature_data = signature_data
-                    visit.save()
-                    print(f"Successfully saved signature file for visit {visit.id}")
-                
-                elif signature_data:
-                    print("Processing signature data...")
-                    
-                    # Handle vector-based signature
-                    if is_vector_signature or (signature_data.startswith('{') and 'paths' in signature_data):
-                        print("Detected vector signature data")
-                        visit.signature_data = signature_data
-                        visit.signature_type = 'vector'
-                        visit.save()
-                        print(f"Successfully saved vector signature for visit {visit.id}")
-                    
-                    # Handle image data URL
-                    elif signature_data.startswith('data:image/'):
-                        print("Processing image signature data...")
-                        visit.signature_data = signature_data
-                        
-                        if ';base64,' in signature_data:
-                            format, imgstr = signature_data.split(';base64,')
-                            ext = format.split('/')[-1] if '/' in format else 'png'
-                            
-                            filename = f"signature_{timezone.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{ext}"
-                            
-                            try:
-                                # Save the signature image file
-                                visit.signature_image.save(
-                                    filename, 
-                                    ContentFile(base64.b64decode(imgstr)), 
-                                    save=True
-                                )
-                                print(f"Successfully saved signature image: {visit.signature_image.name}")
-                            except Exception as img_error:
-                                print(f"Error saving signature image: {str(img_error)}")
-                                print(f"Signature data length: {len(signature_data)}")
-                                print(f"Starts with: {signature_data[:50]}...")
-                        else:
-                            print(f"Invalid signature data format. Expected data URL with base64")
-                        
-                        visit.save()
-                        print(f"Successfully saved visit {visit.id} with image signature")
-                    
-                    # Handle other types of signature data
-                    else:
-                        print("Saving raw signature data")
-                        visit.signature_data = signature_data
-                        visit.save()
-                        print(f"Successfully saved raw signature data for visit {visit.id}")
-                
-                else:
-                    print("No signature data or file provided")
-                    visit.save()
-                    
-            except Exception as e:
-                import traceback
-                error_trace = traceback.format_exc()
-                print(f"Error processing signature: {str(e)}\n{error_trace}")
-                # Save the visit without the signature data
-                visit.save()
-            
-            # Handle photo upload if provided
-            photo_file = request.FILES.get('photo')
-            photo_data = data.get('photo_data')
-            
-            if photo_file or photo_data:
-                # Create photo record
-                photo_data_dict = {
-                    'visitor': visitor,
-                    'visit': visit,
-                }
-                
-                if photo_data:
-                    # Handle base64 photo data
-                    photo_data_dict['image_data'] = photo_data
-                elif photo_file:
-                    # Handle file upload
-                    photo_data_dict['image'] = photo_file
-                
-                photo = VisitorPhoto.objects.create(**photo_data_dict)
-                print(f"Photo saved: {photo.image.url}")
-                print(f"Photo path: {photo.image.path}")
-                print(f"Photo name: {photo.image.name}")
-            
-            # Return visit details with photos
-            visit_serializer = VisitSerializer(visit, context={'request': request})
-            return Response({
-                'message': 'Visitor checked in successfully',
-                'visit': visit_serializer.data,
-                'is_returning_visitor': existing_visitor is not None
-            }, status=status.HTTP_201_CREATED)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            visit = Visit.objects.create(
+                visitor=visitor,
+                purpose=data['purpose'],
+                host_name=data.get('host_name', ''),
+                signature_data=signature_vector,
+                media_status=Visit.MEDIA_PROCESSING if media else Visit.MEDIA_READY,
+            )
+            events.record_event(VisitEvent.KIND_CHECK_IN, visit.pk)
+            if media:
+                tasks = MediaTask.objects.bulk_create([
+                    MediaTask(visit=visit, kind=kind, file_ext=ext,
+                              file=ContentFile(raw, name=f'{kind}.{ext}'))
+                    for kind, ext, raw in media
+                ])
+                jobs.enqueue_media_tasks(tasks)
+
+        logger.debug("Checked in visit %s for visitor %s (returning: %s, %d media task(s))",
+                     visit.pk, visitor.pk, existing_visitor is not None, len(media))
+
+        # A new visit has no photos yet; skip re-reading them.
+        visit._prefetched_objects_cache = {'photos': []}
+
+        visit_serializer = VisitSerializer(visit, context={'request': request})
+        return Response({
+            'message': 'Visitor checked in successfully',
+            'visit': visit_serializer.data,
+            'is_returning_visitor': existing_visitor is not None
+        }, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'])
     def check_out(self, request):
@@ -182,12 +181,11 @@ class VisitorViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             try:
                 visit = Visit.objects.get(id=serializer.validated_data['visit_id'])
-                if visit.check_out_time:
+                if visit.check_out_time or not visit.check_out():
                     return Response({
                         'error': 'Visitor has already been checked out'
                     }, status=status.HTTP_400_BAD_REQUEST)
-                
-                visit.check_out()
+
                 visit_serializer = VisitSerializer(visit)
                 return Response({
                     'message': 'Visitor checked out successfully',
@@ -200,162 +198,148 @@ class VisitorViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _bulk_items(self, request):
+        """The JSON array posted to a bulk endpoint, or an error response."""
+        items = request.data
+        if not isinstance(items, list):
+            return None, Response({'error': 'Expected a JSON array of items'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > bulk.max_items():
+            return None, Response({
+                'error': f'At most {bulk.max_items()} items per request'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        return items, None
+
+    def _bulk_response(self, results):
+        succeeded = sum(1 for result in results if result['status'] != 'error')
+        return Response({
+            'results': results,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def bulk_check_in(self, request):
+        """Check in an array of visitors (``check_in`` fields, without photos or signatures)."""
+        items, error_response = self._bulk_items(request)
+        if error_response:
+            return error_response
+        return self._bulk_response(bulk.check_in_many(items))
+
+    @action(detail=False, methods=['post'])
+    def bulk_check_out(self, request):
+        """Check out an array of ``{"visit_id": ...}`` items."""
+        items, error_response = self._bulk_items(request)
+        if error_response:
+            return error_response
+        return self._bulk_response(bulk.check_out_many(items))
+
     @action(detail=False, methods=['get'])
+    @conditional_list
+    @cached_response('visit-list')
     def active(self, request):
         """Get all currently active visitors."""
-        active_visits = Visit.objects.filter(check_out_time__isnull=True)
+        active_visits = Visit.objects.for_listing().filter(check_out_time__isnull=True)
         serializer = VisitSerializer(active_visits, many=True, context={'request': request})
+        data = serializer.data
         return Response({
-            'active_visitors': serializer.data,
-            'count': active_visits.count()
+            'active_visitors': data,
+            'count': len(data)
         })
 
     @action(detail=False, methods=['get'])
+    @conditional_list
+    @cached_response('visit-list')
     def history(self, request):
-        """Get visit history with search and filter options."""
-        visits = Visit.objects.all()
+        """
+        Get visit history with search and filter options.
+
+        Passing ``cursor`` (empty for the first page) or ``page_size`` switches
+        to keyset pagination; ``count=exact|approx|none`` controls the total.
+        """
+        visits = Visit.objects.for_listing()
         
         # Apply filters
-        name = request.query_params.get('name')
-        phone = request.query_params.get('phone')
-        email = request.query_params.get('email')
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        
-        if name:
-            visits = visits.filter(visitor__name__icontains=name)
-        if phone:
-            visits = visits.filter(visitor__phone__icontains=phone)
-        if email:
-            visits = visits.filter(visitor__email__icontains=email)
-        if date_from:
-            visits = visits.filter(check_in_time__date__gte=date_from)
-        if date_to:
-            visits = visits.filter(check_in_time__date__lte=date_to)
+        visits = filter_visits(visits, request.query_params)
         
+        if VisitKeysetPagination.is_requested(request):
+            paginator = VisitKeysetPagination()
+            page = paginator.paginate_queryset(visits, request)
+            serializer = VisitHistorySerializer(page, many=True, context={'request': request})
+            return Response(paginator.get_paginated_data(serializer.data))
+
         # Order by check-in time (newest first)
         visits = visits.order_by('-check_in_time')
         
         serializer = VisitHistorySerializer(visits, many=True, context={'request': request})
+        data = serializer.data
         return Response({
-            'visits': serializer.data,
-            'count': visits.count()
+            'visits': data,
+            'count': len(data)
         })
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get', 'post'])
     def export(self, request):
-        """Export visit history as a Word document (.docx)."""
+        """
+        Export visit history.
+
+        ``export_format`` selects ``csv`` (default, streamed), ``xlsx`` or the
+        legacy ``docx`` document returned base64-encoded inside JSON. POST
+        queues a background export job instead and returns its status URL.
+        """
+        if request.method == 'POST':
+            return self._enqueue_export(request)
+
         visits = Visit.objects.all().order_by('-check_in_time')
         
         # Apply same filters as history endpoint
-        name = request.query_params.get('name')
-        phone = request.query_params.get('phone')
-        email = request.query_params.get('email')
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        
-        if name:
-            visits = visits.filter(visitor__name__icontains=name)
-        if phone:
-            visits = visits.filter(visitor__phone__icontains=phone)
-        if email:
-            visits = visits.filter(visitor__email__icontains=email)
-        if date_from:
-            visits = visits.filter(check_in_time__date__gte=date_from)
-        if date_to:
-            visits = visits.filter(check_in_time__date__lte=date_to)
-        
-        # Create a new Word document
-        doc = Document()
-        
-        # Add a title
-        title = doc.add_heading('Visit History', level=1)
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Add export date
-        export_date = doc.add_paragraph(f'Exported on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
-        export_date.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        
-        # Add a table
-        table = doc.add_table(rows=1, cols=17)  # 17 columns as per the original Excel
-        table.style = 'Table Grid'
-        
-        # Set table headers
-        headers = [
-            'Visitor ID', 'Visitor Name', 'Email', 'Phone Number', 
-            'Purpose of Visit', 'Host Name', 'Approval Status', 'Visit ID',
-            'Check-in Time', 'Check-out Time', 'Duration (minutes)', 
-            'Duration (formatted)', 'Is Active', 'Photo URL', 'Visitor Created At',
-            'Visitor Updated At', 'Visit Created At'
-        ]
-        
-        # Style and add headers
-        hdr_cells = table.rows[0].cells
-        for i, header in enumerate(headers):
-            hdr_cells[i].text = header
-            hdr_cells[i].paragraphs[0].runs[0].bold = True
-            hdr_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+        visits = filter_visits(visits, request.query_params)
         
-        # Add data rows
-        for visit in visits:
-            # Get photo URL if available
-            photo_url = ""
-            if visit.photos.exists():
-                photo = visit.photos.first()
-                if photo.image:
-                    photo_url = f"http://{request.get_host()}{photo.image.url}"
-            
-            # Prepare row data
-            row_data = [
-                str(visit.visitor.id),
-                visit.visitor.name,
-                visit.visitor.email,
-                visit.visitor.phone,
-                visit.purpose,
-                visit.host_name or 'N/A',
-                visit.status,
-                str(visit.id),
-                visit.check_in_time.strftime('%Y-%m-%d %H:%M:%S'),
-                visit.check_out_time.strftime('%Y-%m-%d %H:%M:%S') if visit.check_out_time else 'N/A',
-                str(visit.duration_minutes) if visit.duration_minutes is not None else 'N/A',
-                visit.duration_formatted,
-                'Yes' if visit.is_active else 'No',
-                photo_url,
-                visit.visitor.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                visit.visitor.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-                visit.check_in_time.strftime('%Y-%m-%d %H:%M:%S')  # Visit created at is same as check-in time
-            ]
-            
-            # Add a new row to the table
-            row_cells = table.add_row().cells
-            for i, value in enumerate(row_data):
-                row_cells[i].text = str(value)
-        
-        # Auto-fit the table columns
-        for section in doc.sections:
-            section.left_margin = Inches(0.5)
-            section.right_margin = Inches(0.5)
-        
-        # Save the document to a bytes buffer
-        doc_buffer = io.BytesIO()
-        doc.save(doc_buffer)
-        doc_buffer.seek(0)
-        
-        # Convert to base64 for JSON response
-        doc_data = base64.b64encode(doc_buffer.getvalue()).decode('utf-8')
-        doc_buffer.close()
+        export_format = request.query_params.get('export_format', 'csv').lower()
+        if export_format == 'csv':
+            return exports.csv_response(visits, request)
+        if export_format == 'xlsx':
+            return exports.xlsx_response(visits, request)
+        if export_format != 'docx':
+            return Response({
+                'error': 'export_format must be one of: csv, xlsx, docx'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Return JSON response with document data
+        doc_data = base64.b64encode(exports.build_docx(visits, request)).decode('utf-8')
         return Response({
             'message': 'Visit history exported successfully',
-            'filename': f'visit_history_{datetime.now().strftime("%Y%m%d_%H%M%S")}.docx',
+            'filename': exports.export_filename('docx'),
             'data': doc_data,
             'count': visits.count()
         })
 
+    def _enqueue_export(self, request):
+        """Create a background export job for the filters in the request body."""
+        export_format = str(request.data.get('export_format', 'csv')).lower()
+        if export_format not in dict(ExportJob.FORMAT_CHOICES):
+            return Response({
+                'error': 'export_format must be one of: csv, xlsx'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        filters = {
+            key: request.data.get(key)
+            for key in VISIT_FILTER_PARAMS
+            if request.data.get(key)
+        }
+        # Reject bad filters now rather than failing the job later.
+        filter_visits(Visit.objects.none(), filters)
+        job = ExportJob.objects.create(
+            export_format=export_format,
+            filters=filters,
+            base_url=request.build_absolute_uri('/'),
+        )
+        jobs.enqueue_export_job(job)
+        serializer = ExportJobSerializer(job, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': serializer.data['status_url']})
+
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Search for existing visitors by email or phone."""
+        """Search for an existing visitor by email or phone, e.g. to prefill check-in."""
         try:
             email = request.query_params.get('email')
             phone = request.query_params.get('phone')
@@ -365,20 +349,10 @@ class VisitorViewSet(viewsets.ModelViewSet):
                     'error': 'Please provide email or phone number'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            visitor = None
-            if email:
-                try:
-                    visitor = Visitor.objects.get(email=email)
-                except Visitor.DoesNotExist:
-                    pass
-            
-            if not visitor and phone:
-                try:
-                    visitor = Visitor.objects.get(phone=phone)
-                except Visitor.DoesNotExist:
-                    pass
+            visitor = find_returning_visitor(email, phone)
             
             if visitor:
+                attach_active_visit(visitor)
                 serializer = VisitorSerializer(visitor, context={'request': request})
                 return Response({
                     'found': True,
@@ -394,6 +368,11 @@ class VisitorViewSet(viewsets.ModelViewSet):
                 'error': f'Search failed: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Lobby dashboard figures for today; cached until the next write (see ``visitors.stats``)."""
+        return Response(lobby_stats())
+
     @action(detail=False, methods=['get'])
     def debug_photos(self, request):
         """Debug endpoint to check photo storage and URLs."""
@@ -427,13 +406,141 @@ class VisitorViewSet(viewsets.ModelViewSet):
 
 class VisitViewSet(viewsets.ModelViewSet):
     """ViewSet for visit management."""
-    queryset = Visit.objects.all()
+    queryset = Visit.objects.for_listing()
     serializer_class = VisitSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, VisitSearchFilter, filters.OrderingFilter]
     filterset_fields = ['visitor', 'check_in_time', 'check_out_time']
     search_fields = ['visitor__name', 'visitor__email', 'visitor__phone', 'purpose']
     ordering_fields = ['check_in_time', 'check_out_time', 'duration_minutes']
 
+    @conditional_list
+    @cached_response('visit-list')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Visit counts and duration percentiles from the daily rollups.
+
+        ``date_from``/``date_to`` (default: the last 30 days), ``group_by``
+        (``day``, ``month``, ``host`` or ``purpose``) and ``host_name``. Only
+        checked-out visits are counted.
+        """
+        return Response(rollups.visit_analytics(*rollups.parse_params(request.query_params)))
+
+    @action(detail=True, methods=['post'])
+    def photo(self, request, pk=None):
+        """
+        Attach a photo to the visit.
+
+        Send the image as the raw body (``Content-Type: image/jpeg``,
+        ``image/png`` or ``image/webp``) or as a multipart ``file`` field.
+        """
+        visit = self.get_object()
+        try:
+            upload, ext = get_image_upload(request, photo_upload_limit())
+        except UploadError as e:
+            return Response({'error': str(e)}, status=e.status)
+
+        upload.name = f"visitor_photo_{visit.id}.{ext}"
+        try:
+            # The file and its reference are recorded together (see visitors.blobs).
+            with transaction.atomic():
+                photo = VisitorPhoto.objects.create(visitor=visit.visitor, visit=visit, image=upload)
+        finally:
+            upload.close()
+        renditions.create_photo_renditions(photo)
+        serializer = VisitorPhotoSerializer(photo, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get', 'put'])
+    def signature(self, request, pk=None):
+        """
+        GET returns the vector signature JSON, or redirects to the signature image.
+
+        PUT stores (or replaces) the signature image; same body formats as ``photo``.
+        """
+        visit = self.get_object()
+        if request.method == 'GET':
+            if visit.signature_image:
+                return HttpResponseRedirect(visit.signature_image.url)
+            if visit.signature_data:
+                return HttpResponse(visit.signature_data, content_type='application/json')
+            return Response({'error': 'Visit has no signature'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            upload, ext = get_image_upload(request, signature_upload_limit())
+        except UploadError as e:
+            return Response({'error': str(e)}, status=e.status)
+
+        try:
+            with transaction.atomic():
+                visit.signature_image.save(signature_filename(ext), upload, save=False)
+                visit.signature_data = None
+                # The previous file is released (and deleted if unshared) by visitors.blobs.
+                visit.save(update_fields=['signature_image', 'signature_data'])
+        finally:
+            upload.close()
+        serializer = VisitSerializer(visit, context={'request': request})
+        return Response(serializer.data)
+
+
+class ExportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status and download of background export jobs."""
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    filter_backends = []
+    poll_interval_seconds = 2
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.data['status'] in (ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING):
+            response['Retry-After'] = str(self.poll_interval_seconds)
+        return response
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the export file; supports ``Range`` so clients can resume."""
+        job = self.get_object()
+        if job.status != ExportJob.STATUS_COMPLETED or not job.file:
+            return Response({
+                'error': 'Export is not ready',
+                'status': job.status
+            }, status=status.HTTP_409_CONFLICT)
+
+        content_type = (
+            'text/csv; charset=utf-8' if job.export_format == 'csv'
+            else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        return ranged_file_response(
+            request,
+            job.file.open('rb'),
+            job.file.size,
+            content_type,
+            filename=os.path.basename(job.file.name),
+            headers={'ETag': f'"{job.pk}-{job.file.size}"'},
+        )
+
+
+def active_visitors_stream(request):
+    """
+    Server-Sent Events stream of check-ins, check-outs and media updates.
+
+    See ``visitors.events``; run under ``visitor_management.asgi`` so idle
+    connections do not hold a worker thread. Under WSGI the stream ends
+    after ``VISIT_EVENTS_WSGI_STREAM_SECONDS``.
+    """
+    stream = events.ActiveVisitStream(
+        request, events.parse_last_event_id(request.headers.get('Last-Event-ID'))
+    )
+    # StreamingHttpResponse consumes async iterators only under ASGI.
+    content = stream if isinstance(request, ASGIRequest) else iter(stream)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
 def home(request):
     """Simple home page view."""
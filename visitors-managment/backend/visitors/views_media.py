@@ -0,0 +1,86 @@
+"""
+Serving of uploaded media (photos, signatures and their renditions).
+
+Only the directories listed in ``PUBLIC_MEDIA_PREFIXES`` are served; anything
+else under MEDIA_ROOT (export files, staged check-in uploads) is a 404 here.
+Exports are downloaded through ``/api/export-jobs/<id>/download/``.
+
+Content-hashed names (see ``visitors.storage``) never change, so they are sent
+with a year-long immutable ``Cache-Control`` and their digest as ETag. Other
+files are revalidated with an ETag built from size and modification time.
+``MEDIA_SERVE_MODE`` chooses who sends the bytes:
+
+* ``django`` streams the file here, with ``Range`` support;
+* ``x-accel-redirect`` hands off to nginx via ``MEDIA_ACCEL_PREFIX``;
+* ``x-sendfile`` hands off to Apache/lighttpd with the absolute path.
+
+Conditional requests are answered with 304 here in every mode.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .http import ranged_file_response
+from .storage import name_hash
+
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+PUBLIC_MEDIA_PREFIXES = ('visitor_photos/', 'visitor_signatures/', 'renditions/')
+
+
+def media_validators(path, stat):
+    """Return ``(etag, cache_control)`` for the media file at ``path``."""
+    digest = name_hash(path)
+    if digest is not None:
+        return f'"{digest}"', IMMUTABLE_CACHE_CONTROL
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"', REVALIDATE_CACHE_CONTROL
+
+
+def serve_media(request, path):
+    """Serve ``MEDIA_ROOT/<path>`` with caching validators and byte ranges."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Media file not found')
+    # Check the resolved path, so "visitor_photos/../exports/..." is refused too.
+    name = os.path.relpath(full_path, os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, '/')
+    if not name.startswith(PUBLIC_MEDIA_PREFIXES) or not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag, cache_control = media_validators(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+    }
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    mode = getattr(settings, 'MEDIA_SERVE_MODE', 'django')
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path)
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        return ranged_file_response(request, open(full_path, 'rb'), stat.st_size, content_type, headers=headers)
+
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -1,6 +1,10 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.http import Http404, HttpResponse
+from visitor_management.db_utils import connection_stats
+from visitor_management import instrumentation
+from .caching import cache_stats as read_cache_stats, prometheus_text as read_cache_prometheus_text
 
 @api_view(['GET'])
 def test_connection(request):
@@ -14,3 +18,29 @@ def test_connection(request):
         'user_agent': request.META.get('HTTP_USER_AGENT'),
         'request_method': request.method,
     })
+
+
+@api_view(['GET'])
+def db_stats(request):
+    """
+    Per-process database connection counters, including the connection reuse ratio
+    """
+    return Response(connection_stats())
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    """
+    Per-process read cache hit/miss counters for each cached endpoint
+    """
+    return Response(read_cache_stats())
+
+
+def metrics(request):
+    """
+    Request timing and query totals for this process, in Prometheus text format
+    """
+    if not instrumentation.is_enabled():
+        raise Http404('Request metrics are disabled')
+    text = instrumentation.prometheus_text() + read_cache_prometheus_text()
+    return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
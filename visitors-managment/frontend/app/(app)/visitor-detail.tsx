@@ -26,6 +26,7 @@ interface VisitorDetailParams {
   checkInTime: string;
   checkOutTime?: string;
   signatureUrl?: string;
+  signatureType?: 'image' | 'vector';
   signature_data?: string; // For direct base64 data
   photoUrl?: string;
 }
@@ -33,6 +34,16 @@ interface VisitorDetailParams {
 export default function VisitorDetailScreen() {
   const theme = useTheme();
   const params = useLocalSearchParams<Partial<VisitorDetailParams>>();
+  const [vectorSignature, setVectorSignature] = useState<string | undefined>(params.signature_data);
+
+  // Vector signatures are served as JSON from the visit's signature endpoint
+  useEffect(() => {
+    if (params.signatureType !== 'vector' || !params.signatureUrl) return;
+    fetch(params.signatureUrl)
+      .then((response) => response.text())
+      .then(setVectorSignature)
+      .catch((error) => console.error('Failed to load vector signature:', error));
+  }, [params.signatureType, params.signatureUrl]);
   
   // Format date and time for display
   const formatDateTime = (dateString?: string) => {
@@ -183,8 +194,12 @@ export default function VisitorDetailScreen() {
                       isVector: params.signature_data ? isVectorSignature(params.signature_data) : false
                     });
 
+                    if (vectorSignature && isVectorSignature(vectorSignature)) {
+                      return renderVectorSignature(vectorSignature);
+                    }
+
                     // Try to display signature from URL first (image only)
-                    if (params.signatureUrl) {
+                    if (params.signatureUrl && params.signatureType !== 'vector') {
                       const signatureUrl = params.signatureUrl.startsWith('data:') || params.signatureUrl.startsWith('http')
                         ? params.signatureUrl 
                         : `${getApiBaseUrl().replace('/api', '')}${params.signatureUrl.startsWith('/') ? '' : '/'}${params.signatureUrl}`;
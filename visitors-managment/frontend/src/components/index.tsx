@@ -115,12 +115,15 @@ export const VisitorCard = ({
       .slice(0, 2);
   };
 
-  const getVisitorPhoto = () => {
+  const getVisitorPhoto = (size: 'thumbnail' | 'medium' = 'thumbnail') => {
     // Get the first photo from the visitor's photos array
     if (visitor.photos && visitor.photos.length > 0) {
       const photo = visitor.photos[0];
-      // Return the image_url if available, otherwise construct the URL from image field
-      if (photo.image_url) {
+      // Prefer the resized rendition, then image_url, otherwise construct the URL from image field
+      const renditionUrl = size === 'medium' ? photo.medium_url : photo.thumbnail_url;
+      if (renditionUrl) {
+        return renditionUrl;
+      } else if (photo.image_url) {
         return photo.image_url;
       } else if (photo.image) {
         // If image_url is not available, construct the full URL
@@ -245,8 +248,9 @@ export const VisitorCard = ({
                         checkInTime: visitor.check_in_time,
                         checkOutTime: visitor.check_out_time,
                         signatureUrl: signatureUrl,
+                        signatureType: visitor.signature_type,
                         signature_data: signatureData && !signatureData.startsWith('http') ? signatureData : undefined,
-                        photoUrl: getVisitorPhoto(),
+                        photoUrl: getVisitorPhoto('medium'),
                       },
                     });
                   }}
@@ -69,16 +69,28 @@ export interface VisitorStats {
   activeVisitors: number;
   visitorsToday: number;
   averageVisitDuration: number;
+  busiestHosts: { host_name: string; visits: number }[];
+}
+
+interface VisitorStatsResponse {
+  date: string;
+  today_check_ins: number;
+  today_check_outs: number;
+  active_visitors: number;
+  average_duration_minutes: number | null;
+  busiest_hosts: { host_name: string; visits: number }[];
+  total_visitors: number;
 }
 
 export const getVisitorStats = async (token?: string): Promise<VisitorStats> => {
   try {
-    const response = await get<ApiResponse<VisitorStats>>('/visitors/stats', token);
-    return response.data || {
-      totalVisitors: 0,
-      activeVisitors: 0,
-      visitorsToday: 0,
-      averageVisitDuration: 0,
+    const response = await get<VisitorStatsResponse>('/visitors/stats/', token);
+    return {
+      totalVisitors: response.total_visitors,
+      activeVisitors: response.active_visitors,
+      visitorsToday: response.today_check_ins,
+      averageVisitDuration: response.average_duration_minutes ?? 0,
+      busiestHosts: response.busiest_hosts,
     };
   } catch (error) {
     console.error('Error fetching visitor stats:', error);
@@ -87,6 +99,7 @@ export const getVisitorStats = async (token?: string): Promise<VisitorStats> =>
       activeVisitors: 0,
       visitorsToday: 0,
       averageVisitDuration: 0,
+      busiestHosts: [],
     };
   }
 };
@@ -28,8 +28,10 @@ export interface Visit {
   is_active: boolean;
   status: string;
   photos: VisitorPhoto[];
-  signature_data?: string;
+  signature_data?: string; // Only sent by older servers
   signature_url?: string;
+  signature_type?: 'image' | 'vector' | null;
+  media_status?: 'ready' | 'processing' | 'failed'; // Photos/signature stored in the background
   photo_data?: string; // For photo URL in exports
   photoUrl?: string; // Alias for photo_data
   name?: string; // Alias for visitor_name
@@ -42,6 +44,8 @@ export interface VisitorPhoto {
   id: string;
   image: string;
   image_url?: string;
+  thumbnail_url?: string;
+  medium_url?: string;
   created_at: string;
 }
 
@@ -14,4 +14,4 @@ echo "=== Collecting Static Files ==="
 python manage.py collectstatic --noinput
 
 echo "=== Starting Gunicorn Server ==="
-exec gunicorn visitor_management.wsgi:application --bind 0.0.0.0:$PORT --workers 4
+exec gunicorn visitor_management.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT --workers 4